@@ -1 +1,53 @@
 """FacePass detector sub-package."""
+
+from __future__ import annotations
+
+import logging
+
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+DETECTOR_BACKENDS = ("auto", "torch", "onnx")
+
+
+def create_detector(backend: str | None = None, version: str | None = None):
+    """Build the face detector for *backend* (``settings.detector_backend``).
+
+    Weights come from the model registry entry for *version*
+    (``settings.model_version`` by default).
+
+    * ``"torch"`` — :class:`~ai.detector.yolo_face.YOLOFaceDetector`
+      (ultralytics + torch; GPU capable).
+    * ``"onnx"``  — :class:`~ai.detector.onnx_face.ONNXFaceDetector` over
+      the registered ``yolo_face_onnx`` export; never imports torch.
+    * ``"auto"``  — ``"onnx"`` when ``settings.device == "cpu"`` and an
+      export is registered, otherwise ``"torch"``.
+
+    Backends are imported lazily so an ONNX deployment never loads torch.
+    """
+    backend = backend or settings.detector_backend
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend!r}; expected one of {DETECTOR_BACKENDS}")
+
+    if backend == "onnx" or (backend == "auto" and settings.device == "cpu"):
+        from ai.model_registry import registry
+
+        try:
+            path = registry.get_model_path("yolo_face_onnx", version)
+        except (KeyError, FileNotFoundError):
+            if backend == "onnx":
+                raise
+            logger.warning(
+                "No ONNX face model registered for %s — using torch. "
+                "Run `python -m ai.detector.export_onnx` to create one.",
+                version or settings.model_version,
+            )
+        else:
+            from ai.detector.onnx_face import ONNXFaceDetector
+
+            return ONNXFaceDetector(path)
+
+    from ai.detector.yolo_face import YOLOFaceDetector
+
+    return YOLOFaceDetector(version=version)
@@ -0,0 +1,88 @@
+"""
+ai/detector/export_onnx.py
+---------------------------
+Export the YOLO face weights to ONNX and register the result.
+
+Writes ``models/<version>/yolo_face.onnx`` next to the ``.pt`` file and
+records it as ``yolo_face_onnx`` in ``models/registry.json``, where the
+``onnx`` detector backend looks it up::
+
+    python -m ai.detector.export_onnx                 # settings.model_version
+    python -m ai.detector.export_onnx --version v2 --imgsz 640
+
+This is the only place that still needs torch / ultralytics; CPU
+deployments run the exported file with onnxruntime alone.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import shutil
+from pathlib import Path
+
+from ai.model_registry import ModelRegistry
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def export(
+    version: str | None = None,
+    imgsz: int | None = None,
+    opset: int = 12,
+    dynamic: bool = False,
+    registry: ModelRegistry | None = None,
+) -> Path:
+    """Export ``yolo_face@version`` to ONNX and register it.
+
+    Args:
+        version:  Model version; defaults to ``settings.model_version``.
+        imgsz:    Square input size; defaults to ``settings.detection_input_size``.
+        opset:    ONNX opset.
+        dynamic:  Export dynamic batch / image axes (enables batched
+                  ``detect_batch``, at some CPU speed cost).
+        registry: Registry to update; defaults to one over ``settings.model_dir``.
+
+    Returns:
+        Path of the written ``.onnx`` file.
+    """
+    from ultralytics import YOLO
+
+    registry = registry or ModelRegistry()
+    version = version or settings.model_version
+    weights = registry.get_model_path("yolo_face", version)
+
+    exported = Path(
+        YOLO(str(weights)).export(
+            format="onnx",
+            imgsz=imgsz or settings.detection_input_size,
+            opset=opset,
+            dynamic=dynamic,
+            simplify=True,
+        )
+    )
+    target = weights.with_suffix(".onnx")
+    if exported.resolve() != target.resolve():
+        shutil.move(str(exported), target)
+
+    registry.register("yolo_face_onnx", version, target.relative_to(registry.model_dir).as_posix())
+    logger.info("Exported %s → %s", weights, target)
+    return target
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--version", default=None, help="model version (default: settings)")
+    parser.add_argument("--imgsz", type=int, default=None, help="input size (default: settings)")
+    parser.add_argument("--opset", type=int, default=12)
+    parser.add_argument("--dynamic", action="store_true", help="dynamic batch / image axes")
+    args = parser.parse_args()
+
+    path = export(args.version, args.imgsz, args.opset, args.dynamic)
+    print(f"Wrote {path} — set DETECTOR_BACKEND=onnx (or DEVICE=cpu with the default 'auto')")
+
+
+if __name__ == "__main__":
+    main()
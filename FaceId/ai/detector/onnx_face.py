@@ -0,0 +1,218 @@
+"""
+ai/detector/onnx_face.py
+------------------------
+YOLO face detector running an ONNX export directly on onnxruntime.
+
+Same interface as :class:`~ai.detector.yolo_face.YOLOFaceDetector`, but
+with no torch / ultralytics import: pre-processing (letterbox) and
+post-processing (box decoding + NMS) are plain NumPy, so CPU nodes start
+faster and avoid the ultralytics per-call overhead.
+
+Create the model once with::
+
+    python -m ai.detector.export_onnx
+
+Expected model output is the ultralytics YOLOv8 layout
+``(batch, 4 + classes [+ keypoints], anchors)`` with ``cx, cy, w, h`` in
+input pixels.  The class count and keypoint shape come from the metadata
+ultralytics writes into the export (``names`` / ``nc``, ``kpt_shape``),
+so a face-landmark (pose) export is scored on its class channels only.
+"""
+
+from __future__ import annotations
+
+import ast
+import logging
+import math
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_PAD_VALUE = 114   # ultralytics letterbox grey
+_NMS_IOU = 0.45
+
+
+class ONNXFaceDetector:
+    """Detect faces with an ONNX-exported YOLO model on onnxruntime.
+
+    Args:
+        model_path: Path to the ``.onnx`` file.
+    """
+
+    def __init__(self, model_path: str | Path) -> None:
+        t0 = time.perf_counter()
+
+        providers = ["CPUExecutionProvider"]
+        if settings.device == "cuda" and "CUDAExecutionProvider" in ort.get_available_providers():
+            providers.insert(0, "CUDAExecutionProvider")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_path), options, providers=providers)
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch_dim, _, height, width = model_input.shape
+        # A fixed-size export dictates the input size; dynamic axes use the setting
+        self.input_size = height if isinstance(height, int) else settings.detection_input_size
+        self.dynamic_batch = not isinstance(batch_dim, int)
+        self.conf_threshold = settings.detection_conf_threshold
+        channels = self.session.get_outputs()[0].shape[1]
+        self.num_classes = class_channels(
+            self.session.get_modelmeta().custom_metadata_map,
+            channels if isinstance(channels, int) else None,
+        )
+        self.device = "cuda" if providers[0] == "CUDAExecutionProvider" else "cpu"
+
+        logger.info(
+            "ONNX face detector loaded from %s in %.2fs (%s, input=%d, classes=%s)",
+            model_path, time.perf_counter() - t0, providers[0], self.input_size,
+            self.num_classes or "all",
+        )
+
+    # ── Public API ──────────────────────────────────────────────────────────
+
+    def detect(self, frame) -> list[list[int]]:
+        """Run inference on *frame* and return ``[x1, y1, x2, y2]`` boxes."""
+        t0 = time.perf_counter()
+        try:
+            boxes = self._infer([frame])[0]
+            logger.debug(
+                "detect() → %d faces in %.1fms", len(boxes), (time.perf_counter() - t0) * 1000
+            )
+            return boxes
+        except Exception:
+            logger.exception("Error during face detection")
+            return []
+
+    def detect_batch(self, frames) -> list[list[list[int]]]:
+        """Run inference over several frames (one call if the export allows it)."""
+        if len(frames) == 0:
+            return []
+        t0 = time.perf_counter()
+        try:
+            if self.dynamic_batch:
+                batch = self._infer(list(frames))
+            else:
+                batch = [self._infer([f])[0] for f in frames]
+            logger.debug(
+                "detect_batch() → %d frames in %.1fms",
+                len(frames), (time.perf_counter() - t0) * 1000,
+            )
+            return batch
+        except Exception:
+            logger.exception("Error during batched face detection")
+            return [[] for _ in frames]
+
+    # ── Helpers ─────────────────────────────────────────────────────────────
+
+    def _infer(self, frames: list[np.ndarray]) -> list[list[list[int]]]:
+        blobs, metas = zip(*(letterbox(f, self.input_size) for f in frames))
+        (output,) = self.session.run(None, {self.input_name: np.stack(blobs)})
+        return [
+            decode(pred, ratio, pad, frame.shape[:2], self.conf_threshold, self.num_classes)
+            for pred, (ratio, pad), frame in zip(output, metas, frames)
+        ]
+
+
+def class_channels(metadata: dict[str, str], channels: int | None) -> int | None:
+    """Number of class-score channels after the 4 box channels.
+
+    Read from the export metadata: ``nc`` or the length of ``names``,
+    else the output width minus the ``kpt_shape`` keypoint channels.
+    ``None`` (every channel after the box is a class score) when the
+    export carries neither.
+    """
+    try:
+        if "nc" in metadata:
+            return int(metadata["nc"])
+        if "names" in metadata:
+            return len(ast.literal_eval(metadata["names"]))
+        if "kpt_shape" in metadata and channels is not None:
+            return channels - 4 - math.prod(ast.literal_eval(metadata["kpt_shape"]))
+    except (ValueError, SyntaxError, TypeError):
+        logger.warning("Unreadable ONNX class metadata %r — scoring every channel", metadata)
+    return None
+
+
+def letterbox(frame: np.ndarray, size: int) -> tuple[np.ndarray, tuple[float, tuple[float, float]]]:
+    """Resize *frame* into a ``size × size`` square, keeping its aspect ratio.
+
+    Returns:
+        ``(blob, (ratio, (pad_x, pad_y)))`` — a ``(3, size, size)`` float32
+        RGB blob in ``[0, 1]`` and the transform needed to map boxes back.
+    """
+    h, w = frame.shape[:2]
+    ratio = min(size / h, size / w)
+    new_w, new_h = round(w * ratio), round(h * ratio)
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, left = round(pad_y - 0.1), round(pad_x - 0.1)
+    canvas = np.full((size, size, 3), _PAD_VALUE, dtype=np.uint8)
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    blob = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob), (ratio, (left, top))
+
+
+def decode(
+    pred: np.ndarray,
+    ratio: float,
+    pad: tuple[float, float],
+    shape: tuple[int, int],
+    conf_threshold: float,
+    num_classes: int | None = None,
+) -> list[list[int]]:
+    """Turn one ``(4 + classes [+ keypoints], anchors)`` prediction into
+    frame-pixel boxes; only the first *num_classes* channels after the box
+    are scores (all of them when ``None``)."""
+    pred = pred.T                                  # (anchors, 4 + classes [+ keypoints])
+    end = None if num_classes is None else 4 + num_classes
+    scores = pred[:, 4:end].max(axis=1)
+    keep = scores >= conf_threshold
+    if not keep.any():
+        return []
+    pred, scores = pred[keep], scores[keep]
+
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+    boxes -= np.array([pad[0], pad[1], pad[0], pad[1]], dtype=boxes.dtype)
+    boxes /= ratio
+    height, width = shape
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, width)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, height)
+
+    kept = nms(boxes, scores, _NMS_IOU)
+    return boxes[kept].astype(int).tolist()
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression; returns kept indices, best first.
+
+    The full pairwise IoU matrix is computed in one vectorised step; the
+    greedy pass then only flips boolean masks.
+    """
+    order = np.argsort(-scores)
+    boxes = boxes[order]
+    x1, y1, x2, y2 = boxes.T
+    area = (x2 - x1) * (y2 - y1)
+    iw = (np.minimum(x2[:, None], x2) - np.maximum(x1[:, None], x1)).clip(0)
+    ih = (np.minimum(y2[:, None], y2) - np.maximum(y1[:, None], y1)).clip(0)
+    inter = iw * ih
+    iou = inter / (area[:, None] + area - inter + 1e-9)
+
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        suppressed |= iou[i] > iou_threshold
+    return order[keep]
@@ -13,6 +13,7 @@ import time
 import torch
 from ultralytics import YOLO  # <-- We import the modern API here
 
+from ai.model_registry import registry
 from configs.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -22,17 +23,19 @@ class YOLOFaceDetector:
     """Detect faces in an image frame using a custom YOLO model.
 
     Args:
-        model_path: Optional path override. Defaults to the versioned
-                    path from ``settings.model_path``.
+        model_path: Optional path override. Defaults to the ``yolo_face``
+                    entry of the model registry for *version*.
+        version:    Registry version (e.g. ``"v2"``). Defaults to
+                    ``settings.model_version``.
     """
 
-    def __init__(self, model_path: str | None = None):
+    def __init__(self, model_path: str | None = None, version: str | None = None):
         t0 = time.perf_counter()
 
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         logger.info(f"🔥 YOLO running on device: {self.device}")
 
-        model_path = model_path or "models/v1/yolo_face.pt"
+        model_path = model_path or str(registry.get_model_path("yolo_face", version))
 
         self.model = YOLO(model_path)
 
@@ -83,6 +86,40 @@ class YOLOFaceDetector:
             logger.exception("Error during face detection")
             return []
 
+    def detect_batch(self, frames) -> list[list[list[int]]]:
+        """Run one batched inference over several frames.
+
+        Args:
+            frames: Sequence of BGR numpy arrays (sizes may differ).
+
+        Returns:
+            One list of ``[x1, y1, x2, y2]`` boxes per input frame.
+        """
+        if len(frames) == 0:
+            return []
+        t0 = time.perf_counter()
+        try:
+            results = self.model(
+                list(frames),
+                imgsz=self.input_size,
+                conf=self.conf_threshold,
+                device=self.device,
+                verbose=False
+            )
+            batch = [
+                [list(map(int, box.xyxy[0].tolist())) for box in r.boxes]
+                for r in results
+            ]
+            logger.debug(
+                "detect_batch() → %d frames in %.1fms",
+                len(frames),
+                (time.perf_counter() - t0) * 1000,
+            )
+            return batch
+        except Exception:
+            logger.exception("Error during batched face detection")
+            return [[] for _ in frames]
+
     # ── Helpers ─────────────────────────────────────────────────────────────
 
     @staticmethod
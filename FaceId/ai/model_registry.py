@@ -17,9 +17,14 @@ Registry file format (``models/registry.json``):
         "yolo_face": {
           "v1": "v1/yolo_face.pt",
           "v2": "v2/yolo_face.pt"
+        },
+        "yolo_face_onnx": {
+          "v1": "v1/yolo_face.onnx"
         }
       }
     }
+
+``yolo_face_onnx`` entries are written by ``python -m ai.detector.export_onnx``.
 """
 
 from __future__ import annotations
@@ -45,7 +50,13 @@ class ModelRegistry:
 
     def __init__(self, model_dir: Path | None = None) -> None:
         self._model_dir = Path(model_dir or settings.model_dir)
-        self._registry: dict = self._load_registry()
+        self._data: dict | None = None   # read on first use, not at import
+
+    @property
+    def _registry(self) -> dict:
+        if self._data is None:
+            self._data = self._load_registry()
+        return self._data
 
     # ── Public API ───────────────────────────────────────────────────────────
 
@@ -69,6 +80,28 @@ class ModelRegistry:
             FileNotFoundError: If the resolved file does not exist.
         """
         version = version or settings.model_version
+        full_path = self._model_dir / self.get_entry(model_name, version)
+
+        if not full_path.exists():
+            raise FileNotFoundError(
+                f"Model file not found: {full_path}. "
+                "Did you place the weights in the correct version directory?"
+            )
+
+        logger.info("Resolved model '%s@%s' → %s", model_name, version, full_path)
+        return full_path
+
+    def get_entry(self, model_name: str, version: str | None = None) -> str:
+        """Return the raw registry value for ``model_name@version``.
+
+        Unlike :meth:`get_model_path` the value is not resolved or checked
+        on disk — used for entries that name a model pack rather than a
+        file (e.g. ``arcface`` → ``"buffalo_l"``).
+
+        Raises:
+            KeyError: If *model_name* or *version* is not in registry.
+        """
+        version = version or settings.model_version
         models = self._registry.get("models", {})
 
         if model_name not in models:
@@ -79,18 +112,36 @@ class ModelRegistry:
                 f"Version '{version}' not found for '{model_name}'. "
                 f"Available: {available}"
             )
+        return models[model_name][version]
 
-        relative = models[model_name][version]
-        full_path = self._model_dir / relative
+    def versions(self, model_name: str) -> list[str]:
+        """Registered versions of *model_name* (empty if unknown)."""
+        return sorted(self._registry.get("models", {}).get(model_name, {}))
 
-        if not full_path.exists():
-            raise FileNotFoundError(
-                f"Model file not found: {full_path}. "
-                "Did you place the weights in the correct version directory?"
-            )
+    def reload(self) -> None:
+        """Re-read ``registry.json`` so newly added versions can be resolved."""
+        self._data = self._load_registry()
 
-        logger.info("Resolved model '%s@%s' → %s", model_name, version, full_path)
-        return full_path
+    def register(self, model_name: str, version: str, relative_path: str) -> None:
+        """Add (or replace) ``model_name@version`` and save ``registry.json``.
+
+        Args:
+            model_name:    Key in the registry (e.g. ``"yolo_face_onnx"``).
+            version:       Version string (e.g. ``"v1"``).
+            relative_path: File path relative to the model directory.
+        """
+        self._registry.setdefault("models", {}).setdefault(model_name, {})[version] = relative_path
+        registry_path = self._model_dir / _REGISTRY_FILE
+        registry_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(registry_path, "w", encoding="utf-8") as f:
+            json.dump(self._registry, f, indent=2)
+            f.write("\n")
+        logger.info("Registered model '%s@%s' → %s", model_name, version, relative_path)
+
+    @property
+    def model_dir(self) -> Path:
+        """Root directory the registry paths are relative to."""
+        return self._model_dir
 
     @property
     def default_version(self) -> str:
@@ -117,5 +168,5 @@ class ModelRegistry:
         return data
 
 
-# Module-level singleton — import and use directly
+# Module-level singleton — import and use directly (reads registry.json lazily)
 registry = ModelRegistry()
@@ -0,0 +1,149 @@
+"""
+ai/models.py
+------------
+Versioned, reference-counted model bundles for hot-swapping.
+
+A :class:`ModelSet` holds the detector and recognizer of one registry
+version.  The pipeline keeps exactly one *active* set; every frame leases
+it when it starts and releases it when its result is built, so a frame
+always runs detection and recognition on the same version.
+
+Swapping versions (``FacePipeline.swap_models``)::
+
+    load new set → warm up → swap the active pointer → retire the old set
+
+Frames already in flight keep their lease on the old set; it drops its
+models only once the last of them has finished, so a rollout or rollback
+neither drops a stream nor serves a cold model.
+"""
+
+from __future__ import annotations
+
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ai.detector import create_detector
+from ai.model_registry import registry
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_WARMUP_CHIP = 112   # ArcFace input size
+
+
+class ModelSet:
+    """Detector + recognizer of one model version, with a lease count.
+
+    Args:
+        detector:   Face detector (``detect`` / ``detect_batch``).
+        recognizer: Embedding model (``embed`` / ``embed_batch``).
+        version:    Registry version the models were loaded from.
+    """
+
+    def __init__(self, detector, recognizer, version: str | None = None) -> None:
+        self.detector = detector
+        self.recognizer = recognizer
+        self.version = version or settings.model_version
+        self._lock = threading.Lock()
+        self._leases = 0
+        self._retired = False
+
+    @classmethod
+    def load(cls, version: str | None = None) -> ModelSet:
+        """Load detector and recognizer for *version* from the registry.
+
+        The two are independent, so they load on parallel threads —
+        weight I/O, ONNX graph optimisation and CUDA setup release the
+        GIL for most of that time.
+        """
+        from ai.recognizer.arcface import ArcFaceRecognizer   # imports insightface
+
+        version = version or settings.model_version
+        registry.reload()   # pick up versions added since startup
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-load") as pool:
+            detector = pool.submit(_timed, "detector", create_detector, version=version)
+            recognizer = pool.submit(_timed, "recognizer", ArcFaceRecognizer, version=version)
+            models = cls(detector.result(), recognizer.result(), version)
+        logger.info("Model set %s loaded in %.2fs", version, time.perf_counter() - t0)
+        return models
+
+    def warm_up(self) -> float:
+        """Run dummy inferences at every configured size; returns the time taken (s).
+
+        The first call of a freshly loaded model pays for lazy
+        allocation, kernel selection and (on GPU) CUDA context setup,
+        and each new batch shape can pay again — that cost is paid here
+        instead of by the first live frames.  Batch sizes warmed are 1
+        and, in ``batched`` / ``staged`` mode, ``batch_max_frames``.
+
+        The recognition network is called directly on blank chips: going
+        through ``embed_batch`` would stop at the landmark step, which
+        finds no face on a blank image, and never reach it.
+        """
+        t0 = time.perf_counter()
+        size = getattr(self.detector, "input_size", None) or settings.detection_input_size
+        frame = np.zeros((size, size, 3), dtype=np.uint8)
+        chip = np.zeros((_WARMUP_CHIP, _WARMUP_CHIP, 3), dtype=np.uint8)
+        for batch in _warmup_batches():
+            self.detector.detect_batch([frame] * batch)
+            self.recognizer.rec_model.get_feat([chip] * batch)   # get_feat wants a list
+        if self.recognizer.det_model is not None:   # SCRFD landmarks ("full" / "aligned")
+            self.recognizer.det_model.detect(chip)
+        elapsed = time.perf_counter() - t0
+        logger.info("Model set %s warmed up in %.2fs", self.version, elapsed)
+        return elapsed
+
+    # ── Leases ───────────────────────────────────────────────────────────────
+
+    def acquire(self, count: int = 1) -> None:
+        """Take *count* leases (one per frame about to use these models)."""
+        with self._lock:
+            self._leases += count
+
+    def release(self, count: int = 1) -> None:
+        """Return *count* leases; frees the models if retired and unused."""
+        with self._lock:
+            self._leases -= count
+            close = self._retired and self._leases == 0
+        if close:
+            self._close()
+
+    def retire(self) -> None:
+        """Mark the set as replaced; it is freed once no lease remains."""
+        with self._lock:
+            self._retired = True
+            close = self._leases == 0
+        if close:
+            self._close()
+
+    @property
+    def in_flight(self) -> int:
+        """Frames currently holding a lease."""
+        return self._leases
+
+    def _close(self) -> None:
+        self.detector = None
+        self.recognizer = None
+        torch = sys.modules.get("torch")   # never import it just to free memory
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        logger.info("Model set %s released", self.version)
+
+
+def _timed(name: str, build, **kwargs):
+    t0 = time.perf_counter()
+    model = build(**kwargs)
+    logger.info("Loaded %s in %.2fs", name, time.perf_counter() - t0)
+    return model
+
+
+def _warmup_batches() -> list[int]:
+    if settings.execution_mode in ("batched", "staged") and settings.batch_max_frames > 1:
+        return [1, settings.batch_max_frames]
+    return [1]
@@ -10,22 +10,75 @@ identified in production logs.
 """
 
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import Any
-import requests
+
 import numpy as np
 
-from ai.detector.yolo_face import YOLOFaceDetector
-from ai.recognizer.arcface import ArcFaceRecognizer
+from ai.models import ModelSet
+from ai.recognizer.budget import EmbedBudget
 from ai.recognizer.embedding_cache import EmbeddingCache
-from ai.tracker.bot_sort import BoTSORT
+from ai.recognizer.quality import QualityGate
+from ai.recognizer.template import cosine_distance
+from ai.session import SessionState
+from ai.types import Track
 from behavior.engagement import compute_engagement
 from behavior.head_pose import estimate_pose
+from behavior.head_pose import warm_up as warm_up_pose
 from configs.settings import settings
-from storage.vector_search import cosine_search
+from storage.attendance_outbox import outbox
+from storage.shared_identity import shared_identity
+from storage.vector_search import SearchResult, cosine_search_many
 
 logger = logging.getLogger(__name__)
 
+_CROP_PAD = 30  # margin (px) added around each face box before cropping
+
+
+def _warm_up_cpu_stages() -> float:
+    """Build this thread's FaceMesh and load the tracker's SciPy solvers."""
+    t0 = time.perf_counter()
+    warm_up_pose()
+    # deferred by ai.tracker; both bind ``scipy``, so only the last is unused
+    import scipy.linalg
+    import scipy.optimize  # noqa: F401
+    return time.perf_counter() - t0
+
+
+@dataclass
+class _FaceWork:
+    """Intermediate per-track state carried between pipeline stages."""
+
+    track: Track
+    bbox: list[int]
+    crop: np.ndarray
+    crop_box: list[int]  # bbox expressed in crop coordinates
+    frame_id: int
+    session_id: str = ""
+    scale: int = 1       # decode downscale factor of the frame
+    match: SearchResult | None = None
+    fresh: bool = False  # match comes from a search made this frame
+
+
+@dataclass
+class _FrameWork:
+    """Intermediate per-frame state carried between pipeline stages."""
+
+    state: SessionState
+    frame: np.ndarray
+    frame_id: int
+    models: ModelSet
+    log_prefix: str
+    t_start: float
+    scale: int = 1       # decode downscale factor (see app.decoding)
+    faces: list[_FaceWork] = field(default_factory=list)
+    live_ids: set[int] = field(default_factory=set)
+    output: list[dict[str, Any]] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+
 
 class FacePipeline:
     """End-to-end face recognition and behaviour analysis pipeline.
@@ -33,7 +86,13 @@ class FacePipeline:
     Typical usage::
 
         pipeline = FacePipeline()
-        results = pipeline.process(frame)
+        session = pipeline.open_session("cam-1")
+        results = pipeline.process(frame, session)
+
+    The models are shared by every stream; per-stream state (tracker,
+    frame counter, smoothing history) lives in a :class:`SessionState`.
+    Calling :meth:`process` without a session uses a built-in default
+    session, which is convenient for scripts and tests.
 
     Each element of *results* is a dict with keys:
       - ``track_id``   – stable integer track identifier
@@ -44,18 +103,138 @@ class FacePipeline:
       - ``yaw``        – head yaw angle in degrees
       - ``roll``       – head roll angle in degrees
       - ``engagement`` – ``"high"`` | ``"medium"`` | ``"low"``
+
+    The detector and recognizer live in a :class:`~ai.models.ModelSet`
+    that :meth:`swap_models` can replace while frames are running.
     """
 
     def __init__(self) -> None:
         logger.info("Initialising FacePipeline …")
-        self.detector = YOLOFaceDetector()
-        self.tracker = BoTSORT()
-        self.recognizer = ArcFaceRecognizer()
+        t0 = time.perf_counter()
+        # this thread's FaceMesh and SciPy build while the detector and
+        # recognizer load on their own threads (frame threads still build
+        # their own FaceMesh on first use — see head_pose.warm_up)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-load") as loader:
+            loading = loader.submit(ModelSet.load)
+            t_pose = _warm_up_cpu_stages()
+            self.models = loading.result()
+        t_load = time.perf_counter() - t0
+        t_warm = self.models.warm_up()
+        self.startup = {
+            "load_s": round(t_load, 3),
+            "warmup_s": round(t_warm, 3),
+            "pose_s": round(t_pose, 3),
+        }
         self.cache = EmbeddingCache()
-        self.frame_id: int = 0
-        self.marked_attendance = set() # prevent duplicate attendance
-        self.track_history = {}
-        logger.info("FacePipeline ready")
+        self.quality = QualityGate()
+        self.budget = EmbedBudget()
+        self.shared = shared_identity
+        self._search_lock = threading.Lock()
+        self._search_counts = {"searched": 0, "reused": 0, "unlocks": 0}
+        self._models_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._sessions: dict[str, SessionState] = {}
+        self._sessions_lock = threading.Lock()
+        self._default_session = SessionState()
+        logger.info(
+            "FacePipeline ready in %.2fs (load=%.2fs warmup=%.2fs)",
+            time.perf_counter() - t0, t_load, t_warm,
+        )
+
+    @property
+    def detector(self):
+        """Detector of the active model set."""
+        return self.models.detector
+
+    @property
+    def recognizer(self):
+        """Recognizer of the active model set."""
+        return self.models.recognizer
+
+    @property
+    def model_version(self) -> str:
+        """Registry version of the active model set."""
+        return self.models.version
+
+    # ── Model hot-swap ───────────────────────────────────────────────────────
+
+    def swap_models(self, version: str) -> dict[str, Any]:
+        """Load, warm up and activate model *version* without stopping streams.
+
+        Frames keep running on the current models while the new ones
+        load.  The switch itself is a single pointer swap; frames that
+        started before it finish on the old set, which is released when
+        the last of them is done.
+
+        Raises:
+            KeyError / FileNotFoundError: *version* is not in the registry.
+            RuntimeError: Another swap is already in progress.
+        """
+        if not self._swap_lock.acquire(blocking=False):
+            raise RuntimeError("a model swap is already in progress")
+        try:
+            t0 = time.perf_counter()
+            new = ModelSet.load(version)
+            t_load = time.perf_counter() - t0
+            t_warm = new.warm_up()
+            with self._models_lock:
+                old, self.models = self.models, new
+            draining = old.in_flight
+            old.retire()
+        finally:
+            self._swap_lock.release()
+        logger.info(
+            "Model version %s → %s (load=%.2fs warmup=%.2fs, %d frames draining)",
+            old.version, version, t_load, t_warm, draining,
+        )
+        return {
+            "version": version,
+            "previous": old.version,
+            "load_s": round(t_load, 3),
+            "warmup_s": round(t_warm, 3),
+            "draining_frames": draining,
+        }
+
+    def _lease(self, count: int = 1) -> ModelSet:
+        """Return the active model set with *count* leases taken on it."""
+        with self._models_lock:
+            models = self.models
+            models.acquire(count)
+        return models
+
+    # ── Session management ───────────────────────────────────────────────────
+
+    def open_session(self, session_id: str) -> SessionState:
+        """Create (or return) the per-stream state for *session_id*."""
+        with self._sessions_lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = SessionState(session_id=session_id)
+                self._sessions[session_id] = state
+            return state
+
+    def close_session(self, session_id: str) -> None:
+        """Release the per-stream state for *session_id*."""
+        with self._sessions_lock:
+            self._sessions.pop(session_id, None)
+        self.cache.drop_session(session_id)
+
+    @property
+    def session_count(self) -> int:
+        """Number of open per-stream sessions."""
+        return len(self._sessions)
+
+    def recognition_stats(self) -> dict[str, Any]:
+        """Counters of the recognition stage (for ``/metrics``)."""
+        with self._search_lock:
+            search = dict(self._search_counts)
+        return {
+            "quality": self.quality.stats(),
+            "budget": self.budget.stats(),
+            "search": search,
+            "cache": self.cache.stats(),
+            "shared": self.shared.stats(),
+        }
 
     def reload_state(self):
             """
@@ -63,187 +242,445 @@ class FacePipeline:
             Useful after enrolling new students.
             """
             logger.info("Reloading pipeline runtime state...")
-            # Clear attendance protection
-            self.marked_attendance.clear()
-            # Clear confidence smoothing history
-            self.track_history.clear()
-            # Reset tracker
-            self.tracker = BoTSORT()
-            logger.info("Pipeline state reset complete")
+            with self._sessions_lock:
+                states = [self._default_session, *self._sessions.values()]
+            # Reset trackers, smoothing history and attendance protection
+            for state in states:
+                state.reset()
+            self.cache.clear()
+            if self.shared.enabled:
+                self.shared.clear()
+            logger.info("Pipeline state reset complete (%d sessions)", len(states))
 
     # ── Main entry point ─────────────────────────────────────────────────────
 
-    def process(self, frame: np.ndarray, session_id: str = "") -> list[dict[str, Any]]:
+    def process(
+        self,
+        frame: np.ndarray,
+        session: SessionState | None = None,
+        scale: int = 1,
+    ) -> list[dict[str, Any]]:
         """Process one video frame through the full pipeline.
 
+        Recognition is frame-level: every due track is embedded first, then
+        all embeddings of the frame are resolved with a single
+        :func:`cosine_search_many` call.
+
         Args:
-            frame:      BGR numpy array (H × W × 3).
-            session_id: Optional correlation ID logged with every entry.
+            frame:   BGR numpy array (H × W × 3).
+            session: Per-stream state from :meth:`open_session`. Defaults
+                     to the pipeline's built-in single-stream session.
+            scale:   Factor *frame* was downscaled by when decoded (see
+                     :func:`app.decoding.decode_frame`); the quality gate
+                     measures faces in the client's pixels.
 
         Returns:
             List of per-face result dicts (see class docstring).
         """
-        self.frame_id += 1
-        t_total = time.perf_counter()
-        log_prefix = f"[frame={self.frame_id}]"
-        if session_id:
-            log_prefix = f"[session={session_id}][frame={self.frame_id}]"
-
+        work = self._begin(frame, session, scale=scale)
         try:
             # ── Stage 1: Detection ──────────────────────────────────────────
             t0 = time.perf_counter()
-            detections = self.detector.detect(frame)
-            t_detect = time.perf_counter() - t0
+            detections = work.models.detector.detect(frame)
+            work.timings["detect"] = time.perf_counter() - t0
+
+            self._track(work, detections)
+            self._recognise([work])
+            return self._finish(work)
 
-            # ── Stage 2: Tracking ───────────────────────────────────────────
+        except Exception:
+            logger.exception("%s Unhandled error during pipeline.process()", work.log_prefix)
+            return []
+        finally:
+            self._end(work)
+
+    def process_batch(
+        self,
+        frames: list[np.ndarray],
+        sessions: list[SessionState | None],
+        scales: list[int] | None = None,
+    ) -> list[list[dict[str, Any]]]:
+        """Process frames from several streams with shared model calls.
+
+        All frames go through one batched YOLO call, every due face crop
+        of every frame through one ArcFace batch, and all embeddings
+        through one gallery search.  Tracking and identity state stay
+        per session.  Frames of the same session must be passed in order.
+        *scales* are the frames' decode factors, as for :meth:`process`.
+
+        Returns:
+            One result list per input frame, in input order.
+        """
+        models = self._lease(len(frames))
+        scales = scales or [1] * len(frames)
+        works = [
+            self._begin(f, s, models, scale)
+            for f, s, scale in zip(frames, sessions, scales)
+        ]
+        try:
             t0 = time.perf_counter()
-            tracks = self.tracker.update(detections)
-            t_track = time.perf_counter() - t0
-
-            output: list[dict[str, Any]] = []
-
-            t_recog = 0.0
-            t_behav = 0.0
-
-            for t in tracks:
-                x1, y1, x2, y2 = [int(v) for v in t.bbox]
-
-                if not hasattr(t, "last_seen_frame"):
-                    t.last_seen_frame = self.frame_id
-                else:
-                    t.last_seen_frame = self.frame_id
-                # Guard against degenerate boxes
-                if x2 <= x1 or y2 <= y1:
-                    logger.debug("%s Skipping degenerate bbox for track %d", log_prefix, t.track_id)
-                    continue
-
-                pad = 30  # add margin around face
-
-                h, w, _ = frame.shape
-
-                x1p = max(0, x1 - pad)
-                y1p = max(0, y1 - pad)
-                x2p = min(w, x2 + pad)
-                y2p = min(h, y2 + pad)
-
-                face_crop = frame[y1p:y2p, x1p:x2p]
-
-                # ── Stage 3: Recognition (every EMBED_INTERVAL frames) ──────
-                t0 = time.perf_counter()
-                t_recog = 0.0
-
-                if self.frame_id - t.last_embed_frame >= settings.embed_interval:
-                    emb = self.recognizer.embed(face_crop)
-                    if emb is not None:
-                        self.cache.set(t.track_id, emb)
-                        t.embedding = emb
-                        t.last_embed_frame = self.frame_id
-
-                    t_recog = time.perf_counter() - t0
-
-                # ── Stage 4: Identity matching ──────────────────────────────
-                student_id = None
-                confidence = None
-                status = "unknown"
-
-                if hasattr(t, "locked_id") and t.locked_id is not None:
-                    # 🔥 Re-validate locked identity
-                    if t.embedding is not None:
-                        match = cosine_search(t.embedding)
-                        if match is None or match.d > settings.sim_threshold:
-                            logger.info(f"Unlocking track {t.track_id} due to similarity drop")
-                            t.locked_id = None
-                            t.locked_conf = None
-                        else:
-                            student_id = t.locked_id
-                            confidence = t.locked_conf
-                            status = "recognized"
-                    else:
-                        student_id = t.locked_id
-                        confidence = t.locked_conf
-                        status = "recognized"
-
-                else:
-                    if t.embedding is not None:
-                        match = cosine_search(t.embedding)
-
-                        if match is not None and match.d <= settings.sim_threshold:
-                            student_id = match.student_id
-                            raw_conf = 1.0 - float(match.d)
-
-                            history = self.track_history.setdefault(t.track_id, [])
-                            history.append(raw_conf)
-
-                            if len(history) > 5:
-                                history.pop(0)
-
-                            confidence = round(sum(history) / len(history), 4)
-                            status = "recognized"
-
-                            t.locked_id = student_id
-                            t.locked_conf = confidence
-
-                            if student_id not in self.marked_attendance:
-                                try:
-                                    url = f"http://spring:8080/attendance/auto/{student_id}"
-                                    response = requests.post(url)
-
-                                    if response.status_code == 200:
-                                        logger.info(f"Attendance marked in DB for student {student_id}")
-                                        self.marked_attendance.add(student_id)
-
-                                    elif response.status_code == 409:
-                                        logger.info(f"Attendance already marked for student {student_id}")
-                                        self.marked_attendance.add(student_id)
-
-                                    else:
-                                        logger.warning(f"Spring response: {response.status_code} - {response.text}")
-
-                                except Exception as e:
-                                    logger.error(f"Error calling Spring attendance API: {e}")
-                        else:
-                            # 🔥 Log unknown only once per track
-                            if not hasattr(t, "unknown_logged"):
-                                logger.info(f"Unknown face detected (track {t.track_id})")
-                                t.unknown_logged = True
-
-                # ── Stage 5: Behaviour analysis ─────────────────────────────
-                t0 = time.perf_counter()
-                pitch, yaw, roll = estimate_pose(face_crop)
-                engagement = compute_engagement(pitch, yaw)
-                t_behav = time.perf_counter() - t0
-
-                output.append(
-                    {
-                        "track_id": t.track_id,
-                        "bbox": [x1, y1, x2, y2],
-                        "student_id": student_id,
-                        "confidence": confidence,
-                        "status": status,
-                        "pitch": round(pitch, 2),
-                        "yaw": round(yaw, 2),
-                        "roll": round(roll, 2),
-                        "engagement": engagement,
-                    }
+            batch_detections = models.detector.detect_batch(frames)
+            t_detect = time.perf_counter() - t0
+
+            for work, detections in zip(works, batch_detections):
+                work.timings["detect"] = t_detect
+                self._track(work, detections)
+            self._recognise(works)
+        except Exception:
+            logger.exception("[batch=%d] Unhandled error during pipeline.process_batch()", len(works))
+            models.release(len(works))
+            return [[] for _ in works]
+
+        outputs = []
+        for work in works:
+            try:
+                outputs.append(self._finish(work))
+            except Exception:
+                logger.exception("%s Unhandled error during pipeline.process_batch()", work.log_prefix)
+                outputs.append([])
+            finally:
+                self._end(work)
+        return outputs
+
+    # ── Stages ───────────────────────────────────────────────────────────────
+
+    def _begin(
+        self,
+        frame: np.ndarray,
+        session: SessionState | None,
+        models: ModelSet | None = None,
+        scale: int = 1,
+    ) -> _FrameWork:
+        """Advance the session's frame counter and open a frame record.
+
+        *models* must already be leased for this frame (see :meth:`_lease`);
+        by default the active set is leased here.  :meth:`_end` returns it.
+        """
+        models = models if models is not None else self._lease()
+        state = session if session is not None else self._default_session
+        state.frame_id += 1
+        log_prefix = f"[frame={state.frame_id}]"
+        if state.session_id:
+            log_prefix = f"[session={state.session_id}][frame={state.frame_id}]"
+        return _FrameWork(
+            state=state,
+            frame=frame,
+            frame_id=state.frame_id,
+            models=models,
+            log_prefix=log_prefix,
+            t_start=time.perf_counter(),
+            scale=scale,
+        )
+
+    def _end(self, work: _FrameWork) -> None:
+        """Release the frame's model lease."""
+        work.models.release()
+
+    def _track(self, work: _FrameWork, detections: list[list[int]]) -> None:
+        """Stage 2: update the session tracker and crop every live face."""
+        t0 = time.perf_counter()
+        tracks = work.state.tracker.update(detections)
+        work.live_ids = {t.track_id for t in tracks}
+        work.faces = self._collect_faces(
+            work.frame, tracks, work.frame_id, work.log_prefix, work.state.session_id
+        )
+        for face in work.faces:
+            face.scale = work.scale
+        work.timings["track"] = time.perf_counter() - t0
+
+    def _recognise(self, works: list[_FrameWork]) -> None:
+        """Stages 3–4a: batched embedding and one search for all *works*."""
+        faces = [f for w in works for f in w.faces]
+
+        # ── Stage 3: Recognition (every EMBED_INTERVAL frames) ──────────────
+        # One batch per model set — only differs for frames straddling a swap
+        by_models: dict[int, tuple[ModelSet, list[_FrameWork]]] = {}
+        for work in works:
+            by_models.setdefault(id(work.models), (work.models, []))[1].append(work)
+        t0 = time.perf_counter()
+        for models, group in by_models.values():
+            self._embed_faces(
+                [f for w in group for f in w.faces], models.recognizer, frames=len(group)
+            )
+        t_recog = time.perf_counter() - t0
+
+        # ── Stage 4a: Identity search (one batched call) ────────────────────
+        t0 = time.perf_counter()
+        self._match_faces(faces)
+        t_search = time.perf_counter() - t0
+
+        for work in works:
+            work.timings["recog"] = t_recog
+            work.timings["match"] = t_search
+
+    def _finish(self, work: _FrameWork) -> list[dict[str, Any]]:
+        """Stages 4b–5: identity rules, behaviour analysis, result dicts."""
+        self._identify(work)
+        return self._behave(work)
+
+    def _identify(self, work: _FrameWork) -> None:
+        """Stage 4b: apply identity rules and build the result dicts.
+
+        Touches per-session state, so frames of one session must pass
+        through here in order.
+        """
+        state = work.state
+        t0 = time.perf_counter()
+        work.output = [self._resolve_identity(f, state) for f in work.faces]
+        work.timings["match"] = work.timings.get("match", 0.0) + time.perf_counter() - t0
+
+        for track_id in list(state.track_history.keys()):
+            if track_id not in work.live_ids:
+                state.track_history.pop(track_id, None)
+
+    def _behave(self, work: _FrameWork) -> list[dict[str, Any]]:
+        """Stage 5: head pose and engagement for every face.
+
+        Reads only the frame's own crops, so frames may run here in
+        parallel and out of order.
+        """
+        output = work.output
+        t0 = time.perf_counter()
+        for face, result in zip(work.faces, output):
+            pitch, yaw, roll = estimate_pose(face.crop)
+            result.update(
+                pitch=round(pitch, 2),
+                yaw=round(yaw, 2),
+                roll=round(roll, 2),
+                engagement=compute_engagement(pitch, yaw),
+            )
+        work.timings["behav"] = time.perf_counter() - t0
+
+        elapsed = (time.perf_counter() - work.t_start) * 1000
+        logger.debug(
+            "%s faces=%d | detect=%.1fms track=%.1fms "
+            "recog=%.1fms match=%.1fms behav=%.1fms | total=%.1fms",
+            work.log_prefix,
+            len(output),
+            work.timings.get("detect", 0.0) * 1000,
+            work.timings.get("track", 0.0) * 1000,
+            work.timings.get("recog", 0.0) * 1000,
+            work.timings.get("match", 0.0) * 1000,
+            work.timings.get("behav", 0.0) * 1000,
+            elapsed,
+        )
+        return output
+
+    def _collect_faces(
+        self,
+        frame: np.ndarray,
+        tracks: list[Track],
+        frame_id: int,
+        log_prefix: str,
+        session_id: str = "",
+    ) -> list[_FaceWork]:
+        """Crop a padded face region for every valid track."""
+        h, w = frame.shape[:2]
+        faces: list[_FaceWork] = []
+        for t in tracks:
+            x1, y1, x2, y2 = [int(v) for v in t.bbox]
+            t.last_seen_frame = frame_id
+
+            # Guard against degenerate boxes
+            if x2 <= x1 or y2 <= y1:
+                logger.debug("%s Skipping degenerate bbox for track %d", log_prefix, t.track_id)
+                continue
+
+            x1p = max(0, x1 - _CROP_PAD)
+            y1p = max(0, y1 - _CROP_PAD)
+            x2p = min(w, x2 + _CROP_PAD)
+            y2p = min(h, y2 + _CROP_PAD)
+
+            faces.append(
+                _FaceWork(
+                    track=t,
+                    bbox=[x1, y1, x2, y2],
+                    crop=frame[y1p:y2p, x1p:x2p],
+                    crop_box=[x1 - x1p, y1 - y1p, x2 - x1p, y2 - y1p],
+                    frame_id=frame_id,
+                    session_id=session_id,
                 )
-            for track_id in list(self.track_history.keys()):
-                if all(t.track_id != track_id for t in tracks):
-                    self.track_history.pop(track_id, None)
-
-            elapsed = (time.perf_counter() - t_total) * 1000
-            logger.debug(
-                "%s faces=%d | detect=%.1fms track=%.1fms "
-                "recog=%.1fms behav=%.1fms | total=%.1fms",
-                log_prefix,
-                len(output),
-                t_detect * 1000,
-                t_track * 1000,
-                t_recog * 1000,
-                t_behav * 1000,
-                elapsed,
             )
-            return output
+        return faces
+
+    def _embed_faces(self, faces: list[_FaceWork], recognizer, frames: int = 1) -> None:
+        """Refresh the embedding of every track that is due for one.
+
+        A due track whose cached embedding is still fresh keeps it
+        (:meth:`EmbeddingCache.reuse_embedding`).  Due crops that fail the
+        quality gate are skipped, and the embed budget (one per frame in
+        the call, *frames*) may defer some of the rest; either way the
+        track stays due and is reconsidered next frame.  The chosen crops go through one :meth:`embed_batch` call of
+        *recognizer* and are folded into their track's template, weighted
+        by crop quality.
+        """
+        due = [
+            f for f in faces
+            if f.frame_id - f.track.last_embed_frame >= settings.embed_interval
+            and not self._reuse_embedding(f)
+        ]
+        verdicts = self.quality.check(
+            [f.crop for f in due], [f.crop_box for f in due], [f.scale for f in due]
+        )
+        due = [(f, q) for f, q in zip(due, verdicts) if q.passed]
+        if not due:
+            return
+        chosen = self.budget.select(
+            [f.track for f, _ in due], [f.frame_id for f, _ in due], frames
+        )
+        due = [due[i] for i in chosen]
+        t0 = time.perf_counter()
+        embeddings = recognizer.embed_batch(
+            [f.crop for f, _ in due], [f.crop_box for f, _ in due]
+        )
+        self.budget.record(len(due), time.perf_counter() - t0)
+        for (face, quality), emb in zip(due, embeddings):
+            if not emb.any():  # no face found in this crop
+                continue
+            t = face.track
+            t.embedding = emb
+            t.template.add(emb, quality.weight)
+            t.last_embed_frame = face.frame_id
+
+    def _reuse_embedding(self, face: _FaceWork) -> bool:
+        """Adopt the track's cached embedding for this frame if it is fresh."""
+        t = face.track
+        emb = self.cache.reuse_embedding(face.session_id, t.track_id, face.frame_id)
+        if emb is None:
+            return False
+        t.embedding = emb
+        t.last_embed_frame = face.frame_id
+        return True
+
+    def _match_faces(self, faces: list[_FaceWork]) -> None:
+        """Resolve identities in one batched search.
+
+        The identity cache is consulted first.  A track is searched again
+        only when it has no live entry, or a new embedding has arrived
+        *and* moved its template more than ``template_drift`` from the
+        vector of the cached search; otherwise the cached result is
+        reused, so searches never outpace embeddings.
+
+        Tracks that do need a search are first checked against the
+        students other workers resolved recently (:mod:`storage.shared_identity`);
+        only the rest go to the gallery, and their matches are published.
+        """
+        pending: list[tuple[_FaceWork, np.ndarray]] = []
+        reused = 0
+        for face in faces:
+            t = face.track
+            if t.embedding is None and not len(t.template):
+                continue
+            entry = self.cache.get(face.session_id, t.track_id)
+            if entry is not None and entry.embed_frame == t.last_embed_frame:
+                face.match = entry.match   # no new embedding since the last search
+                reused += 1
+                continue
+            query = t.template.vector if len(t.template) else t.embedding
+            if entry is None or cosine_distance(query, entry.query) > settings.template_drift:
+                pending.append((face, query))
+            else:
+                face.match = entry.match
+                self.cache.touch(face.session_id, t.track_id, t.embedding, t.last_embed_frame)
+                reused += 1
+        if not pending:
+            with self._search_lock:
+                self._search_counts["reused"] += reused
+            return
+
+        queries = np.stack([query for _, query in pending])
+        matches = self.shared.lookup(queries)
+        misses = [i for i, m in enumerate(matches) if m is None]
+        if misses:
+            for i, match in zip(misses, cosine_search_many(queries[misses])):
+                matches[i] = match
+                if match is not None and match.d <= settings.sim_threshold:
+                    self.shared.publish(match.student_id, queries[i], match.d)
+        with self._search_lock:
+            self._search_counts["searched"] += len(misses)
+            self._search_counts["reused"] += reused
+
+        for (face, query), match in zip(pending, matches):
+            t = face.track
+            face.match = match
+            face.fresh = True
+            self.cache.store(
+                face.session_id, t.track_id, t.embedding, query, match, t.last_embed_frame
+            )
 
-        except Exception:
-            logger.exception("%s Unhandled error during pipeline.process()", log_prefix)
-            return []
+    def _resolve_identity(self, face: _FaceWork, state: SessionState) -> dict[str, Any]:
+        """Apply lock / unlock / smoothing rules and build the result dict.
+
+        A track locks once its match is within ``sim_threshold``; it is
+        re-validated only against a fresh search and unlocks only when
+        the distance exceeds the looser ``unlock_threshold`` (or the
+        search now points at another student).
+        """
+        t = face.track
+        match = face.match
+        student_id = None
+        confidence = None
+        status = "unknown"
+
+        if getattr(t, "locked_id", None) is not None:
+            # 🔥 Re-validate locked identity (only when a new search ran)
+            unlock_at = max(settings.unlock_threshold, settings.sim_threshold)
+            if face.fresh and (
+                match is None or match.d > unlock_at or match.student_id != t.locked_id
+            ):
+                logger.info(f"Unlocking track {t.track_id} due to similarity drop")
+                t.locked_id = None
+                t.locked_conf = None
+                with self._search_lock:
+                    self._search_counts["unlocks"] += 1
+            else:
+                student_id = t.locked_id
+                confidence = t.locked_conf
+                status = "recognized"
+
+        elif match is not None and match.d <= settings.sim_threshold:
+            student_id = match.student_id
+            raw_conf = 1.0 - float(match.d)
+
+            history = state.track_history.setdefault(t.track_id, [])
+            history.append(raw_conf)
+
+            if len(history) > 5:
+                history.pop(0)
+
+            confidence = round(sum(history) / len(history), 4)
+            status = "recognized"
+
+            t.locked_id = student_id
+            t.locked_conf = confidence
+
+            if student_id not in state.marked_attendance:
+                self._mark_attendance(student_id, state)
+
+        elif t.embedding is not None:
+            # 🔥 Log unknown only once per track
+            if not hasattr(t, "unknown_logged"):
+                logger.info(f"Unknown face detected (track {t.track_id})")
+                t.unknown_logged = True
+
+        return {
+            "track_id": t.track_id,
+            "bbox": face.bbox,
+            "student_id": student_id,
+            "confidence": confidence,
+            "status": status,
+        }
+
+    @staticmethod
+    def _mark_attendance(student_id: int, state: SessionState) -> None:
+        """Queue *student_id* for reporting to the Spring backend.
+
+        Never blocks: delivery, retries and de-duplication across streams
+        happen on the outbox worker thread.  The student is added to this
+        session's ``marked_attendance`` once Spring has accepted it.
+        """
+        outbox.enqueue(
+            student_id,
+            state.session_id,
+            on_delivered=state.marked_attendance.add,
+        )
@@ -5,49 +5,128 @@ Face embedding extractor using InsightFace's ArcFace (buffalo_l model).
 
 Produces 512-dimensional L2-normalised embeddings suitable for cosine
 similarity search.
+
+Recognition modes (``settings.arcface_mode``)
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+* ``"full"``     — InsightFace ``FaceAnalysis``: SCRFD detection at
+  640×640 and recognition.  Needed when the input is a whole camera frame
+  (e.g. ``register_face.py``).  :meth:`ArcFaceRecognizer.embed` runs
+  ``FaceAnalysis.get`` (also landmarks and gender/age);
+  :meth:`~ArcFaceRecognizer.embed_batch` runs SCRFD per crop and the
+  recognition network once per batch, with the same alignment and so the
+  same embeddings.
+* ``"aligned"``  — the crop was already found by YOLO, so only SCRFD is
+  run at a small input size to get the 5 keypoints, the crop is aligned
+  to the 112×112 ArcFace template and the recognition network is run.
+* ``"rec_only"`` — no landmark step at all: a square region around the
+  YOLO box is resized to 112×112 and fed straight to the recognition
+  network.  Cheapest, slightly less accurate on tilted faces.
+
+Use ``python -m ai.recognizer.validate`` to measure embedding agreement
+between the fast modes and ``"full"`` before switching a deployment.
 """
 
 import logging
 import time
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 import insightface
 
+from ai.model_registry import registry
 from configs.settings import settings
 
+if TYPE_CHECKING:
+    import numpy as np
+
 logger = logging.getLogger(__name__)
 
+_ARCFACE_MODES = ("full", "aligned", "rec_only")
+_CHIP_SIZE = 112  # ArcFace input resolution
+_EMBEDDING_DIM = 512
+
 
 class ArcFaceRecognizer:
     """Extract ArcFace embeddings from a cropped face image.
 
-    Uses InsightFace ``FaceAnalysis`` pipeline with the buffalo_l pack,
-    which bundles detection + landmark + recognition models.
+    In ``"full"`` mode this uses the InsightFace ``FaceAnalysis`` pipeline
+    with the buffalo_l pack, which bundles detection + landmark +
+    recognition models.  The ``"aligned"`` and ``"rec_only"`` modes load
+    only the ONNX models they need from the same pack.
+
+    The model pack comes from the ``arcface`` entry of the model registry
+    for *version*, falling back to ``settings.arcface_model`` when the
+    registry has none.
+
+    Args:
+        mode:    One of ``"full"``, ``"aligned"`` or ``"rec_only"``.
+                 Defaults to ``settings.arcface_mode``.
+        version: Registry version. Defaults to ``settings.model_version``.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, mode: str | None = None, version: str | None = None) -> None:
+        self.mode = mode or settings.arcface_mode
+        if self.mode not in _ARCFACE_MODES:
+            raise ValueError(
+                f"Unknown ArcFace mode '{self.mode}'. Expected one of {_ARCFACE_MODES}"
+            )
+        try:
+            self.model_name = registry.get_entry("arcface", version)
+        except KeyError:
+            self.model_name = settings.arcface_model
+
         providers = self._build_providers(settings.device)
+        ctx_id = 0 if "CUDA" in providers[0] else -1
         logger.info(
-            "Initialising ArcFace (model=%s, providers=%s)",
-            settings.arcface_model,
+            "Initialising ArcFace (model=%s, mode=%s, providers=%s)",
+            self.model_name,
+            self.mode,
             providers,
         )
         t0 = time.perf_counter()
 
-        self.app = insightface.app.FaceAnalysis(
-            name=settings.arcface_model,
-            providers=providers,
-        )
-        self.app.prepare(ctx_id=0 if "CUDA" in providers[0] else -1)
+        self.app = None
+        self.rec_model = None
+        self.det_model = None
+
+        if self.mode == "full":
+            self.app = insightface.app.FaceAnalysis(
+                name=self.model_name,
+                providers=providers,
+            )
+            self.app.prepare(ctx_id=ctx_id)
+            # the same prepared models, used directly by embed_batch()
+            self.det_model = self.app.det_model
+            self.rec_model = self.app.models["recognition"]
+        else:
+            model_dir = Path(
+                insightface.utils.ensure_available(
+                    "models", self.model_name, root="~/.insightface"
+                )
+            )
+            self.rec_model = insightface.model_zoo.get_model(
+                str(model_dir / settings.arcface_rec_file), providers=providers
+            )
+            self.rec_model.prepare(ctx_id=ctx_id)
+            if self.mode == "aligned":
+                size = settings.arcface_align_det_size
+                self.det_model = insightface.model_zoo.get_model(
+                    str(model_dir / settings.arcface_det_file), providers=providers
+                )
+                self.det_model.prepare(ctx_id=ctx_id, input_size=(size, size), det_thresh=0.5)
 
         logger.info("ArcFace ready in %.2fs", time.perf_counter() - t0)
 
     # ── Public API ──────────────────────────────────────────────────────────
 
-    def embed(self, face_crop) -> "np.ndarray | None":
+    def embed(self, face_crop, box=None) -> "np.ndarray | None":
         """Return a 512-D embedding for the largest face in *face_crop*.
 
         Args:
             face_crop: BGR numpy array of a cropped face region.
+            box:       Optional ``[x1, y1, x2, y2]`` of the face inside
+                       *face_crop*. Used by ``"rec_only"`` mode to centre
+                       the 112×112 chip; ignored by the other modes.
 
         Returns:
             A ``(512,)`` float32 numpy array, or ``None`` if no face
@@ -61,17 +140,89 @@ class ArcFaceRecognizer:
 
         t0 = time.perf_counter()
         try:
-            faces = self.app.get(face_crop)
-            if not faces:
-                logger.debug("No faces detected in crop")
-                return None
-            emb: np.ndarray = faces[0].embedding
+            if self.mode == "full":
+                faces = self.app.get(face_crop)
+                if not faces:
+                    logger.debug("No faces detected in crop")
+                    return None
+                emb: np.ndarray = faces[0].embedding
+            else:
+                chip = self.align(face_crop, box)
+                if chip is None:
+                    logger.debug("No face keypoints found in crop")
+                    return None
+                emb = self.rec_model.get_feat(chip).flatten()
             logger.debug("embed() done in %.1fms", (time.perf_counter() - t0) * 1000)
             return emb
         except Exception:
             logger.exception("Error generating face embedding")
             return None
 
+    def embed_batch(self, crops, boxes=None) -> "np.ndarray":
+        """Embed many face crops with batched recognition-network calls.
+
+        Each crop is aligned on its own (SCRFD keypoints in ``"full"`` and
+        ``"aligned"`` mode, a resized square in ``"rec_only"``), then all
+        chips are stacked and sent to the recognition network in chunks of
+        ``settings.arcface_max_batch``.
+
+        Args:
+            crops: Sequence of BGR face crops.
+            boxes: Optional per-crop face boxes (see :meth:`embed`).
+
+        Returns:
+            A ``(N, 512)`` float32 array.  Rows for crops in which no face
+            was found (or that were empty) are all zeros.
+        """
+        import numpy as np
+
+        out = np.zeros((len(crops), _EMBEDDING_DIM), dtype=np.float32)
+        if boxes is None:
+            boxes = [None] * len(crops)
+
+        t0 = time.perf_counter()
+        try:
+            index: list[int] = []
+            chips = []
+            for i, (crop, box) in enumerate(zip(crops, boxes)):
+                if crop is None or crop.size == 0:
+                    continue
+                chip = self.align(crop, box)
+                if chip is not None:
+                    index.append(i)
+                    chips.append(chip)
+
+            step = max(1, settings.arcface_max_batch)
+            for start in range(0, len(chips), step):
+                feats = self.rec_model.get_feat(chips[start:start + step])
+                out[index[start:start + step]] = feats
+            logger.debug(
+                "embed_batch() %d/%d crops in %.1fms",
+                len(chips), len(crops), (time.perf_counter() - t0) * 1000,
+            )
+        except Exception:
+            logger.exception("Error generating batched face embeddings")
+        return out
+
+    def align(self, face_crop, box=None) -> "np.ndarray | None":
+        """Return the 112×112 BGR chip fed to the recognition network.
+
+        ``"full"`` and ``"aligned"`` mode warp the crop onto the ArcFace
+        5-point template (``"full"`` picks the face ``FaceAnalysis.get``
+        would return first); ``"rec_only"`` mode resizes a square around
+        *box*.  Returns ``None`` if no keypoints are found.
+        """
+        import cv2
+        from insightface.utils import face_align
+
+        if self.det_model is not None:
+            _, kpss = self.det_model.detect(face_crop, max_num=0 if self.app else 1)
+            if kpss is None or len(kpss) == 0:
+                return None
+            return face_align.norm_crop(face_crop, landmark=kpss[0], image_size=_CHIP_SIZE)
+
+        return cv2.resize(_square_region(face_crop, box), (_CHIP_SIZE, _CHIP_SIZE))
+
     # ── Helpers ─────────────────────────────────────────────────────────────
 
     @staticmethod
@@ -80,3 +231,18 @@ class ArcFaceRecognizer:
         if device == "cuda":
             return ["CUDAExecutionProvider", "CPUExecutionProvider"]
         return ["CPUExecutionProvider"]
+
+
+def _square_region(face_crop, box=None):
+    """Return the largest square sub-image of *face_crop* centred on *box*."""
+    h, w = face_crop.shape[:2]
+    if box is None:
+        x1, y1, x2, y2 = 0, 0, w, h
+    else:
+        x1, y1, x2, y2 = box
+    cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+    side = max(x2 - x1, y2 - y1)
+    side = int(min(side, w, h))
+    sx = int(min(max(cx - side / 2, 0), w - side))
+    sy = int(min(max(cy - side / 2, 0), h - side))
+    return face_crop[sy:sy + side, sx:sx + side]
@@ -0,0 +1,130 @@
+"""
+ai/recognizer/budget.py
+-----------------------
+Per-frame time budget for the recognition stage.
+
+When many tracks come due on the same frame, embedding all of them in
+one go makes that frame's latency spike.  :class:`EmbedBudget` picks
+which of the due tracks to embed now so the embedding call fits in
+``EMBED_BUDGET_MS`` per frame, in priority order:
+
+  1. tracks never embedded,
+  2. tracks embedded but not yet identified (unknown),
+  3. locked tracks, oldest embedding first.
+
+The rest stay due and are reconsidered next frame.  A track that has
+been postponed for ``EMBED_MAX_DEFER`` frames (counted from its first
+deferral, :attr:`Track.deferred_since`) is embedded regardless of the
+budget, so every track is refreshed at least every
+``EMBED_INTERVAL + EMBED_MAX_DEFER`` frames.
+
+The cost of one crop is learned from the embedding calls themselves (an
+exponential moving average), so the budget adapts to the device, the
+ArcFace mode and the batch sizes actually seen.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from collections.abc import Sequence
+from typing import Any
+
+from ai.types import Track
+from configs.settings import settings
+
+_EWMA = 0.2   # weight of the newest per-crop timing
+
+
+class EmbedBudget:
+    """Choose the tracks to embed this frame within a time budget.
+
+    Thread-safe: one budget is shared by every stream of a pipeline.
+
+    Args:
+        budget_ms: Embedding time allowed per frame; ``0`` = unlimited.
+        max_defer: Frames a due track may be postponed before it is forced.
+    """
+
+    def __init__(self, budget_ms: float | None = None, max_defer: int | None = None) -> None:
+        self.budget_ms = settings.embed_budget_ms if budget_ms is None else budget_ms
+        self.max_defer = settings.embed_max_defer if max_defer is None else max_defer
+        self._lock = threading.Lock()
+        self._crop_ms: float | None = None
+        self._deferred = 0
+        self._forced = 0
+        self._limited_calls = 0
+
+    def select(self, tracks: Sequence[Track], frame_ids: Sequence[int], frames: int = 1) -> list[int]:
+        """Return the indices of *tracks* to embed now.
+
+        Chosen tracks have their deferral cleared; the others remember
+        the frame of their first deferral.
+
+        Args:
+            tracks:    Tracks that are due (and passed the quality gate).
+            frame_ids: Current frame number of each track's stream.
+            frames:    Frames sharing this embedding call (batched modes
+                       get ``frames × budget``).
+        """
+        capacity = self.capacity(frames)
+        if capacity >= len(tracks):
+            for t in tracks:
+                t.deferred_since = None
+            return list(range(len(tracks)))
+
+        forced = [i for i, (t, f) in enumerate(zip(tracks, frame_ids))
+                  if t.deferred_since is not None and f - t.deferred_since >= self.max_defer]
+        skip = set(forced)
+        rest = sorted(
+            (i for i in range(len(tracks)) if i not in skip),
+            key=lambda i: (_priority(tracks[i]), tracks[i].last_embed_frame),
+        )
+        chosen = forced + rest[:max(0, capacity - len(forced))]
+        picked = set(chosen)
+        for i, (t, f) in enumerate(zip(tracks, frame_ids)):
+            if i in picked:
+                t.deferred_since = None
+            elif t.deferred_since is None:
+                t.deferred_since = f
+        with self._lock:
+            self._limited_calls += 1
+            self._forced += len(forced)
+            self._deferred += len(tracks) - len(chosen)
+        return sorted(chosen)
+
+    def capacity(self, frames: int = 1) -> int | float:
+        """Crops that fit in the budget of *frames* frames (at least one)."""
+        if self.budget_ms <= 0 or self._crop_ms is None:
+            return math.inf
+        return max(1, int(self.budget_ms * frames / self._crop_ms))
+
+    def record(self, crops: int, seconds: float) -> None:
+        """Feed back the duration of one embedding call of *crops* crops."""
+        if crops <= 0:
+            return
+        sample = seconds * 1000 / crops
+        with self._lock:
+            if self._crop_ms is None:
+                self._crop_ms = sample
+            else:
+                self._crop_ms += _EWMA * (sample - self._crop_ms)
+
+    def stats(self) -> dict[str, Any]:
+        """Deferrals, forced refreshes and the learned per-crop cost."""
+        with self._lock:
+            return {
+                "budget_ms": self.budget_ms,
+                "crop_ms": round(self._crop_ms, 2) if self._crop_ms is not None else None,
+                "limited_calls": self._limited_calls,
+                "deferred": self._deferred,
+                "forced": self._forced,
+            }
+
+
+def _priority(track: Track) -> int:
+    if not len(track.template) and track.embedding is None:
+        return 0   # never embedded
+    if getattr(track, "locked_id", None) is None:
+        return 1   # unknown
+    return 2       # locked: refresh, oldest first
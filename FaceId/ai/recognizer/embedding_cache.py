@@ -1,54 +1,188 @@
 """
 ai/recognizer/embedding_cache.py
 ---------------------------------
-In-process LRU cache for face embeddings keyed by track ID.
+Thread-safe identity cache keyed by ``(session_id, track_id)``.
 
-Reduces redundant recognition calls for already-identified tracks.
-In a multi-worker deployment consider replacing this with a shared
-Redis cache (e.g., redis-py + pickle serialisation).
+Each entry remembers a track's last gallery search: the embedding and
+query vector it was made with, the :class:`SearchResult`, the embedding
+frame it belongs to and when it was made.  The pipeline consults the
+cache before every search and reuses the stored result while the track
+has no new embedding (or its template has not drifted), so a stable
+track costs one search per refresh instead of one per frame.
+
+It is also consulted before embedding: a track confidently matched
+whose cached embedding is younger than ``CACHE_FRESH_S`` keeps that
+embedding instead of running ArcFace again when it falls due.
+
+Every stream has its own tracker, whose track IDs count up from 0, so
+the same ID is in use on every stream at once; hence the session in the
+key.  Entries expire ``CACHE_TTL_S`` after their search — bounding how old an
+identity decision can get — and the least recently used entry is evicted
+beyond ``CACHE_MAX_ENTRIES``.  Entries are per worker; resolutions are
+shared between workers by :mod:`storage.shared_identity`.
 """
 
+from __future__ import annotations
+
 import logging
+import threading
+import time
 from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
 
+from configs.settings import settings
+
+if TYPE_CHECKING:
+    from storage.vector_search import SearchResult
+
 logger = logging.getLogger(__name__)
 
-_DEFAULT_MAX_SIZE = 256
+_Key = tuple[str, int]
+
+
+@dataclass
+class CacheEntry:
+    """Result of one track's last gallery search."""
+
+    embedding: np.ndarray | None
+    query: np.ndarray                # vector the gallery was searched with
+    match: SearchResult | None
+    embed_frame: int                 # ``track.last_embed_frame`` the search covers
+    searched_at: float               # ``time.monotonic()`` of the search
+    embedded_at: float               # ``time.monotonic()`` of the embedding
 
 
 class EmbeddingCache:
-    """Thread-unsafe LRU embedding cache (single-process use only).
+    """LRU + TTL cache of per-track search results, safe across threads.
 
     Args:
-        max_size: Maximum number of track embeddings to retain.
-                  Oldest entries are evicted when the limit is reached.
+        max_size: Maximum number of entries; the least recently used one
+                  is evicted beyond it.
+        ttl:      Seconds after its search an entry expires; ``0`` = never.
+        fresh:    Seconds a confident entry's embedding stands in for a new
+                  one (:meth:`reuse_embedding`); ``0`` = always re-embed.
     """
 
-    def __init__(self, max_size: int = _DEFAULT_MAX_SIZE) -> None:
-        self._cache: OrderedDict[int, np.ndarray] = OrderedDict()
-        self._max_size = max_size
-
-    def set(self, track_id: int, embedding: np.ndarray) -> None:
-        """Store (or refresh) an embedding for *track_id*."""
-        if track_id in self._cache:
-            self._cache.move_to_end(track_id)
-        self._cache[track_id] = embedding
-        if len(self._cache) > self._max_size:
-            evicted, _ = self._cache.popitem(last=False)
-            logger.debug("Cache evicted track_id=%d (max_size=%d)", evicted, self._max_size)
-
-    def get(self, track_id: int) -> "np.ndarray | None":
-        """Return the cached embedding for *track_id*, or ``None``."""
-        emb = self._cache.get(track_id)
-        if emb is not None:
-            self._cache.move_to_end(track_id)  # refresh LRU order
-        return emb
-
-    def remove(self, track_id: int) -> None:
-        """Explicitly remove a track's cache entry."""
-        self._cache.pop(track_id, None)
+    def __init__(
+        self, max_size: int | None = None, ttl: float | None = None, fresh: float | None = None
+    ) -> None:
+        self._cache: OrderedDict[_Key, CacheEntry] = OrderedDict()
+        self._max_size = settings.cache_max_entries if max_size is None else max_size
+        self._ttl = settings.cache_ttl_s if ttl is None else ttl
+        self._fresh = settings.cache_fresh_s if fresh is None else fresh
+        self._lock = threading.Lock()
+        self._embeds_saved = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, session_id: str, track_id: int) -> CacheEntry | None:
+        """Return the live entry for the track, or ``None`` (miss / expired)."""
+        key = (session_id, track_id)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and self._ttl and time.monotonic() - entry.searched_at > self._ttl:
+                del self._cache[key]
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._cache.move_to_end(key)  # refresh LRU order
+            self._hits += 1
+            return entry
+
+    def store(
+        self,
+        session_id: str,
+        track_id: int,
+        embedding: np.ndarray | None,
+        query: np.ndarray,
+        match: SearchResult | None,
+        embed_frame: int,
+    ) -> None:
+        """Record a fresh search for the track (restarts its TTL)."""
+        key = (session_id, track_id)
+        now = time.monotonic()
+        entry = CacheEntry(embedding, query, match, embed_frame, now, now)
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._max_size:
+                evicted, _ = self._cache.popitem(last=False)
+                self._evictions += 1
+                logger.debug("Cache evicted %s (max_size=%d)", evicted, self._max_size)
+
+    def touch(self, session_id: str, track_id: int, embedding: np.ndarray, embed_frame: int) -> None:
+        """Mark the cached result as valid for a newer embedding (TTL unchanged)."""
+        with self._lock:
+            entry = self._cache.get((session_id, track_id))
+            if entry is not None:
+                entry.embedding = embedding
+                entry.embed_frame = embed_frame
+                entry.embedded_at = time.monotonic()
+
+    def reuse_embedding(self, session_id: str, track_id: int, embed_frame: int) -> np.ndarray | None:
+        """Return the cached embedding if it may stand in for a new one.
+
+        Only a live entry matched within ``sim_threshold`` and embedded
+        less than ``fresh`` seconds ago qualifies.  It is then marked as
+        covering *embed_frame*, so the next search check reuses its result;
+        its embedding time is left alone, so the track is embedded again
+        once the window has passed.
+        """
+        if not self._fresh:
+            return None
+        with self._lock:
+            entry = self._cache.get((session_id, track_id))
+            if entry is None or entry.embedding is None:
+                return None
+            if entry.match is None or entry.match.d > settings.sim_threshold:
+                return None
+            now = time.monotonic()
+            if now - entry.embedded_at > self._fresh:
+                return None
+            if self._ttl and now - entry.searched_at > self._ttl:
+                return None
+            entry.embed_frame = embed_frame
+            self._embeds_saved += 1
+            return entry.embedding
+
+    def remove(self, session_id: str, track_id: int) -> None:
+        """Explicitly remove one track's entry."""
+        with self._lock:
+            self._cache.pop((session_id, track_id), None)
+
+    def drop_session(self, session_id: str) -> int:
+        """Remove every entry of *session_id*; returns how many."""
+        with self._lock:
+            keys = [k for k in self._cache if k[0] == session_id]
+            for key in keys:
+                del self._cache[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        """Remove all entries (counters are kept)."""
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """Size, hit / miss / eviction / expiration and saved-embedding counters."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._cache),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "embeds_saved": self._embeds_saved,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+            }
 
     def __len__(self) -> int:
         return len(self._cache)
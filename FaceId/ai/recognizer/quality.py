@@ -0,0 +1,173 @@
+"""
+ai/recognizer/quality.py
+------------------------
+Cheap face-crop quality gate run before ArcFace.
+
+Motion-blurred, tiny or side-on faces cost a full recognition call and
+produce embeddings far from the enrolled ones — at best a wasted call,
+at worst a false match or a spurious unlock.  Three checks, cheapest
+first, decide whether a crop is worth embedding:
+
+  - ``size``  – shorter side of the face box in pixels of the frame the
+                client sent (boxes on a reduced decode are scaled back up)
+  - ``blur``  – variance of the Laplacian on the face resized to the
+                recognizer's 112 px input (so the bar does not depend on
+                how far away the face is)
+  - ``pose``  – left/right symmetry: correlation of the face's left half
+                with its mirrored right half; profiles score low
+
+A threshold of ``0`` disables its check.  Skipped tracks are simply
+re-checked on their next frame.
+"""
+
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from configs.settings import settings
+
+_SIDE = 112   # ArcFace input size
+_SHARP_REF = 200.0   # Laplacian variance treated as fully sharp for weighting
+_MIN_WEIGHT = 0.05
+REASONS = ("size", "blur", "pose")
+
+
+@dataclass(frozen=True)
+class Quality:
+    """Scores of one crop and the first failed check (``None`` = passed)."""
+
+    size: int
+    sharpness: float | None = None
+    symmetry: float | None = None
+    reason: str | None = None
+
+    @property
+    def passed(self) -> bool:
+        return self.reason is None
+
+    @property
+    def weight(self) -> float:
+        """Relative trust in the crop's embedding, in ``(0, 1]``.
+
+        Used to weight the crop in its track's fused template: small,
+        soft or asymmetric faces that still passed count for less.
+        """
+        w = min(1.0, self.size / _SIDE)
+        if self.sharpness is not None:
+            w *= min(1.0, self.sharpness / _SHARP_REF)
+        if self.symmetry is not None:
+            w *= self.symmetry
+        return max(_MIN_WEIGHT, w)
+
+
+def sharpness(face: np.ndarray) -> float:
+    """Variance of the Laplacian of a grey ``_SIDE × _SIDE`` face."""
+    return float(cv2.Laplacian(face, cv2.CV_32F).var())
+
+
+def symmetry(face: np.ndarray) -> float:
+    """Correlation of the left half with the mirrored right half, in ``[0, 1]``."""
+    half = face.shape[1] // 2
+    left = face[:, :half].astype(np.float32).ravel()
+    right = face[:, -half:][:, ::-1].astype(np.float32).ravel()
+    left -= left.mean()
+    right -= right.mean()
+    denom = float(np.sqrt((left @ left) * (right @ right)))
+    if denom == 0.0:
+        return 0.0
+    return max(0.0, float(left @ right) / denom)
+
+
+class QualityGate:
+    """Score face crops and count how many were skipped, per reason.
+
+    Thread-safe: one gate is shared by every stream of a pipeline.
+
+    Args:
+        min_face_px:  Minimum shorter side of the face box (px).
+        min_sharpness: Minimum Laplacian variance.
+        min_symmetry: Minimum left/right symmetry (0–1).
+    """
+
+    def __init__(
+        self,
+        min_face_px: int | None = None,
+        min_sharpness: float | None = None,
+        min_symmetry: float | None = None,
+    ) -> None:
+        self.min_face_px = settings.quality_min_face_px if min_face_px is None else min_face_px
+        self.min_sharpness = (
+            settings.quality_min_sharpness if min_sharpness is None else min_sharpness
+        )
+        self.min_symmetry = (
+            settings.quality_min_symmetry if min_symmetry is None else min_symmetry
+        )
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._skipped = dict.fromkeys(REASONS, 0)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.min_face_px or self.min_sharpness or self.min_symmetry)
+
+    def assess(self, crop: np.ndarray, box: list[int], scale: int = 1) -> Quality:
+        """Score the face at *box* (crop coordinates) inside *crop*.
+
+        *scale* is the factor the frame was downscaled by at decode time
+        (see :func:`app.decoding.decode_frame`); the size check is made in
+        the client's pixels.
+        """
+        x1, y1, x2, y2 = box
+        size = min(x2 - x1, y2 - y1) * scale
+        if size < self.min_face_px:
+            return Quality(size, reason="size")
+        if not (self.min_sharpness or self.min_symmetry):
+            return Quality(size)
+
+        face = crop[max(0, y1):y2, max(0, x1):x2]
+        if face.ndim == 3:
+            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        face = cv2.resize(face, (_SIDE, _SIDE), interpolation=cv2.INTER_AREA)
+
+        sharp = sharpness(face)
+        if sharp < self.min_sharpness:
+            return Quality(size, sharp, reason="blur")
+        sym = symmetry(face)
+        if sym < self.min_symmetry:
+            return Quality(size, sharp, sym, reason="pose")
+        return Quality(size, sharp, sym)
+
+    def check(
+        self,
+        crops: list[np.ndarray],
+        boxes: list[list[int]],
+        scales: list[int] | None = None,
+    ) -> list[Quality]:
+        """Assess and count every crop; embed only those that ``passed``."""
+        scales = scales or [1] * len(boxes)
+        if not self.enabled:
+            return [
+                Quality(min(x2 - x1, y2 - y1) * s) for (x1, y1, x2, y2), s in zip(boxes, scales)
+            ]
+        verdicts = [self.assess(c, b, s) for c, b, s in zip(crops, boxes, scales)]
+        with self._lock:
+            self._checked += len(verdicts)
+            for q in verdicts:
+                if q.reason is not None:
+                    self._skipped[q.reason] += 1
+        return verdicts
+
+    def stats(self) -> dict[str, object]:
+        """Crops checked and skipped (total and per reason)."""
+        with self._lock:
+            skipped = sum(self._skipped.values())
+            return {
+                "checked": self._checked,
+                "skipped": skipped,
+                "skipped_by_reason": dict(self._skipped),
+                "skip_rate": round(skipped / self._checked, 4) if self._checked else 0.0,
+            }
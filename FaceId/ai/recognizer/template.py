@@ -0,0 +1,65 @@
+"""
+ai/recognizer/template.py
+-------------------------
+Per-track fused embedding template.
+
+A single ArcFace embedding is noisy — one slightly blurred or turned
+frame can push it past the match threshold.  A track's *template* is the
+quality-weighted mean of its last ``TEMPLATE_SIZE`` normalised
+embeddings, which moves slowly and stays close to the enrolled face.
+
+The pipeline decides identity on the template and only searches the
+gallery again once the template has drifted more than
+``TEMPLATE_DRIFT`` (cosine distance) from the vector it last searched
+with; in between, the previous result is reused.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+
+import numpy as np
+
+from configs.settings import settings
+
+
+class EmbeddingTemplate:
+    """Fixed-size buffer of weighted embeddings and their fused mean.
+
+    Args:
+        size: Number of recent embeddings kept; defaults to
+              ``settings.template_size``.
+    """
+
+    def __init__(self, size: int | None = None) -> None:
+        self._samples: deque[tuple[np.ndarray, float]] = deque(
+            maxlen=max(1, size or settings.template_size)
+        )
+        self._vector: np.ndarray | None = None
+
+    def add(self, embedding: np.ndarray, weight: float = 1.0) -> None:
+        """Fold one embedding (normalised here) into the template."""
+        emb = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(emb))
+        if norm == 0.0 or weight <= 0.0:
+            return
+        self._samples.append((emb / norm, float(weight)))
+        self._vector = None
+
+    @property
+    def vector(self) -> np.ndarray | None:
+        """Unit-length weighted mean of the buffer, or ``None`` when empty."""
+        if self._vector is None and self._samples:
+            embs, weights = zip(*self._samples)
+            mean = np.average(np.stack(embs), axis=0, weights=weights)
+            self._vector = (mean / (np.linalg.norm(mean) or 1.0)).astype(np.float32)
+        return self._vector
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+def cosine_distance(a: np.ndarray, b: np.ndarray) -> float:
+    """``1 - cos(a, b)`` for two vectors of any length."""
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return 1.0 - float(a @ b) / denom if denom else 1.0
@@ -0,0 +1,188 @@
+"""
+ai/scheduler.py
+---------------
+Cross-session micro-batching for the shared pipeline models.
+
+Without batching every WebSocket session calls ``pipeline.process`` on
+its own, so YOLO and ArcFace always run at batch size 1 however many
+cameras are connected.  :class:`InferenceScheduler` puts every session's
+frame into one queue; a single worker thread waits for up to
+``batch_window_ms`` after the first frame arrives (or until
+``batch_max_frames`` are queued), then runs the whole batch through
+:meth:`FacePipeline.process_batch` — one detector call, one ArcFace call
+and one gallery search — and routes each result back to its caller.
+
+Each batch holds at most one frame per session, so a session's tracker
+always sees its frames in order.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from ai.session import SessionState
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Request:
+    frame: np.ndarray
+    state: SessionState
+    scale: int = 1
+    future: Future = field(default_factory=Future)
+    enqueued: float = field(default_factory=time.perf_counter)
+
+
+class InferenceScheduler:
+    """Collect frames from all sessions and run them as micro-batches.
+
+    Args:
+        pipeline:  The shared :class:`~ai.pipeline.FacePipeline`.
+        window_ms: How long to wait for more frames after the first one.
+                   Defaults to ``settings.batch_window_ms``.
+        max_batch: Maximum frames per batch.
+                   Defaults to ``settings.batch_max_frames``.
+    """
+
+    def __init__(self, pipeline, window_ms: float | None = None, max_batch: int | None = None) -> None:
+        self.pipeline = pipeline
+        self.window = (settings.batch_window_ms if window_ms is None else window_ms) / 1000
+        self.max_batch = max(1, settings.batch_max_frames if max_batch is None else max_batch)
+
+        self._queue: deque[_Request] = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: threading.Thread | None = None
+
+        self._batches = 0
+        self._frames = 0
+        self._last_batch_ms = 0.0
+        self._wait_total = 0.0
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        """Start the batching worker (idempotent)."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+            self._thread.start()
+        logger.info(
+            "Inference scheduler started (window=%.1fms, max_batch=%d)",
+            self.window * 1000, self.max_batch,
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker; pending requests fail with ``RuntimeError``."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._cond:
+            while self._queue:
+                self._queue.popleft().future.set_exception(RuntimeError("scheduler stopped"))
+
+    # ── Producer API ─────────────────────────────────────────────────────────
+
+    def submit(self, frame: np.ndarray, state: SessionState, scale: int = 1) -> Future:
+        """Queue *frame* for *state*; the future resolves to its result list.
+
+        *scale* is the frame's decode factor (see :meth:`FacePipeline.process`).
+        """
+        request = _Request(frame, state, scale)
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("scheduler is not running")
+            self._queue.append(request)
+            self._cond.notify()
+        return request.future
+
+    def process(
+        self, frame: np.ndarray, state: SessionState, scale: int = 1
+    ) -> list[dict[str, Any]]:
+        """Blocking convenience wrapper around :meth:`submit`."""
+        return self.submit(frame, state, scale).result()
+
+    def stats(self) -> dict[str, float]:
+        """Queue depth, batch counters and average batch size / queue wait."""
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "batches": self._batches,
+                "frames": self._frames,
+                "avg_batch": round(self._frames / self._batches, 2) if self._batches else 0.0,
+                "avg_wait_ms": round(self._wait_total / self._frames * 1000, 2) if self._frames else 0.0,
+                "last_batch_ms": round(self._last_batch_ms, 2),
+            }
+
+    # ── Worker ───────────────────────────────────────────────────────────────
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            t0 = time.perf_counter()
+            try:
+                outputs = self.pipeline.process_batch(
+                    [r.frame for r in batch], [r.state for r in batch], [r.scale for r in batch]
+                )
+            except Exception as exc:  # process_batch already logs; never kill the worker
+                for r in batch:
+                    r.future.set_exception(exc)
+                continue
+            elapsed = time.perf_counter() - t0
+
+            with self._cond:
+                self._batches += 1
+                self._frames += len(batch)
+                self._last_batch_ms = elapsed * 1000
+                self._wait_total += sum(t0 - r.enqueued for r in batch)
+            for request, output in zip(batch, outputs):
+                request.future.set_result(output)
+
+    def _collect(self) -> list[_Request] | None:
+        """Wait for a batch; ``None`` once stopped."""
+        with self._cond:
+            while not self._queue and self._running:
+                self._cond.wait()
+            if not self._running:
+                return None
+
+            deadline = self._queue[0].enqueued + self.window
+            while len(self._queue) < self.max_batch and self._running:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self._running:
+                return None
+
+            batch: list[_Request] = []
+            sessions: set[int] = set()
+            deferred: deque[_Request] = deque()
+            while self._queue and len(batch) < self.max_batch:
+                request = self._queue.popleft()
+                if id(request.state) in sessions:
+                    deferred.append(request)   # keep per-session frame order
+                    continue
+                sessions.add(id(request.state))
+                batch.append(request)
+            deferred.extend(self._queue)
+            self._queue = deferred
+            return batch
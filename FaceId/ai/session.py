@@ -0,0 +1,46 @@
+"""
+ai/session.py
+-------------
+Per-stream runtime state for :class:`~ai.pipeline.FacePipeline`.
+
+The pipeline owns the heavy, read-only models (YOLO, ArcFace, FaceMesh)
+and shares them between every connected camera.  Everything that is
+specific to one video stream — the tracker, the frame counter, the
+confidence smoothing history and the attendance de-duplication set —
+lives in a :class:`SessionState` instead, so tracks from different
+classrooms are never matched against each other.
+
+A ``SessionState`` is created when a WebSocket connects and dropped when
+it disconnects; it holds no model weights and is cheap to create.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+from ai.tracker.bot_sort import BoTSORT
+
+
+@dataclass
+class SessionState:
+    """Lightweight mutable state for a single video stream.
+
+    Attributes:
+        session_id:        Correlation ID of the owning stream.
+        tracker:           Private BoTSORT instance for this stream.
+        frame_id:          Number of frames processed so far.
+        track_history:     ``track_id → recent confidences`` used for smoothing.
+        marked_attendance: Student IDs already reported for this stream.
+    """
+
+    session_id: str = ""
+    tracker: BoTSORT = field(default_factory=BoTSORT)
+    frame_id: int = 0
+    track_history: dict[int, list[float]] = field(default_factory=dict)
+    marked_attendance: set[int] = field(default_factory=set)
+
+    def reset(self) -> None:
+        """Forget all tracks and identities (e.g. after a new enrolment)."""
+        self.tracker = BoTSORT()
+        self.track_history.clear()
+        self.marked_attendance.clear()
@@ -0,0 +1,314 @@
+"""
+ai/staged.py
+------------
+Pipelined frame processing: one worker stage per pipeline phase.
+
+``FacePipeline.process`` runs detection, recognition and behaviour
+analysis back to back, so a frame's latency is the sum of all stages and
+only one of them is busy at a time.  :class:`StagedExecutor` gives each
+phase its own worker(s), connected by bounded queues::
+
+    submit → [detect + track] → [embed + search + identity] → [pose ×N] → result
+
+* **detect** — one thread; runs YOLO and the session tracker, so every
+  session's frames are tracked in submission order.
+* **recognise** — one thread; embeds and searches, then applies the
+  identity rules in order.
+* Both take every frame already waiting in their queue (up to
+  ``batch_max_frames``) as one model batch, so a backed-up stage
+  catches up instead of falling further behind.
+* **behaviour** — ``stage_behaviour_workers`` threads; head pose and
+  engagement only read the frame's own crops, so they run in parallel.
+
+While frame N is being embedded, frame N+1 is already being detected.
+Behaviour workers may finish out of order, so results are released per
+session strictly in submission order.  A full queue blocks the stage
+feeding it, which pushes back all the way to :meth:`submit`.
+
+Per-stage queue depths and busy times are reported by :meth:`stats` so
+the stage that saturates first is visible on ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any
+
+import numpy as np
+
+from ai.session import SessionState
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()   # queue sentinel
+
+STAGES = ("detect", "recognise", "behaviour")
+
+
+@dataclass
+class _Job:
+    frame: np.ndarray
+    state: SessionState
+    seq: int
+    scale: int = 1            # decode downscale factor
+    future: Future = field(default_factory=Future)
+    work: Any = None          # ai.pipeline._FrameWork once detected
+
+
+@dataclass
+class _Order:
+    """Per-session reorder buffer."""
+
+    submitted: int = 0
+    released: int = 0
+    done: dict[int, tuple[Future, list]] = field(default_factory=dict)
+
+
+class StagedExecutor:
+    """Run the pipeline stages on separate workers with bounded queues.
+
+    Args:
+        pipeline:          The shared :class:`~ai.pipeline.FacePipeline`.
+        queue_size:        Capacity of each inter-stage queue.
+                           Defaults to ``settings.stage_queue_size``.
+        behaviour_workers: Threads in the behaviour stage.
+                           Defaults to ``settings.stage_behaviour_workers``.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        queue_size: int | None = None,
+        behaviour_workers: int | None = None,
+    ) -> None:
+        self.pipeline = pipeline
+        size = max(1, settings.stage_queue_size if queue_size is None else queue_size)
+        self.behaviour_workers = max(
+            1, settings.stage_behaviour_workers if behaviour_workers is None else behaviour_workers
+        )
+        self.max_batch = max(1, settings.batch_max_frames)
+
+        self._queues: dict[str, queue.Queue] = {name: queue.Queue(size) for name in STAGES}
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._orders: dict[int, _Order] = {}
+        self._running = False
+
+        self._busy = dict.fromkeys(STAGES, 0.0)
+        self._frames = dict.fromkeys(STAGES, 0)
+        self._completed = 0
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        """Start all stage workers (idempotent)."""
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+        targets = [("detect", self._detect_loop), ("recognise", self._recognise_loop)]
+        targets += [(f"behaviour-{i}", self._behaviour_loop) for i in range(self.behaviour_workers)]
+        self._threads = [
+            threading.Thread(target=fn, name=f"stage-{name}", daemon=True) for name, fn in targets
+        ]
+        for t in self._threads:
+            t.start()
+        logger.info(
+            "Staged executor started (queue_size=%d, behaviour_workers=%d)",
+            self._queues["detect"].maxsize, self.behaviour_workers,
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Drain in-flight frames and stop the workers.
+
+        The stop sentinel travels through the stages behind any queued
+        frames, so everything already submitted still completes.
+        """
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+        self._queues["detect"].put(_STOP)
+        deadline = time.monotonic() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        # Frames submitted while stopping landed behind the sentinel
+        while True:
+            try:
+                job = self._queues["detect"].get_nowait()
+            except queue.Empty:
+                break
+            if job is not _STOP:
+                job.future.set_exception(RuntimeError("staged executor stopped"))
+
+    # ── Producer API ─────────────────────────────────────────────────────────
+
+    def submit(self, frame: np.ndarray, state: SessionState, scale: int = 1) -> Future:
+        """Queue *frame* for *state*; blocks while the detect queue is full.
+
+        Frames of one session must be submitted from one thread at a
+        time; their results are released in submission order.  *scale*
+        is the frame's decode factor (see :meth:`FacePipeline.process`).
+        """
+        with self._lock:
+            if not self._running:
+                raise RuntimeError("staged executor is not running")
+            order = self._orders.setdefault(id(state), _Order())
+            job = _Job(frame, state, order.submitted, scale)
+            order.submitted += 1
+        self._queues["detect"].put(job)
+        return job.future
+
+    def process(
+        self, frame: np.ndarray, state: SessionState, scale: int = 1
+    ) -> list[dict[str, Any]]:
+        """Blocking convenience wrapper around :meth:`submit`."""
+        return self.submit(frame, state, scale).result()
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, frames handled and average busy time per stage."""
+        with self._lock:
+            return {
+                "completed": self._completed,
+                "stages": {
+                    name: {
+                        "queue_depth": self._queues[name].qsize(),
+                        "frames": self._frames[name],
+                        "avg_ms": round(self._busy[name] / self._frames[name] * 1000, 2)
+                        if self._frames[name] else 0.0,
+                    }
+                    for name in STAGES
+                },
+            }
+
+    # ── Workers ──────────────────────────────────────────────────────────────
+
+    def _detect_loop(self) -> None:
+        q_in, q_out = self._queues["detect"], self._queues["recognise"]
+        stopping = False
+        while not stopping:
+            jobs, stopping = self._take(q_in)
+            if not jobs:
+                break
+
+            t0 = time.perf_counter()
+            models = None
+            try:
+                # one model set for the whole batch, held until each frame completes
+                models = self.pipeline._lease(len(jobs))
+                for job in jobs:
+                    job.work = self.pipeline._begin(job.frame, job.state, models, job.scale)
+                batch = models.detector.detect_batch([j.frame for j in jobs])
+                t_detect = time.perf_counter() - t0
+                for job, detections in zip(jobs, batch):
+                    job.work.timings["detect"] = t_detect
+                    self.pipeline._track(job.work, detections)
+            except Exception:
+                logger.exception("[batch=%d] Unhandled error in detect stage", len(jobs))
+                # frames that never got a work record still hold a lease
+                unopened = sum(1 for job in jobs if job.work is None)
+                if models is not None and unopened:
+                    models.release(unopened)
+                for job in jobs:
+                    self._complete(job, [])
+                continue
+            finally:
+                self._account("detect", t0, len(jobs))
+            for job in jobs:
+                q_out.put(job)
+
+        q_out.put(_STOP)
+
+    def _recognise_loop(self) -> None:
+        q_in, q_out = self._queues["recognise"], self._queues["behaviour"]
+        stopping = False
+        while not stopping:
+            jobs, stopping = self._take(q_in)
+            if not jobs:
+                break
+
+            t0 = time.perf_counter()
+            try:
+                self.pipeline._recognise([j.work for j in jobs])
+                for job in jobs:
+                    self.pipeline._identify(job.work)
+            except Exception:
+                logger.exception("[batch=%d] Unhandled error in recognise stage", len(jobs))
+                for job in jobs:
+                    self._complete(job, [])
+                continue
+            finally:
+                self._account("recognise", t0, len(jobs))
+            for job in jobs:
+                q_out.put(job)
+
+        for _ in range(self.behaviour_workers):
+            q_out.put(_STOP)
+
+    def _behaviour_loop(self) -> None:
+        q_in = self._queues["behaviour"]
+        while True:
+            job = q_in.get()
+            if job is _STOP:
+                return
+            t0 = time.perf_counter()
+            try:
+                result = self.pipeline._behave(job.work)
+            except Exception:
+                logger.exception("%s Unhandled error in behaviour stage", job.work.log_prefix)
+                self._complete(job, [])
+                continue
+            finally:
+                self._account("behaviour", t0, 1)
+            self._complete(job, result)
+
+    # ── Helpers ──────────────────────────────────────────────────────────────
+
+    def _take(self, q: queue.Queue) -> tuple[list[_Job], bool]:
+        """Block for one job, then take whatever else is already waiting.
+
+        Returns ``(jobs, stopping)``; *stopping* is set once the stop
+        sentinel has been seen.
+        """
+        items = [q.get()]
+        while len(items) < self.max_batch:
+            try:
+                items.append(q.get_nowait())
+            except queue.Empty:
+                break
+        jobs = [j for j in items if j is not _STOP]
+        return jobs, len(jobs) != len(items)
+
+    def _account(self, stage: str, t0: float, frames: int) -> None:
+        with self._lock:
+            self._busy[stage] += time.perf_counter() - t0
+            self._frames[stage] += frames
+
+    def _complete(self, job: _Job, result: list[dict[str, Any]]) -> None:
+        """Record *job*'s result and release every result now in order.
+
+        Like ``pipeline.process``, a frame that failed resolves to ``[]``.
+        The frame's model lease is returned here.
+        """
+        if job.work is not None:
+            self.pipeline._end(job.work)
+        key = id(job.state)
+        with self._lock:
+            order = self._orders[key]
+            order.done[job.seq] = (job.future, result)
+            ready = []
+            while order.released in order.done:
+                ready.append(order.done.pop(order.released))
+                order.released += 1
+            if order.released == order.submitted:
+                del self._orders[key]
+            self._completed += len(ready)
+        for future, value in ready:
+            future.set_result(value)
@@ -1,37 +1,88 @@
+"""
+ai/tracker/bot_sort.py
+----------------------
+BoTSORT-style multi-face tracker.
+
+Every track carries a constant-velocity Kalman state.  Each frame the
+states are predicted forward and detections are associated against the
+*predicted* boxes, so a face that moves keeps its ID.  A track that
+misses detections is kept as *lost* for up to ``settings.track_buffer``
+frames — with its embedding and identity lock intact — and is revived
+if a detection re-appears near its predicted position.
+"""
+
 import time
 import numpy as np
 from ai.types import Track
+from ai.tracker.kalman import KalmanFilter, xyah_to_xyxy
 from ai.tracker.matching import associate
+from configs.settings import settings
+
 
 class BoTSORT:
-    def __init__(self):
-        self.tracks = []
+    def __init__(self, track_buffer: int | None = None):
+        self.tracks = []            # active + lost tracks
         self.next_id = 0
+        self.kf = KalmanFilter()
+        self.track_buffer = settings.track_buffer if track_buffer is None else track_buffer
 
     def update(self, detections):
-        now = time.time()
+        """Advance all tracks by one frame and associate *detections*.
 
-        if not self.tracks:
-            for d in detections:
-                self.tracks.append(Track(self.next_id, np.array(d), now))
-                self.next_id += 1
-            return self.tracks
+        Args:
+            detections: List of ``[x1, y1, x2, y2]`` boxes.
+
+        Returns:
+            The tracks matched in this frame (lost tracks are excluded).
+        """
+        now = time.time()
+        self._predict()
 
         row, col = associate(self.tracks, detections)
-        updated = []
+        matched = set()
         used_det = set()
 
         for r, c in zip(row, col):
             t = self.tracks[r]
-            t.bbox = np.array(detections[c])
+            det = np.array(detections[c])
+            t.mean, t.covariance = self.kf.update(t.mean, t.covariance, det)
+            t.bbox = det
             t.last_seen = now
-            updated.append(t)
+            t.lost_frames = 0
+            matched.add(r)
             used_det.add(c)
 
+        kept = []
+        for i, t in enumerate(self.tracks):
+            if i not in matched:
+                t.lost_frames += 1
+                if t.lost_frames > self.track_buffer:
+                    continue
+            kept.append(t)
+
         for i, d in enumerate(detections):
             if i not in used_det:
-                updated.append(Track(self.next_id, np.array(d), now))
-                self.next_id += 1
+                kept.append(self._new_track(d, now))
+
+        self.tracks = kept
+        return [t for t in self.tracks if t.lost_frames == 0]
+
+    # ── Helpers ─────────────────────────────────────────────────────────────
+
+    def _predict(self) -> None:
+        """Move every track's state and bbox one frame forward."""
+        if not self.tracks:
+            return
+        means = np.stack([t.mean for t in self.tracks])
+        covs = np.stack([t.covariance for t in self.tracks])
+        means, covs = self.kf.multi_predict(means, covs)
+        for t, mean, cov in zip(self.tracks, means, covs):
+            t.mean, t.covariance = mean, cov
+            t.bbox = xyah_to_xyxy(mean)
 
-        self.tracks = updated
-        return self.tracks
+    def _new_track(self, detection, now: float) -> Track:
+        det = np.array(detection)
+        t = Track(self.next_id, det, now)
+        t.mean, t.covariance = self.kf.initiate(det)
+        self.next_id += 1
+        return t
@@ -1,7 +1,121 @@
+"""
+ai/tracker/kalman.py
+--------------------
+Constant-velocity Kalman filter for bounding-box tracking.
+
+The state is the 8-vector ``(cx, cy, a, h, vcx, vcy, va, vh)``: box centre,
+aspect ratio (w / h), height and their per-frame velocities.  Only the
+first four components are observed.  Noise is scaled by the box height
+so small and large faces are filtered alike (same model as SORT /
+ByteTrack).
+"""
+
 import numpy as np
 
+_NDIM = 4
+_STD_WEIGHT_POSITION = 1.0 / 20
+_STD_WEIGHT_VELOCITY = 1.0 / 160
+
+
+def xyxy_to_xyah(box) -> np.ndarray:
+    """Convert ``[x1, y1, x2, y2]`` to ``[cx, cy, w/h, h]``."""
+    x1, y1, x2, y2 = np.asarray(box, dtype=np.float64)[:4]
+    w, h = x2 - x1, y2 - y1
+    return np.array([x1 + w / 2, y1 + h / 2, w / max(h, 1e-6), h])
+
+
+def xyah_to_xyxy(xyah) -> np.ndarray:
+    """Convert ``[cx, cy, w/h, h]`` back to ``[x1, y1, x2, y2]``."""
+    cx, cy, a, h = np.asarray(xyah, dtype=np.float64)[:4]
+    w = a * h
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+
 class KalmanFilter:
+    """Constant-velocity Kalman filter in ``xyah`` box space."""
+
+    def __init__(self) -> None:
+        self._motion_mat = np.eye(2 * _NDIM)
+        for i in range(_NDIM):
+            self._motion_mat[i, _NDIM + i] = 1.0
+        self._update_mat = np.eye(_NDIM, 2 * _NDIM)
+
     def initiate(self, box):
-        mean = np.array(box + box)
-        cov = np.eye(8) * 10
+        """Create a track state from an unassociated ``[x1, y1, x2, y2]`` box.
+
+        Returns:
+            ``(mean, covariance)`` — an 8-vector and an 8×8 matrix.
+        """
+        measurement = xyxy_to_xyah(box)
+        mean = np.r_[measurement, np.zeros(_NDIM)]
+        h = measurement[3]
+        std = [
+            2 * _STD_WEIGHT_POSITION * h,
+            2 * _STD_WEIGHT_POSITION * h,
+            1e-2,
+            2 * _STD_WEIGHT_POSITION * h,
+            10 * _STD_WEIGHT_VELOCITY * h,
+            10 * _STD_WEIGHT_VELOCITY * h,
+            1e-5,
+            10 * _STD_WEIGHT_VELOCITY * h,
+        ]
+        cov = np.diag(np.square(std))
         return mean, cov
+
+    def predict(self, mean, cov):
+        """Advance one state by one frame."""
+        means, covs = self.multi_predict(mean[None], cov[None])
+        return means[0], covs[0]
+
+    def multi_predict(self, means, covs):
+        """Advance ``N`` states by one frame in a single vectorised step.
+
+        Args:
+            means: ``(N, 8)`` state means.
+            covs:  ``(N, 8, 8)`` state covariances.
+        """
+        h = means[:, 3]
+        std = np.stack(
+            [
+                _STD_WEIGHT_POSITION * h,
+                _STD_WEIGHT_POSITION * h,
+                np.full_like(h, 1e-2),
+                _STD_WEIGHT_POSITION * h,
+                _STD_WEIGHT_VELOCITY * h,
+                _STD_WEIGHT_VELOCITY * h,
+                np.full_like(h, 1e-5),
+                _STD_WEIGHT_VELOCITY * h,
+            ],
+            axis=1,
+        )
+        motion_cov = np.zeros_like(covs)
+        idx = np.arange(2 * _NDIM)
+        motion_cov[:, idx, idx] = np.square(std)
+
+        F = self._motion_mat
+        means = means @ F.T
+        covs = F @ covs @ F.T + motion_cov
+        return means, covs
+
+    def update(self, mean, cov, box):
+        """Correct a predicted state with a matched ``[x1, y1, x2, y2]`` box."""
+        measurement = xyxy_to_xyah(box)
+        H = self._update_mat
+        std = [
+            _STD_WEIGHT_POSITION * mean[3],
+            _STD_WEIGHT_POSITION * mean[3],
+            1e-1,
+            _STD_WEIGHT_POSITION * mean[3],
+        ]
+        projected_mean = H @ mean
+        projected_cov = H @ cov @ H.T + np.diag(np.square(std))
+
+        import scipy.linalg   # deferred: keeps `import ai.pipeline` light
+
+        chol = scipy.linalg.cho_factor(projected_cov, lower=True, check_finite=False)
+        gain = scipy.linalg.cho_solve(chol, (cov @ H.T).T, check_finite=False).T
+
+        innovation = measurement - projected_mean
+        new_mean = mean + innovation @ gain.T
+        new_cov = cov - gain @ projected_cov @ gain.T
+        return new_mean, new_cov
@@ -1,5 +1,21 @@
+"""
+ai/tracker/matching.py
+----------------------
+IoU-based track ↔ detection association.
+
+The cost matrix is built with one broadcast NumPy expression instead of
+a Python double loop.  Pairs below the IoU floor are gated out before
+assignment, and when the surviving candidates are already one-to-one the
+Hungarian solver is skipped entirely (the common case for well-separated
+faces).
+"""
+
 import numpy as np
-from scipy.optimize import linear_sum_assignment
+
+from configs.settings import settings
+
+_GATED_COST = 1e6  # cost for pairs removed by gating
+
 
 def iou(a, b):
     xA, yA = max(a[0], b[0]), max(a[1], b[1])
@@ -9,9 +25,52 @@ def iou(a, b):
     areaB = (b[2]-b[0])*(b[3]-b[1])
     return inter / (areaA+areaB-inter+1e-6)
 
-def associate(tracks, detections):
-    cost = np.zeros((len(tracks), len(detections)))
-    for i, t in enumerate(tracks):
-        for j, d in enumerate(detections):
-            cost[i, j] = 1 - iou(t.bbox, d)
-    return linear_sum_assignment(cost)
+
+def iou_matrix(boxes_a, boxes_b) -> np.ndarray:
+    """Pairwise IoU between ``(T, 4)`` and ``(D, 4)`` xyxy boxes → ``(T, D)``."""
+    a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-6)
+
+
+def associate(tracks, detections, min_iou: float | None = None):
+    """Match *tracks* to *detections* by IoU.
+
+    Args:
+        tracks:     Objects with a ``bbox`` attribute (``[x1, y1, x2, y2]``).
+        detections: ``[x1, y1, x2, y2]`` boxes.
+        min_iou:    Pairs below this IoU are never matched. Defaults to
+                    ``settings.track_match_iou``.
+
+    Returns:
+        ``(rows, cols)`` index arrays of matched track / detection pairs.
+    """
+    empty = np.empty(0, dtype=np.intp)
+    if len(tracks) == 0 or len(detections) == 0:
+        return empty, empty
+
+    floor = settings.track_match_iou if min_iou is None else min_iou
+    ious = iou_matrix([t.bbox for t in tracks], detections)
+    candidates = (ious >= floor) & (ious > 0)
+    if not candidates.any():
+        return empty, empty
+
+    # Fast path: every track and detection has at most one candidate
+    if (candidates.sum(axis=1) <= 1).all() and (candidates.sum(axis=0) <= 1).all():
+        return np.nonzero(candidates)
+
+    from scipy.optimize import linear_sum_assignment   # heavy; only needed off the fast path
+
+    cost = np.where(candidates, 1.0 - ious, _GATED_COST)
+    rows, cols = linear_sum_assignment(cost)
+    keep = candidates[rows, cols]
+    return rows[keep], cols[keep]
@@ -1,6 +1,11 @@
-from dataclasses import dataclass
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
 import numpy as np
-import time
+
+from ai.recognizer.template import EmbeddingTemplate
+
 
 @dataclass
 class Track:
@@ -9,3 +14,8 @@ class Track:
     last_seen: float
     embedding: np.ndarray | None = None
     last_embed_frame: int = 0
+    mean: np.ndarray | None = None         # Kalman state (cx, cy, a, h, v…)
+    covariance: np.ndarray | None = None
+    lost_frames: int = 0                   # consecutive frames without a match
+    deferred_since: int | None = None      # frame the embed budget first postponed it
+    template: EmbeddingTemplate = field(default_factory=EmbeddingTemplate)
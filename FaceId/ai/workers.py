@@ -0,0 +1,740 @@
+"""
+ai/workers.py
+-------------
+Multi-process model workers (``execution_mode="process"``).
+
+Executor threads share one interpreter, so the pipeline's Python glue —
+cropping, tracking, pose maths, result building — serialises on the GIL
+however many threads there are.  :class:`ProcessWorkerPool` spawns
+``process_workers`` processes, each holding its own models, gallery
+copy and attendance outbox, and leaves the FastAPI process with nothing
+but socket I/O.
+
+Frame transport
+~~~~~~~~~~~~~~~
+Each worker owns a ``multiprocessing.shared_memory`` ring of
+``worker_ring_slots`` slots of ``worker_slot_bytes`` each.  The server
+copies the raw JPEG bytes into a free slot and sends only
+``(request id, session, slot, length)`` over the worker's queue; the
+worker decodes straight out of the shared buffer.  A slot is freed when
+its result comes back, so a full ring makes :meth:`submit` wait (the
+``/ws`` mailbox then drops stale frames).  Frames larger than a slot
+are sent inline through the queue instead.
+
+Sessions
+~~~~~~~~
+Tracker state lives in the worker, so every session is pinned to one
+worker — the one with the fewest sessions when it opens.
+
+Failures
+~~~~~~~~
+A worker that exits is restarted (up to ``worker_max_restarts`` times)
+with the pool's current model version; its in-flight frames fail and
+its sessions continue on the new process with fresh tracker state.
+While it loads, new sessions go to the other workers.  A worker that
+cannot be restarted is dropped and its sessions move to the others.
+Each worker replies over its own pipe, so one killed halfway through a
+reply cannot leave the others blocked on a shared lock.
+Requests to every worker (stats, model swaps) report a worker that does
+not answer in time as unavailable instead of failing the whole call.
+:meth:`open_session`, :meth:`close_session`, :meth:`reload_state` and
+:meth:`swap_models` mirror :class:`~ai.pipeline.FacePipeline`, so the
+WebSocket layer and the REST endpoints do not care which mode is active.
+Gallery changes made in the server process are forwarded to every worker.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from multiprocessing import connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any
+
+from ai.session import SessionState
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_THREAD_ENV = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+
+@dataclass
+class _Worker:
+    index: int
+    process: Any                    # multiprocessing.Process
+    inbox: Any                      # multiprocessing.Queue
+    results: Any                    # read end of its reply pipe; None once closed
+    shm: SharedMemory
+    free: deque[int]
+    sessions: int = 0
+    pending: dict[int, tuple[Future, int | None]] = field(default_factory=dict)
+    ready: bool = True              # False while a restarted process loads its models
+    restarts: int = 0
+    failed: bool = False            # gave up restarting; takes no sessions
+
+    @property
+    def available(self) -> bool:
+        return self.ready and not self.failed
+
+
+class ProcessWorkerPool:
+    """Run the pipeline in worker processes fed through shared memory.
+
+    Args:
+        workers:    Number of worker processes.  Defaults to
+                    ``settings.process_workers``, or one per CPU core
+                    when that is 0.
+        slots:      Shared-memory slots per worker
+                    (``settings.worker_ring_slots``).
+        slot_bytes: Size of one slot (``settings.worker_slot_bytes``).
+        factory:    Picklable zero-argument callable that builds the
+                    pipeline inside each worker.  Defaults to
+                    :class:`~ai.pipeline.FacePipeline`.
+        max_restarts: Times one worker is restarted after exiting
+                    (``settings.worker_max_restarts``).
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        slots: int | None = None,
+        slot_bytes: int | None = None,
+        factory: Callable[[], Any] | None = None,
+        max_restarts: int | None = None,
+    ) -> None:
+        self.n_workers = max(1, workers or settings.process_workers or os.cpu_count() or 1)
+        self.slots = max(1, slots or settings.worker_ring_slots)
+        self.slot_bytes = max(1, slot_bytes or settings.worker_slot_bytes)
+        self.factory = factory
+        self.max_restarts = (
+            settings.worker_max_restarts if max_restarts is None else max_restarts
+        )
+
+        self._ctx = mp.get_context("spawn")   # never fork a process holding CUDA / ORT state
+        self._wake = None                     # pipe that stops the collector
+        self._workers: list[_Worker] = []
+        self._cond = threading.Condition()
+        self._sessions: dict[str, SessionState] = {}
+        self._assignment: dict[str, int] = {}
+        self._ids = itertools.count()
+        self._collector: threading.Thread | None = None
+        self._running = False
+        self.model_version = settings.model_version
+
+        self._frames = 0
+        self._inline = 0
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self, timeout: float = 300.0) -> None:
+        """Spawn the workers and wait until every one has loaded its models."""
+        if self._running:
+            return
+        from storage.vector_search import gallery
+
+        self._wake = self._ctx.Pipe(duplex=False)
+        for index in range(self.n_workers):
+            shm = SharedMemory(create=True, size=self.slots * self.slot_bytes)
+            inbox, results, process = self._spawn(index, shm)
+            self._workers.append(
+                _Worker(index, process, inbox, results, shm, deque(range(self.slots)))
+            )
+
+        waiting = {w.results: w.index for w in self._workers}
+        deadline = time.monotonic() + timeout
+        while waiting:
+            ready = connection.wait(list(waiting), max(0.0, deadline - time.monotonic()))
+            if not ready:
+                self._shutdown_workers()
+                self._close_pipes()
+                raise RuntimeError(
+                    f"workers {sorted(waiting.values())} not ready after {timeout:.0f}s"
+                )
+            for conn in ready:
+                index = waiting.pop(conn)
+                message = _receive(conn)
+                if message is None or message[0] == "error":
+                    self._shutdown_workers()
+                    self._close_pipes()
+                    reason = "it exited" if message is None else message[3]
+                    raise RuntimeError(f"worker {index} failed to start:\n{reason}")
+
+        self._running = True
+        self._collector = threading.Thread(target=self._collect, name="worker-results", daemon=True)
+        self._collector.start()
+        gallery.add_listener(self._on_gallery)
+        logger.info(
+            "Process worker pool ready (%d workers, %d × %d KiB slots each)",
+            self.n_workers, self.slots, self.slot_bytes // 1024,
+        )
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the workers; frames still in flight fail with ``RuntimeError``."""
+        from storage.vector_search import gallery
+
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+        gallery.remove_listener(self._on_gallery)
+        self._shutdown_workers(timeout)
+        self._wake[1].send(None)
+        if self._collector is not None:
+            self._collector.join(timeout)
+            self._collector = None
+        with self._cond:
+            for worker in self._workers:
+                self._fail_pending(worker, "worker pool stopped")
+            self._close_pipes()
+            self._workers = []
+
+    # ── Session API (mirrors FacePipeline) ───────────────────────────────────
+
+    def open_session(self, session_id: str) -> SessionState:
+        """Pin *session_id* to the least-loaded worker and return its handle.
+
+        Workers that are restarting or dropped are skipped while any
+        other worker is serving.
+        """
+        with self._cond:
+            state = self._sessions.get(session_id)
+            if state is None:
+                index = self._least_loaded()
+                self._workers[index].sessions += 1
+                self._assignment[session_id] = index
+                state = SessionState(session_id=session_id)
+                self._sessions[session_id] = state
+            return state
+
+    def close_session(self, session_id: str) -> None:
+        """Release *session_id* here and in its worker."""
+        with self._cond:
+            if self._sessions.pop(session_id, None) is None:
+                return
+            worker = self._workers[self._assignment.pop(session_id)]
+            worker.sessions -= 1
+        worker.inbox.put(("close", session_id))
+
+    @property
+    def session_count(self) -> int:
+        return len(self._sessions)
+
+    def reload_state(self) -> None:
+        """Reset tracker and identity state in every worker."""
+        self._broadcast(("reload_state",))
+
+    def swap_models(self, version: str, timeout: float = 600.0) -> dict[str, Any]:
+        """Hot-swap every worker to model *version*.
+
+        Each worker loads and warms the new models on a background thread
+        while it keeps serving frames.  If any worker fails, the ones that
+        already switched are swapped back so the pool stays on one version.
+        """
+        previous = self.model_version
+        replies = [
+            (worker.index, ok, value)
+            for worker, (ok, value) in self._request_all("swap", version, timeout)
+        ]
+        failed = [(i, value) for i, ok, value in replies if not ok]
+        if failed:
+            switched = [i for i, ok, _ in replies if ok]
+            if switched:
+                self._request_all("swap", previous, timeout, only=switched)
+            index, reason = failed[0]
+            raise RuntimeError(f"worker {index} could not load {version}: {reason}")
+        self.model_version = version
+        results = [value for _, _, value in replies]
+        return {
+            **results[0],
+            "load_s": max(r["load_s"] for r in results),
+            "warmup_s": max(r["warmup_s"] for r in results),
+            "draining_frames": sum(r["draining_frames"] for r in results),
+            "workers": len(results),
+        }
+
+    def recognition_stats(self, timeout: float = 2.0) -> dict[str, Any]:
+        """Recognition counters summed over every worker (rates and timings averaged).
+
+        Workers that do not answer within *timeout* (busy, restarting or
+        dropped) are listed under ``unavailable_workers``.
+        """
+        total: dict[str, Any] = {}
+        replies, unavailable = [], []
+        for worker, (ok, value) in self._request_all("stats", None, timeout):
+            if ok:
+                replies.append(value)
+            else:
+                unavailable.append(worker.index)
+        for value in replies:
+            _merge_counts(total, value)
+        _average_ratios(total, len(replies))
+        total["unavailable_workers"] = unavailable
+        return total
+
+    # ── Frames ───────────────────────────────────────────────────────────────
+
+    def submit(self, data: bytes, state: SessionState) -> Future:
+        """Send encoded frame *data* to *state*'s worker.
+
+        Blocks while that worker's ring has no free slot.  The future
+        resolves to the result list, or ``None`` if *data* is not an image.
+        """
+        session_id = state.session_id
+        if session_id not in self._assignment:
+            self.open_session(session_id)
+        inline = len(data) > self.slot_bytes
+        slot = None
+        with self._cond:
+            while True:
+                # re-read: a dropped worker's sessions move to another one
+                worker = self._workers[self._assignment[session_id]]
+                if not self._running:
+                    raise RuntimeError("worker pool is not running")
+                if worker.failed:
+                    raise RuntimeError(f"worker {worker.index} is not running")
+                if inline or worker.free:
+                    break
+                self._cond.wait()
+            if inline:
+                self._inline += 1
+            else:
+                slot = worker.free.popleft()
+            request_id = next(self._ids)
+            future: Future = Future()
+            worker.pending[request_id] = (future, slot)
+
+        if slot is None:
+            worker.inbox.put(("frame", request_id, session_id, None, len(data), bytes(data)))
+        else:
+            offset = slot * self.slot_bytes
+            worker.shm.buf[offset:offset + len(data)] = data
+            worker.inbox.put(("frame", request_id, session_id, slot, len(data), None))
+        return future
+
+    def process(self, data: bytes, state: SessionState) -> list[dict[str, Any]] | None:
+        """Blocking convenience wrapper around :meth:`submit`."""
+        return self.submit(data, state).result()
+
+    def stats(self) -> dict[str, Any]:
+        """Frame counters plus sessions / in-flight frames per worker."""
+        with self._cond:
+            return {
+                "frames": self._frames,
+                "inline_frames": self._inline,
+                "workers": [
+                    {
+                        "pid": w.process.pid,
+                        "alive": w.process.is_alive(),
+                        "ready": w.available,
+                        "restarts": w.restarts,
+                        "sessions": w.sessions,
+                        "in_flight": len(w.pending),
+                        "free_slots": len(w.free),
+                    }
+                    for w in self._workers
+                ],
+            }
+
+    # ── Internals ────────────────────────────────────────────────────────────
+
+    def _collect(self) -> None:
+        """Route worker results back to their futures (server-side thread).
+
+        This thread is the only reader of the reply pipes, so it is also
+        the one that closes them.
+        """
+        wake = self._wake[0]
+        checked = time.monotonic()
+        while True:
+            with self._cond:
+                readers = {w.results: w for w in self._workers if w.results is not None}
+            ready = connection.wait([wake, *readers], timeout=1.0)
+            for conn in ready:
+                worker = readers.get(conn)
+                if worker is None:
+                    continue
+                message = _receive(conn)
+                if message is None:
+                    # the process is gone; _check_workers restarts or drops it
+                    with self._cond:
+                        worker.results = None
+                    conn.close()
+                    continue
+                self._route(message)
+            if wake in ready:
+                return
+            if time.monotonic() - checked >= 1.0:
+                self._check_workers()
+                checked = time.monotonic()
+
+    def _route(self, message: tuple) -> None:
+        kind, index, request_id, payload = message
+        if kind in ("ready", "error"):
+            self._on_restarted(index, kind, payload)
+            return
+        if kind not in ("result", "reply"):
+            return
+        with self._cond:
+            worker = self._workers[index]
+            future, slot = worker.pending.pop(request_id, (None, None))
+            if slot is not None:
+                worker.free.append(slot)
+                self._cond.notify_all()
+            if kind == "result":
+                self._frames += 1
+        if future is not None:
+            future.set_result(payload)
+
+    def _check_workers(self) -> None:
+        """Fail the frames of workers that exited, then restart or drop them."""
+        with self._cond:
+            if not self._running:
+                return
+            for worker in self._workers:
+                if worker.failed or worker.process.is_alive():
+                    continue
+                logger.error(
+                    "Worker %d exited (code %s) with %d frames in flight",
+                    worker.index, worker.process.exitcode, len(worker.pending),
+                )
+                self._fail_pending(worker, f"worker {worker.index} exited")
+                if worker.results is not None:
+                    worker.results.close()   # whatever is left answers failed frames
+                    worker.results = None
+                if worker.restarts >= self.max_restarts:
+                    self._drop(worker)
+                    continue
+                worker.restarts += 1
+                worker.ready = False
+                worker.inbox.cancel_join_thread()   # never block exit on the dead reader
+                worker.inbox.close()
+                worker.inbox, worker.results, worker.process = self._spawn(
+                    worker.index, worker.shm
+                )
+                logger.warning(
+                    "Restarting worker %d (restart %d of %d)",
+                    worker.index, worker.restarts, self.max_restarts,
+                )
+
+    def _on_restarted(self, index: int, kind: str, payload: Any) -> None:
+        with self._cond:
+            worker = self._workers[index]
+            if kind == "ready":
+                worker.ready = True
+                logger.info("Worker %d restarted (pid %s)", index, worker.process.pid)
+            else:
+                # the process has returned; _check_workers retries or drops it
+                logger.error("Worker %d failed to restart:\n%s", index, payload)
+
+    def _drop(self, worker: _Worker) -> None:
+        """Stop using *worker* and move its sessions to the others (lock held)."""
+        worker.failed = True
+        worker.ready = False
+        self._cond.notify_all()
+        moved = [s for s, i in self._assignment.items() if i == worker.index]
+        logger.error(
+            "Worker %d gave up after %d restarts; moving %d sessions",
+            worker.index, worker.restarts, len(moved),
+        )
+        if not any(w.available for w in self._workers):
+            return
+        for session_id in moved:
+            index = self._least_loaded()
+            self._workers[index].sessions += 1
+            self._assignment[session_id] = index
+        worker.sessions = 0
+
+    def _least_loaded(self) -> int:
+        """Index of the available worker with the fewest sessions (lock held)."""
+        candidates = [w for w in self._workers if w.available] or [
+            w for w in self._workers if not w.failed
+        ]
+        if not candidates:
+            raise RuntimeError("no worker process is available")
+        return min(candidates, key=lambda w: w.sessions).index
+
+    def _spawn(self, index: int, shm: SharedMemory):
+        """Start the process for worker *index*; returns ``(inbox, results, process)``."""
+        inbox = self._ctx.Queue()
+        results, writer = self._ctx.Pipe(duplex=False)
+        with _thread_env(settings.worker_threads):
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(index, inbox, writer, shm.name, self.slot_bytes,
+                      self.factory, self.model_version),
+                name=f"face-worker-{index}",
+                daemon=True,
+            )
+            process.start()
+        writer.close()   # the worker holds the only write end: its exit reads as EOF
+        return inbox, results, process
+
+    def _fail_pending(self, worker: _Worker, reason: str) -> None:
+        for future, slot in worker.pending.values():
+            if slot is not None:
+                worker.free.append(slot)
+            if not future.done():
+                future.set_exception(RuntimeError(reason))
+        worker.pending.clear()
+        self._cond.notify_all()
+
+    def _broadcast(self, message: tuple) -> None:
+        for worker in self._workers:
+            if not worker.failed:
+                worker.inbox.put(message)
+
+    def _request_all(
+        self,
+        kind: str,
+        arg: Any,
+        timeout: float,
+        only: list[int] | None = None,
+    ) -> list[tuple[_Worker, tuple[bool, Any]]]:
+        """Send a request to every worker (or *only* some) and wait for the
+        ``(ok, value)`` replies.
+
+        A worker that is restarting, dropped or does not reply within
+        *timeout* gets ``(False, reason)``; its pending entry is removed.
+        """
+        sent, replies = [], {}
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("worker pool is not running")
+            for worker in self._workers:
+                if only is not None and worker.index not in only:
+                    continue
+                if not worker.available:
+                    replies[worker.index] = (False, f"worker {worker.index} is unavailable")
+                    continue
+                request_id = next(self._ids)
+                future: Future = Future()
+                worker.pending[request_id] = (future, None)
+                sent.append((worker, request_id, future))
+        for worker, request_id, _ in sent:
+            worker.inbox.put((kind, request_id, arg))
+        deadline = time.monotonic() + timeout
+        for worker, request_id, future in sent:
+            try:
+                replies[worker.index] = future.result(max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                with self._cond:
+                    worker.pending.pop(request_id, None)
+                logger.warning("Worker %d did not answer %r within %.1fs",
+                               worker.index, kind, timeout)
+                replies[worker.index] = (False, f"worker {worker.index} timed out")
+            except RuntimeError as exc:   # the worker exited meanwhile
+                replies[worker.index] = (False, str(exc))
+        return [
+            (worker, replies[worker.index])
+            for worker in self._workers if worker.index in replies
+        ]
+
+    def _on_gallery(self, event: str, *args: Any) -> None:
+        self._broadcast(("gallery", event, *args))
+
+    def _shutdown_workers(self, timeout: float = 5.0) -> None:
+        for worker in self._workers:
+            if worker.process.is_alive():
+                worker.inbox.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self._workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.shm.close()
+            worker.shm.unlink()
+
+    def _close_pipes(self) -> None:
+        for worker in self._workers:
+            if worker.results is not None:
+                worker.results.close()
+                worker.results = None
+        for conn in self._wake:
+            conn.close()
+
+
+@contextmanager
+def _thread_env(threads: int):
+    """Limit BLAS / OpenMP threads of processes spawned inside the block.
+
+    Every worker gets ``threads`` native threads, so N workers on N cores
+    do not oversubscribe the CPU.
+    """
+    saved = {name: os.environ.get(name) for name in _THREAD_ENV}
+    if threads > 0:
+        os.environ.update({name: str(threads) for name in _THREAD_ENV})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+# ── Worker process ────────────────────────────────────────────────────────────
+
+def _worker_main(
+    index: int,
+    inbox,
+    results,
+    shm_name: str,
+    slot_bytes: int,
+    factory: Callable[[], Any] | None,
+    version: str | None = None,
+) -> None:
+    """Entry point of one worker process.
+
+    *version* is the pool's current model version; a worker restarted
+    after a hot-swap switches to it before reporting ready.
+    """
+    logging.basicConfig(
+        level=getattr(logging, settings.log_level.upper(), logging.INFO),
+        format=f"%(asctime)s | %(levelname)-8s | worker-{index} | %(name)-35s | %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S",
+    )
+    results = _ReplyPipe(results)
+    shm = SharedMemory(name=shm_name)
+    try:
+        import cv2
+
+        from app.decoding import decode_frame, scale_results
+        from storage.attendance_outbox import outbox
+        from storage.vector_search import gallery, load_gallery
+
+        if settings.worker_threads > 0:
+            cv2.setNumThreads(settings.worker_threads)
+            if "torch" in sys.modules:
+                sys.modules["torch"].set_num_threads(settings.worker_threads)
+
+        if factory is None:
+            from ai.pipeline import FacePipeline as factory
+        pipeline = factory()
+        if version is not None and getattr(pipeline, "model_version", version) != version:
+            pipeline.swap_models(version)
+        if not gallery.loaded:
+            load_gallery(save=False)   # the server owns the snapshot directory
+        outbox.start()
+    except Exception:  # noqa: BLE001 — any startup failure is reported to the parent
+        results.put(("error", index, None, traceback.format_exc()))
+        shm.close()
+        return
+    results.put(("ready", index, None, None))
+
+    while True:
+        message = inbox.get()
+        if message is None:
+            break
+        kind = message[0]
+        try:
+            if kind == "frame":
+                _, request_id, session_id, slot, length, inline = message
+                if inline is None:
+                    offset = slot * slot_bytes
+                    view = shm.buf[offset:offset + length]
+                    try:
+                        frame, factor = decode_frame(view)
+                    finally:
+                        view.release()
+                else:
+                    frame, factor = decode_frame(inline)
+                payload = None
+                if frame is not None:
+                    state = pipeline.open_session(session_id)
+                    payload = scale_results(pipeline.process(frame, state, factor), factor)
+                results.put(("result", index, request_id, payload))
+            elif kind == "close":
+                pipeline.close_session(message[1])
+            elif kind == "reload_state":
+                pipeline.reload_state()
+            elif kind == "swap":
+                # load on the side so this worker keeps serving frames meanwhile
+                threading.Thread(
+                    target=_swap_models, args=(index, results, pipeline, *message[1:]),
+                    name="model-swap", daemon=True,
+                ).start()
+            elif kind == "stats":
+                results.put(("reply", index, message[1], (True, pipeline.recognition_stats())))
+            elif kind == "gallery":
+                _apply_gallery_event(gallery, load_gallery, message[1], message[2:])
+        except Exception:
+            logger.exception("Worker %d failed on %r message", index, kind)
+            if kind == "frame":
+                results.put(("result", index, message[1], []))
+
+    outbox.stop()
+    shm.close()
+
+
+class _ReplyPipe:
+    """Worker end of the reply pipe; the model-swap thread sends on it too."""
+
+    def __init__(self, conn) -> None:
+        self._conn = conn
+        self._lock = threading.Lock()
+
+    def put(self, message: tuple) -> None:
+        with self._lock:
+            self._conn.send(message)
+
+
+def _receive(conn) -> tuple | None:
+    """Next message on a reply pipe, or ``None`` once the worker has gone."""
+    try:
+        return conn.recv()
+    except (EOFError, OSError):
+        return None
+
+
+def _swap_models(index: int, results, pipeline, request_id: int, version: str) -> None:
+    try:
+        reply = (True, pipeline.swap_models(version))
+    except Exception as exc:
+        logger.exception("Worker %d failed to swap to model %s", index, version)
+        reply = (False, f"{type(exc).__name__}: {exc}")
+    results.put(("reply", index, request_id, reply))
+
+
+def _merge_counts(total: dict[str, Any], part: dict[str, Any]) -> None:
+    """Add the numbers of *part* into *total*, recursing into dicts."""
+    for key, value in part.items():
+        if isinstance(value, dict):
+            _merge_counts(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+        else:
+            total.setdefault(key, value)   # labels such as the cache backend name
+
+
+def _average_ratios(total: dict[str, Any], count: int) -> None:
+    """Turn summed ``*_ms`` / ``*_rate`` values back into per-worker averages."""
+    for key, value in total.items():
+        if isinstance(value, dict):
+            _average_ratios(value, count)
+        elif key.endswith(("_ms", "_rate")) and count:
+            total[key] = round(value / count, 4)
+
+
+def _apply_gallery_event(gallery, load_gallery, event: str, args: tuple) -> None:
+    """Replay a server-side gallery change on this worker's copy."""
+    if event == "add":
+        gallery.add(*args)
+    elif event == "remove":
+        gallery.remove_student(*args)
+    elif event == "load":
+        load_gallery(save=False)
@@ -0,0 +1,110 @@
+"""
+app/decoding.py
+---------------
+Frame decoding for the WebSocket stream.
+
+Decoding a 1080p JPEG costs several milliseconds, so it runs on the
+pipeline executor together with inference, never on the event loop.
+
+When a JPEG is much larger than the detector input, it is decoded
+straight to 1/2, 1/4 or 1/8 resolution with ``IMREAD_REDUCED_COLOR_*``:
+libjpeg skips the discarded DCT coefficients, so the reduced decode is
+several times cheaper than a full decode followed by YOLO's own
+downscale.  Boxes produced on the reduced frame are scaled back to the
+client's original coordinates by :func:`scale_results`.
+"""
+
+from __future__ import annotations
+
+import logging
+import struct
+from typing import Any
+
+import cv2
+import numpy as np
+
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# SOF markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) do not
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def decode_frame(data: bytes) -> tuple[np.ndarray | None, int]:
+    """Decode JPEG/PNG *data* into a BGR frame.
+
+    Returns:
+        ``(frame, factor)`` — the decoded frame (``None`` if the bytes are
+        not an image) and the downscale factor applied (1, 2, 4 or 8).
+    """
+    buf = np.frombuffer(data, np.uint8)
+    factor = reduction_factor(data)
+    flags = _REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR)
+    frame = cv2.imdecode(buf, flags)
+    if frame is None and factor != 1:
+        factor = 1
+        frame = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    return frame, factor
+
+
+def reduction_factor(data: bytes) -> int:
+    """Largest allowed factor that keeps the long side ≥ the detector input."""
+    if not settings.decode_reduced:
+        return 1
+    size = jpeg_size(data)
+    if size is None:
+        return 1
+    long_side = max(size)
+    factor = 1
+    for f in (2, 4, 8):
+        if f > settings.decode_max_reduction:
+            break
+        if long_side / f < settings.detection_input_size:
+            break
+        factor = f
+    return factor
+
+
+def jpeg_size(data: bytes) -> tuple[int, int] | None:
+    """Return ``(width, height)`` from a JPEG header, or ``None``.
+
+    Walks the marker segments up to the first SOF marker without
+    decoding any image data.
+    """
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:          # fill byte
+            i += 1
+            continue
+        if marker in (0x01, *range(0xD0, 0xD8)):   # stand-alone markers
+            i += 2
+            continue
+        (length,) = struct.unpack(">H", data[i + 2:i + 4])
+        if marker in _SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def scale_results(results: list[dict[str, Any]], factor: int) -> list[dict[str, Any]]:
+    """Map result boxes from a reduced frame back to original pixels."""
+    if factor != 1:
+        for r in results:
+            r["bbox"] = [int(v * factor) for v in r["bbox"]]
+    return results
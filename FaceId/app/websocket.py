@@ -8,12 +8,33 @@ Key design decisions
 * ``pipeline.process()`` is CPU-bound (YOLO + InsightFace + MediaPipe).
   Running it directly on the async event loop would block all other
   connections.  We offload it to a **thread pool executor** so the
-  event loop stays responsive.
+  event loop stays responsive.  JPEG decoding is fused into the same
+  executor call (see ``app/decoding.py``) so it never blocks the loop
+  either.
 
 * ``ConnectionManager`` keeps a registry of active connections so the
   server can broadcast to all streams or cleanly disconnect them on
   shutdown.
 
+* The models inside ``FacePipeline`` are shared, but every connection
+  gets its own ``SessionState`` (tracker, frame counter, smoothing
+  history).  Streams from different cameras therefore never share track
+  IDs, and each stream's cost is independent of how many are open.
+
+Execution modes (``settings.execution_mode``)
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+* ``"direct"``  — each session runs ``pipeline.process`` in the executor.
+* ``"batched"`` — frames from all sessions are micro-batched by
+  ``ai.scheduler.InferenceScheduler`` so YOLO and ArcFace run once per
+  batch instead of once per frame.
+* ``"staged"``  — ``ai.staged.StagedExecutor`` runs detection,
+  recognition and behaviour on separate workers; each session keeps up
+  to ``ws_pipeline_depth`` frames in flight so consecutive frames
+  overlap in different stages.
+* ``"process"`` — ``ai.workers.ProcessWorkerPool`` runs the pipeline in
+  separate worker processes fed through shared memory; this process
+  loads no models and only moves bytes.
+
 Scaling note
 ~~~~~~~~~~~~
 At >50 concurrent streams, consider moving frame processing to
@@ -32,64 +53,213 @@ from __future__ import annotations
 
 import asyncio
 import logging
+import threading
+import time
 import uuid
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
 
-import cv2
-import numpy as np
 from fastapi import WebSocket, WebSocketDisconnect
 
 from ai.pipeline import FacePipeline
+from ai.scheduler import InferenceScheduler
+from ai.session import SessionState
+from ai.staged import StagedExecutor
+from ai.workers import ProcessWorkerPool
+from app.decoding import decode_frame, scale_results
+from configs.settings import settings
 
 logger = logging.getLogger(__name__)
 
-# Shared thread pool — one thread per CPU core (frame processing is GIL-releasing
-# during YOLO/InsightFace inference via native C extensions).
+# Shared thread pool.  YOLO / InsightFace inference releases the GIL, but the
+# pipeline's Python glue does not — use execution_mode="process" to scale that
+# across cores.
 _executor = ThreadPoolExecutor(thread_name_prefix="pipeline")
 
 # Module-level singleton pipeline — created once at startup via lifespan.
 _pipeline: FacePipeline | None = None
 
+# Cross-session executors — at most one is created, per execution_mode.
+_scheduler: InferenceScheduler | None = None
+_staged: StagedExecutor | None = None
+_workers: ProcessWorkerPool | None = None
+
+# Set once the models are loaded and warmed up (see /ready)
+_ready = threading.Event()
+_init_lock = threading.Lock()
+_startup: dict[str, Any] = {"cold_start_s": None, "first_frame_ms": None, "error": None}
+
 
 def init_pipeline() -> None:
     """Initialise the module-level pipeline singleton.
 
-    Called from the FastAPI lifespan so heavy model loading happens
-    at startup, not on the first WebSocket connection.
+    Called at startup so heavy model loading and warm-up happen before
+    the first WebSocket frame.  In ``"process"`` mode the models are
+    loaded (and warmed up) by the worker processes instead.  Concurrent
+    callers wait for the first one to finish.
+    """
+    global _pipeline, _scheduler, _staged, _workers
+    with _init_lock:
+        t0 = time.perf_counter()
+        if settings.execution_mode == "process":
+            if _workers is None:
+                _workers = ProcessWorkerPool()
+                _workers.start()
+        else:
+            if _pipeline is None:
+                logger.info("Loading FacePipeline …")
+                _pipeline = FacePipeline()
+                _startup.update(_pipeline.startup)
+            if settings.execution_mode == "batched" and _scheduler is None:
+                _scheduler = InferenceScheduler(_pipeline)
+                _scheduler.start()
+            elif settings.execution_mode == "staged" and _staged is None:
+                _staged = StagedExecutor(_pipeline)
+                _staged.start()
+        if not _ready.is_set():
+            _startup["cold_start_s"] = round(time.perf_counter() - t0, 3)
+            logger.info(
+                "Pipeline ready (mode=%s) — cold start %.2fs",
+                settings.execution_mode, _startup["cold_start_s"],
+            )
+            _startup["error"] = None
+            _ready.set()
+
+
+def preload_pipeline() -> Future:
+    """Run :func:`init_pipeline` in the background on the frame executor.
+
+    The thread that loads the models also builds its FaceMesh during
+    warm-up, and is then reused for frames.  A failure is logged and
+    recorded for ``/ready`` and ``/health`` (see :func:`startup_error`).
     """
-    global _pipeline
-    if _pipeline is None:
-        logger.info("Loading FacePipeline …")
-        _pipeline = FacePipeline()
+    future = _executor.submit(init_pipeline)
+    future.add_done_callback(_on_preload_done)
+    return future
+
+
+def _on_preload_done(future: Future) -> None:
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Pipeline failed to start", exc_info=exc)
+        _startup["error"] = f"{type(exc).__name__}: {exc}"
+
+
+def pipeline_ready() -> bool:
+    """``True`` once the models are loaded and warmed up."""
+    return _ready.is_set()
+
+
+def startup_error() -> str | None:
+    """Why the background model load failed, or ``None``."""
+    return _startup["error"]
+
+
+def startup_metrics() -> dict[str, Any]:
+    """Cold-start and first-frame timings (for ``/ready`` and ``/metrics``)."""
+    return {"ready": pipeline_ready(), **_startup}
 
 
-def get_pipeline() -> FacePipeline:
-    """Return the shared pipeline, creating it if necessary."""
-    global _pipeline
-    if _pipeline is None:
+def shutdown_pipeline() -> None:
+    """Stop background execution workers (called on application shutdown)."""
+    global _scheduler, _staged, _workers
+    _ready.clear()
+    if _workers is not None:
+        _workers.stop()
+        _workers = None
+    if _scheduler is not None:
+        _scheduler.stop()
+        _scheduler = None
+    if _staged is not None:
+        _staged.stop()
+        _staged = None
+
+
+def execution_metrics() -> dict[str, Any]:
+    """Runtime metrics of the active execution mode (for ``/metrics``)."""
+    return {
+        "mode": settings.execution_mode,
+        "scheduler": _scheduler.stats() if _scheduler is not None else None,
+        "staged": _staged.stats() if _staged is not None else None,
+        "workers": _workers.stats() if _workers is not None else None,
+    }
+
+
+def recognition_metrics() -> dict[str, Any] | None:
+    """Recognition counters (quality-gate skips, …) of the running pipeline.
+
+    Blocks briefly in ``"process"`` mode, where every worker is asked for
+    its counters.
+    """
+    owner = _workers if _workers is not None else _pipeline
+    return owner.recognition_stats() if owner is not None else None
+
+
+def active_model_version() -> str:
+    """Model version currently serving frames (``settings`` before startup)."""
+    owner = _workers if _workers is not None else _pipeline
+    return owner.model_version if owner is not None else settings.model_version
+
+
+def get_pipeline() -> FacePipeline | ProcessWorkerPool:
+    """Return the shared pipeline, creating it if necessary.
+
+    In ``"process"`` mode this is the worker pool, which offers the same
+    session API (``open_session`` / ``close_session`` / ``reload_state``
+    / ``swap_models``).
+    """
+    if _workers is None and _pipeline is None:
         init_pipeline()
-    return _pipeline  # type: ignore[return-value]
+    return _workers if _workers is not None else _pipeline  # type: ignore[return-value]
+
+
+def running_pipeline() -> FacePipeline | ProcessWorkerPool | None:
+    """Return the pipeline once it is ready, else ``None``.
+
+    Never loads models or waits for the startup lock, so async handlers
+    call this instead of :func:`get_pipeline`.
+    """
+    if not pipeline_ready():
+        return None
+    return _workers if _workers is not None else _pipeline
 
 
 # ── Connection manager ────────────────────────────────────────────────────────
 
 class ConnectionManager:
-    """Track active WebSocket connections for lifecycle management."""
+    """Track active WebSocket connections for lifecycle management.
+
+    Each connection is paired with a per-stream :class:`SessionState`
+    opened on the shared pipeline, and released again on disconnect.
+    """
 
     def __init__(self) -> None:
         self._active: dict[str, WebSocket] = {}
 
-    async def connect(self, ws: WebSocket) -> str:
-        """Accept *ws* and register it; return a unique session ID."""
+    async def connect(
+        self, ws: WebSocket, pipeline: FacePipeline | ProcessWorkerPool
+    ) -> tuple[str, SessionState]:
+        """Accept *ws* and register it with a new session on *pipeline*.
+
+        Returns:
+            ``(session_id, state)`` — a unique session ID and the
+            pipeline state dedicated to this stream.
+        """
         await ws.accept()
         session_id = str(uuid.uuid4())[:8]
+        state = pipeline.open_session(session_id)
         self._active[session_id] = ws
         logger.info("WebSocket connected  session=%s  total=%d", session_id, len(self._active))
-        return session_id
+        return session_id, state
 
     def disconnect(self, session_id: str) -> None:
-        """Remove a session from the registry."""
+        """Remove a session from the registry and free its pipeline state."""
         self._active.pop(session_id, None)
+        owner = _workers if _workers is not None else _pipeline
+        if owner is not None:
+            owner.close_session(session_id)
         logger.info("WebSocket disconnected session=%s  total=%d", session_id, len(self._active))
 
     @property
@@ -102,48 +272,237 @@ manager = ConnectionManager()
 
 # ── Handler ───────────────────────────────────────────────────────────────────
 
+def _decode_and_process(
+    pipeline: FacePipeline,
+    data: bytes,
+    state: SessionState,
+) -> list[dict[str, Any]] | None:
+    """Decode *data* and run it through the pipeline (executor thread).
+
+    Returns ``None`` if the bytes are not a decodable image.
+    """
+    frame, factor = decode_frame(data)
+    if frame is None:
+        return None
+    return scale_results(pipeline.process(frame, state, factor), factor)
+
+
+async def _run_frame(
+    pipeline: FacePipeline,
+    data: bytes,
+    state: SessionState,
+) -> list[dict[str, Any]] | None:
+    """Run one frame through the configured execution mode."""
+    loop = asyncio.get_running_loop()
+    if _workers is not None:
+        # submit() only copies bytes, but may wait for a free ring slot
+        future = await loop.run_in_executor(_executor, _workers.submit, data, state)
+        return await asyncio.wrap_future(future)
+    if _scheduler is None:
+        return await loop.run_in_executor(
+            _executor,
+            _decode_and_process,
+            pipeline,
+            data,
+            state,
+        )
+
+    frame, factor = await loop.run_in_executor(_executor, decode_frame, data)
+    if frame is None:
+        return None
+    results = await asyncio.wrap_future(_scheduler.submit(frame, state, factor))
+    return scale_results(results, factor)
+
+
+def _decode_and_submit(
+    data: bytes,
+    state: SessionState,
+) -> tuple[Future | None, int]:
+    """Decode *data* and hand it to the first stage (executor thread).
+
+    Blocks while the staged executor's detect queue is full.
+    """
+    frame, factor = decode_frame(data)
+    if frame is None:
+        return None, factor
+    return _staged.submit(frame, state, factor), factor
+
+
+async def _staged_results(future: Future | None, factor: int) -> list[dict[str, Any]] | None:
+    if future is None:
+        return None
+    return scale_results(await asyncio.wrap_future(future), factor)
+
+
+async def _start_frame(
+    pipeline: FacePipeline,
+    data: bytes,
+    state: SessionState,
+) -> asyncio.Future:
+    """Start one frame and return an awaitable for its results.
+
+    In staged mode the frame has entered the first stage when this
+    returns, so a session's frames enter the pipeline in order even
+    while several are in flight.
+    """
+    if _staged is None:
+        return asyncio.ensure_future(_run_frame(pipeline, data, state))
+    loop = asyncio.get_running_loop()
+    future, factor = await loop.run_in_executor(_executor, _decode_and_submit, data, state)
+    return asyncio.ensure_future(_staged_results(future, factor))
+
+
 async def ws_handler(ws: WebSocket) -> None:
     """Handle a single WebSocket session.
 
     Protocol:
       Client → Server : raw JPEG/PNG frame as bytes
-      Server → Client : JSON list of per-face result dicts
-
-    The pipeline runs in a thread-pool executor so the event loop is
-    never blocked by CPU-intensive inference.
+      Server → Client : JSON list of per-face result dicts, plus (if
+                        ``settings.ws_control_interval`` > 0) periodic
+                        ``{"type": "control", "max_fps": …, "dropped": …}``
+                        hints so clients can throttle themselves.
+
+    Three tasks run per session: a receiver that keeps only the newest
+    frame in a one-slot :class:`FrameMailbox`, a processor that takes
+    whatever is newest whenever a pipeline slot is free, and a sender
+    that returns results in frame order.  Frames that arrive while the
+    slots are busy overwrite each other instead of queueing in the
+    socket buffer, so latency stays bounded when a client sends faster
+    than we can process.  There is one slot per session, or
+    ``settings.ws_pipeline_depth`` in staged mode.
+
+    Until the models are warmed up the socket is closed with code 1013
+    (try again later) rather than queueing frames behind the cold start.
     """
-    session_id = await manager.connect(ws)
-    pipeline = get_pipeline()
-    loop = asyncio.get_event_loop()
+    pipeline = running_pipeline()
+    if pipeline is None:
+        await ws.accept()
+        await ws.close(code=1013, reason="models warming up")
+        return
+    session_id, state = await manager.connect(ws, pipeline)
+    mailbox = FrameMailbox()
+    depth = max(1, settings.ws_pipeline_depth) if _staged is not None else 1
+    slots = asyncio.Semaphore(depth)
+    inflight: asyncio.Queue = asyncio.Queue()
+
+    receiver = asyncio.create_task(_receive_loop(ws, mailbox))
+    processor = asyncio.create_task(_process_loop(mailbox, pipeline, state, inflight, slots))
+    sender = asyncio.create_task(_send_loop(ws, mailbox, inflight, slots, depth))
+    tasks = {receiver, processor, sender}
 
     try:
-        processing = False
-        while True:
-            data = await ws.receive_bytes()
-
-            if processing:
-                continue   # drop frame
-
-            processing = True
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            exc = task.exception()
+            if isinstance(exc, WebSocketDisconnect):
+                logger.info("session=%s WebSocket disconnected by client", session_id)
+            elif exc is not None:
+                logger.error(
+                    "session=%s Unexpected error in ws_handler", session_id, exc_info=exc
+                )
+    finally:
+        for task in tasks:
+            task.cancel()
+        logger.debug("session=%s dropped %d stale frames", session_id, mailbox.dropped)
+        manager.disconnect(session_id)
 
-            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
-            if frame is None:
-                processing = False
-                continue
 
-            results = await loop.run_in_executor(
-                _executor,
-                pipeline.process,
-                frame,
-                session_id,
-            )
+class FrameMailbox:
+    """One-slot, latest-frame-wins mailbox between receiver and processor.
 
-            await ws.send_json(results)
-            processing = False
+    :meth:`put` never blocks and replaces any frame not yet taken;
+    :meth:`get` waits for the newest frame (``None`` once closed).
+    """
 
-    except WebSocketDisconnect:
-        logger.info("session=%s WebSocket disconnected by client", session_id)
-    except Exception:
-        logger.exception("session=%s Unexpected error in ws_handler", session_id)
+    def __init__(self) -> None:
+        self._data: bytes | None = None
+        self._ready = asyncio.Event()
+        self._closed = False
+        self.dropped: int = 0
+
+    def put(self, data: bytes) -> None:
+        if self._data is not None:
+            self.dropped += 1
+        self._data = data
+        self._ready.set()
+
+    async def get(self) -> bytes | None:
+        await self._ready.wait()
+        self._ready.clear()
+        data, self._data = self._data, None
+        if data is None and self._closed:
+            return None
+        return data
+
+    def close(self) -> None:
+        self._closed = True
+        self._ready.set()
+
+
+async def _receive_loop(ws: WebSocket, mailbox: FrameMailbox) -> None:
+    """Read frames as fast as the client sends them."""
+    try:
+        while True:
+            mailbox.put(await ws.receive_bytes())
     finally:
-        manager.disconnect(session_id)
+        mailbox.close()
+
+
+async def _process_loop(
+    mailbox: FrameMailbox,
+    pipeline: FacePipeline,
+    state: SessionState,
+    inflight: asyncio.Queue,
+    slots: asyncio.Semaphore,
+) -> None:
+    """Start the newest frame whenever a pipeline slot is free."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await slots.acquire()
+        data = await mailbox.get()
+        if data is None:
+            return
+        t0 = loop.time()
+        inflight.put_nowait((t0, await _start_frame(pipeline, data, state)))
+
+
+async def _send_loop(
+    ws: WebSocket,
+    mailbox: FrameMailbox,
+    inflight: asyncio.Queue,
+    slots: asyncio.Semaphore,
+    depth: int,
+) -> None:
+    """Send results in frame order, plus periodic fps hints."""
+    loop = asyncio.get_running_loop()
+    interval = settings.ws_control_interval
+    avg_service = 0.0           # EMA of seconds per frame
+    last_control = loop.time()
+
+    while True:
+        t0, task = await inflight.get()
+        try:
+            results = await task
+        finally:
+            slots.release()
+        elapsed = loop.time() - t0
+        avg_service = elapsed if avg_service == 0.0 else 0.9 * avg_service + 0.1 * elapsed
+
+        if results is not None:
+            await ws.send_json(results)
+            if _startup["first_frame_ms"] is None:
+                _startup["first_frame_ms"] = round(elapsed * 1000, 1)
+                logger.info("First frame served in %.1fms", elapsed * 1000)
+
+        if interval > 0 and loop.time() - last_control >= interval:
+            last_control = loop.time()
+            await ws.send_json(
+                {
+                    "type": "control",
+                    # `depth` frames overlap, so throughput ≈ depth / latency
+                    "max_fps": round(depth / avg_service, 1) if avg_service > 0 else None,
+                    "dropped": mailbox.dropped,
+                }
+            )
@@ -11,22 +11,19 @@ is detected (e.g., during unit tests with a blank image).
 from __future__ import annotations
 
 import logging
+import threading
+import time
 
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
-# Lazy-import MediaPipe so the rest of the project still imports cleanly
-# even when mediapipe is not installed (useful in CI / unit tests).
-try:
-    import mediapipe as mp
-
-    _mp_face_mesh = mp.solutions.face_mesh
-    _MEDIAPIPE_AVAILABLE = True
-except ImportError:
-    _mp_face_mesh = None
-    _MEDIAPIPE_AVAILABLE = False
-    logger.warning("mediapipe not installed — head_pose will return zeros")
+# MediaPipe is imported on first use, so importing this module stays cheap
+# and the rest of the project works when mediapipe is not installed (CI /
+# unit tests).  ``None`` until that first import has been attempted.
+_mp_face_mesh = None
+_MEDIAPIPE_AVAILABLE: bool | None = None
+_import_lock = threading.Lock()
 
 # ── Landmark indices (MediaPipe 468-point mesh) ─────────────────────────────
 # Chin, nose tip, left/right eye corners, left/right mouth corners
@@ -45,20 +42,54 @@ _MODEL_POINTS = np.array(
     dtype=np.float64,
 )
 
-_face_mesh_instance = None
+# FaceMesh graphs are not thread-safe; every worker thread gets its own
+_local = threading.local()
+
+_WARMUP_SIZE = 112
+
+
+def _mediapipe_available() -> bool:
+    """Import MediaPipe once; ``False`` if it is not installed."""
+    global _mp_face_mesh, _MEDIAPIPE_AVAILABLE
+    if _MEDIAPIPE_AVAILABLE is None:
+        with _import_lock:
+            if _MEDIAPIPE_AVAILABLE is None:
+                try:
+                    import mediapipe as mp
+
+                    _mp_face_mesh = mp.solutions.face_mesh
+                    _MEDIAPIPE_AVAILABLE = True
+                except ImportError:
+                    _MEDIAPIPE_AVAILABLE = False
+                    logger.warning("mediapipe not installed — head_pose will return zeros")
+    return _MEDIAPIPE_AVAILABLE
 
 
 def _get_face_mesh():
-    """Return (and lazily create) a shared FaceMesh instance."""
-    global _face_mesh_instance
-    if _face_mesh_instance is None and _MEDIAPIPE_AVAILABLE:
-        _face_mesh_instance = _mp_face_mesh.FaceMesh(
+    """Return (and lazily create) this thread's FaceMesh instance."""
+    mesh = getattr(_local, "face_mesh", None)
+    if mesh is None and _MEDIAPIPE_AVAILABLE:
+        mesh = _mp_face_mesh.FaceMesh(
             static_image_mode=True,
             max_num_faces=1,
             refine_landmarks=False,
             min_detection_confidence=0.5,
         )
-    return _face_mesh_instance
+        _local.face_mesh = mesh
+    return mesh
+
+
+def warm_up() -> float:
+    """Build this thread's FaceMesh and run it once on a blank crop.
+
+    Returns the time taken (s), so the first real face does not pay for
+    graph construction.  FaceMesh is per-thread, so this warms the calling
+    thread only: every other thread that runs :func:`estimate_pose` still
+    builds its own instance on its first face.
+    """
+    t0 = time.perf_counter()
+    estimate_pose(np.zeros((_WARMUP_SIZE, _WARMUP_SIZE, 3), dtype=np.uint8))
+    return time.perf_counter() - t0
 
 
 def estimate_pose(face_crop: np.ndarray) -> tuple[float, float, float]:
@@ -75,7 +106,7 @@ def estimate_pose(face_crop: np.ndarray) -> tuple[float, float, float]:
     """
     import cv2
 
-    if face_crop is None or face_crop.size == 0 or not _MEDIAPIPE_AVAILABLE:
+    if face_crop is None or face_crop.size == 0 or not _mediapipe_available():
         return 0.0, 0.0, 0.0
 
     h, w = face_crop.shape[:2]
@@ -0,0 +1 @@
+"""FacePass benchmark scripts (not collected by pytest)."""
@@ -0,0 +1,127 @@
+"""
+benchmarks/ann_recall.py
+-------------------------
+Recall@1 and latency of the gallery index backends against exact search.
+
+Builds each :class:`storage.vector_search.VectorIndex` kind over *N*
+synthetic identities (one embedding each) and queries it with noisy
+copies of enrolled identities — noise chosen so a probe has cosine
+similarity ``--similarity`` to its own identity, as a live ArcFace
+embedding has to its enrolment.  Recall@1 is the share of queries whose
+top-1 label equals the exact (``flat``) top-1.
+
+Identities are isotropic random unit vectors by default, the hardest
+case for any ANN index; ``--intrinsic-dim 64`` draws them from a 64-D
+subspace (plus a little full-rank noise), closer to how face embeddings
+actually spread.  Index parameters come from the usual settings, e.g.
+``GALLERY_HNSW_EF_SEARCH=256 python -m benchmarks.ann_recall``.
+
+Reported per size and backend: build time, recall@1, single-query p50 /
+p99 latency and per-query cost in a batch of ``--batch`` queries.  The
+1M-identity run needs ~6 GB of RAM (exact matrix + graph).
+
+Run from the ``FaceId`` directory::
+
+    python -m benchmarks.ann_recall
+    python -m benchmarks.ann_recall --sizes 10000,100000 --kinds flat,hnsw
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+
+import numpy as np
+
+from storage.vector_search import _EMBEDDING_DIM, FlatIndex, make_index
+
+
+def _unit_rows(n: int, rng: np.random.Generator, intrinsic_dim: int = 0) -> np.ndarray:
+    """*n* unit rows; from an *intrinsic_dim*-D subspace when it is non-zero."""
+    basis = None
+    if intrinsic_dim:
+        basis = np.linalg.qr(rng.standard_normal((_EMBEDDING_DIM, intrinsic_dim)))[0].T
+    rows = np.empty((n, _EMBEDDING_DIM), dtype=np.float32)
+    for start in range(0, n, 100_000):   # chunked to bound the float64 temporary
+        size = min(100_000, n - start)
+        if basis is None:
+            chunk = rng.standard_normal((size, _EMBEDDING_DIM))
+        else:
+            chunk = rng.standard_normal((size, intrinsic_dim)) @ basis
+            chunk /= np.linalg.norm(chunk, axis=1, keepdims=True)
+            chunk += 0.1 * rng.standard_normal((size, _EMBEDDING_DIM)) / np.sqrt(_EMBEDDING_DIM)
+        rows[start:start + size] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    return rows
+
+
+def _probes(gallery: np.ndarray, count: int, similarity: float, rng: np.random.Generator):
+    """*count* queries with cosine *similarity* to a random enrolled identity."""
+    targets = rng.integers(0, len(gallery), count)
+    noise = _unit_rows(count, rng)
+    noise -= np.sum(noise * gallery[targets], axis=1, keepdims=True) * gallery[targets]
+    noise /= np.linalg.norm(noise, axis=1, keepdims=True)
+    queries = similarity * gallery[targets] + np.sqrt(1 - similarity ** 2) * noise
+    return queries.astype(np.float32)
+
+
+def _latency(index, queries: np.ndarray, batch: int) -> tuple[float, float, float]:
+    """Single-query p50 / p99 and batched per-query cost, all in ms."""
+    single = []
+    for q in queries:
+        t0 = time.perf_counter()
+        index.search(q[None])
+        single.append((time.perf_counter() - t0) * 1000)
+    t0 = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        index.search(queries[start:start + batch])
+    per_query = (time.perf_counter() - t0) * 1000 / len(queries)
+    return float(np.percentile(single, 50)), float(np.percentile(single, 99)), per_query
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--kinds", default="flat,hnsw,ivf")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--similarity", type=float, default=0.6)
+    parser.add_argument("--intrinsic-dim", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>8} | {'index':>5} | {'build (s)':>9} | {'recall@1':>8} | "
+          f"{'p50 (ms)':>8} | {'p99 (ms)':>8} | {'batched (ms/q)':>14}")
+    print("-" * 80)
+    for n in (int(s) for s in args.sizes.split(",")):
+        vectors = _unit_rows(n, rng, args.intrinsic_dim)
+        labels = np.arange(1, n + 1, dtype=np.int64)
+        queries = _probes(vectors, args.queries, args.similarity, rng)
+
+        exact = FlatIndex()
+        exact.build(vectors, labels)
+        _, truth = exact.search(queries)
+        del exact
+
+        for kind in args.kinds.split(","):
+            try:
+                index = make_index(kind)
+            except ImportError as exc:
+                print(f"{n:>8} | {kind:>5} | skipped ({exc.name} not installed)")
+                continue
+            t0 = time.perf_counter()
+            index.build(vectors, labels)
+            t_build = time.perf_counter() - t0
+            _, found = index.search(queries)
+            recall = float(np.mean(found == truth))
+            p50, p99, batched = _latency(index, queries, args.batch)
+            print(f"{n:>8} | {kind:>5} | {t_build:>9.2f} | {recall:>8.4f} | "
+                  f"{p50:>8.3f} | {p99:>8.3f} | {batched:>14.4f}")
+            del index
+            gc.collect()
+        del vectors
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
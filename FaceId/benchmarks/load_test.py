@@ -0,0 +1,231 @@
+"""
+benchmarks/load_test.py
+------------------------
+Multi-client load test for the execution modes.
+
+Simulates *N* cameras, each keeping one frame in flight (as the ``/ws``
+mailbox does), and reports aggregate throughput and per-frame latency
+for ``execution_mode="direct"``, ``"batched"``, ``"staged"`` and
+``"process"``.
+
+By default the detector and recognizer are stubs that model an
+accelerator: calls are serialised on one device lock and cost
+``fixed + per_item × batch`` milliseconds, so the benefit of batching
+shows up without a GPU.  ``--cpu-bound`` makes the stubs burn CPU in
+Python instead (holding the GIL like the pipeline glue does), which is
+the case ``process`` mode is for.  The gallery is filled with synthetic
+embeddings so the search stage runs for real.  ``--real`` loads the
+actual YOLO / ArcFace models instead.
+
+Run from the ``FaceId`` directory::
+
+    python -m benchmarks.load_test --clients 16 --seconds 10
+    python -m benchmarks.load_test --cpu-bound --modes direct,process --workers 4
+    python -m benchmarks.load_test --clients 16 --real
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import cv2
+import numpy as np
+
+from ai.scheduler import InferenceScheduler
+from ai.staged import StagedExecutor
+from ai.workers import ProcessWorkerPool
+from storage.vector_search import gallery
+
+_DEVICE = threading.Lock()   # one accelerator, shared by every caller
+
+
+def _spend(seconds: float, cpu_bound: bool) -> None:
+    """Simulate model cost: hold the device lock, or spin holding the GIL."""
+    if cpu_bound:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            pass
+    else:
+        with _DEVICE:
+            time.sleep(seconds)
+
+
+class _StubDetector:
+    """Fixed boxes; cost = fixed + per_frame × batch size."""
+
+    def __init__(self, fixed_ms: float, per_frame_ms: float, faces: int, cpu_bound: bool) -> None:
+        self.fixed = fixed_ms / 1000
+        self.per_frame = per_frame_ms / 1000
+        self.cpu_bound = cpu_bound
+        self.boxes = [[40 + 120 * i, 60, 140 + 120 * i, 180] for i in range(faces)]
+
+    def detect(self, frame):
+        return self.detect_batch([frame])[0]
+
+    def detect_batch(self, frames):
+        _spend(self.fixed + self.per_frame * len(frames), self.cpu_bound)
+        return [list(self.boxes) for _ in frames]
+
+
+class _StubRecognizer:
+    """Random unit embeddings; cost = fixed + per_face × batch size."""
+
+    def __init__(self, fixed_ms: float, per_face_ms: float, cpu_bound: bool) -> None:
+        self.fixed = fixed_ms / 1000
+        self.per_face = per_face_ms / 1000
+        self.cpu_bound = cpu_bound
+        self.rng = np.random.default_rng(0)
+
+    def embed(self, crop, box=None):
+        return self.embed_batch([crop])[0]
+
+    def embed_batch(self, crops, boxes=None):
+        _spend(self.fixed + self.per_face * len(crops), self.cpu_bound)
+        vectors = self.rng.standard_normal((len(crops), 512)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def bench_pipeline(gallery_size: int, stubs: dict | None = None):
+    """FacePipeline over a synthetic gallery, with stub models unless *stubs* is None.
+
+    *stubs* holds ``faces``, ``detect_ms``, ``embed_ms`` and ``cpu_bound``.
+    Module-level (and bound with ``functools.partial``) so it also
+    serves as the worker factory in ``process`` mode.
+    """
+    import ai.pipeline
+
+    ai.pipeline.outbox = MagicMock()   # never POST from a benchmark
+    _load_synthetic_gallery(gallery_size)
+    if stubs is None:
+        return ai.pipeline.FacePipeline()
+    detector = _StubDetector(*stubs["detect_ms"], stubs["faces"], stubs["cpu_bound"])
+    recognizer = _StubRecognizer(*stubs["embed_ms"], stubs["cpu_bound"])
+    with (
+        patch("ai.models.create_detector", lambda version=None: detector),
+        patch("ai.recognizer.arcface.ArcFaceRecognizer", lambda version=None: recognizer),
+    ):
+        return ai.pipeline.FacePipeline()
+
+
+def _load_synthetic_gallery(size: int) -> None:
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((size, 512)).astype(np.float32)
+    gallery.load([
+        {"face_id": i, "student_id": i // 3, "embedding": v} for i, v in enumerate(vectors)
+    ])
+
+
+def _run_clients(submit, sessions, clients: int, seconds: float, payload) -> dict[str, float]:
+    """Closed loop: every client waits for its result before sending again."""
+    latencies: list[list[float]] = [[] for _ in range(clients)]
+    deadline = time.perf_counter() + seconds
+
+    def client(i: int) -> None:
+        state = sessions.open_session(f"load-{i}")
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            submit(payload, state)
+            latencies[i].append(time.perf_counter() - t0)
+        sessions.close_session(f"load-{i}")
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    flat = np.array([x for per in latencies for x in per]) * 1000
+    return {
+        "fps": len(flat) / elapsed,
+        "p50_ms": float(np.percentile(flat, 50)) if len(flat) else 0.0,
+        "p95_ms": float(np.percentile(flat, 95)) if len(flat) else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--modes", default="direct,batched,staged,process")
+    parser.add_argument("--faces", type=int, default=3, help="faces per frame")
+    parser.add_argument("--gallery", type=int, default=3000, help="synthetic gallery size")
+    parser.add_argument("--window-ms", type=float, default=8.0)
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=0, help="process mode; 0 = one per core")
+    parser.add_argument("--detect-fixed-ms", type=float, default=6.0)
+    parser.add_argument("--detect-per-frame-ms", type=float, default=1.0)
+    parser.add_argument("--embed-fixed-ms", type=float, default=3.0)
+    parser.add_argument("--embed-per-face-ms", type=float, default=0.5)
+    parser.add_argument("--cpu-bound", action="store_true", help="stubs spin on the CPU")
+    parser.add_argument("--real", action="store_true", help="load the real models")
+    args = parser.parse_args()
+    modes = args.modes.split(",")
+
+    # smooth synthetic scene, so the JPEG has a camera-like size (pure noise would not)
+    noise = np.random.default_rng(2).integers(0, 255, (45, 80, 3), dtype=np.uint8)
+    frame = cv2.resize(noise, (1280, 720), interpolation=cv2.INTER_CUBIC)
+    jpeg = cv2.imencode(".jpg", frame)[1].tobytes()
+    stubs = None if args.real else {
+        "faces": args.faces,
+        "detect_ms": (args.detect_fixed_ms, args.detect_per_frame_ms),
+        "embed_ms": (args.embed_fixed_ms, args.embed_per_face_ms),
+        "cpu_bound": args.cpu_bound,
+    }
+    factory = functools.partial(bench_pipeline, args.gallery, stubs)
+    pipeline = factory() if set(modes) - {"process"} else None
+
+    results: dict[str, dict[str, float]] = {}
+    notes: list[str] = []
+    run = functools.partial(_run_clients, clients=args.clients, seconds=args.seconds)
+
+    if "direct" in modes:
+        executor = ThreadPoolExecutor(thread_name_prefix="pipeline")
+        results["direct"] = run(
+            lambda f, s: executor.submit(pipeline.process, f, s).result(), pipeline, payload=frame
+        )
+        executor.shutdown()
+
+    if "batched" in modes:
+        scheduler = InferenceScheduler(pipeline, window_ms=args.window_ms, max_batch=args.max_batch)
+        scheduler.start()
+        results["batched"] = run(scheduler.process, pipeline, payload=frame)
+        stats = scheduler.stats()
+        scheduler.stop()
+        notes.append(f"batched: avg batch {stats['avg_batch']}, avg queue wait {stats['avg_wait_ms']} ms")
+
+    if "staged" in modes:
+        staged = StagedExecutor(pipeline)
+        staged.start()
+        results["staged"] = run(staged.process, pipeline, payload=frame)
+        stage_stats = staged.stats()["stages"]
+        staged.stop()
+        notes.append("staged busy ms/frame: " + ", ".join(
+            f"{name}={s['avg_ms']}" for name, s in stage_stats.items()
+        ))
+
+    if "process" in modes:
+        pool = ProcessWorkerPool(workers=args.workers or None, factory=factory)
+        pool.start()
+        results["process"] = run(pool.process, pool, payload=jpeg)
+        notes.append(f"process: {pool.n_workers} workers (decode included)")
+        pool.stop()
+
+    print(f"{args.clients} clients, {args.faces} faces/frame, gallery={args.gallery}"
+          f"{' (real models)' if args.real else ' (cpu-bound stubs)' if args.cpu_bound else ''}")
+    print(f"{'mode':>8} | {'fps':>8} | {'p50 (ms)':>9} | {'p95 (ms)':>9}")
+    print("-" * 44)
+    for name, r in results.items():
+        print(f"{name:>8} | {r['fps']:>8.1f} | {r['p50_ms']:>9.1f} | {r['p95_ms']:>9.1f}")
+    for note in notes:
+        print(note)
+
+
+if __name__ == "__main__":
+    main()
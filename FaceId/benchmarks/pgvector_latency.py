@@ -0,0 +1,108 @@
+"""
+benchmarks/pgvector_latency.py
+-------------------------------
+Nearest-neighbour query latency in PostgreSQL with and without the
+pgvector index, as the table grows.
+
+Fills a scratch table (``face_embedding_bench``, same shape as
+``face_embedding``) with synthetic unit vectors, and at every size
+times the service's top-1 cosine query with a sequential scan and with
+the configured index (``PGVECTOR_INDEX``, built with the parameters of
+:func:`storage.database.index_params`, searched with the
+``hnsw.ef_search`` / ``ivfflat.probes`` set on every connection).
+Recall@1 of the indexed query is measured against the sequential one.
+The scratch table is dropped afterwards; ``face_embedding`` is never
+touched.
+
+Needs a reachable ``DATABASE_URL`` with the ``vector`` extension.  Run
+from the ``FaceId`` directory::
+
+    python -m benchmarks.pgvector_latency
+    python -m benchmarks.pgvector_latency --sizes 10000,100000 --queries 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from configs.settings import settings
+from storage.database import get_engine, index_params
+
+_TABLE = "face_embedding_bench"
+_QUERY = text(
+    f"SELECT face_id FROM {_TABLE} ORDER BY embedding <=> CAST(:v AS vector) LIMIT 1"
+)
+
+
+def _literal(row: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in row) + "]"
+
+
+def _unit_rows(n: int, rng: np.random.Generator) -> np.ndarray:
+    rows = rng.standard_normal((n, 512)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def _time_queries(conn, queries: np.ndarray, seqscan: bool) -> tuple[list[int], float]:
+    conn.execute(text(f"SET enable_indexscan = {'off' if seqscan else 'on'}"))
+    found, t0 = [], time.perf_counter()
+    for q in queries:
+        found.append(conn.execute(_QUERY, {"v": _literal(q)}).scalar_one())
+    return found, (time.perf_counter() - t0) * 1000 / len(queries)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    kind = settings.pgvector_index if settings.pgvector_index != "none" else "hnsw"
+    rng = np.random.default_rng(0)
+    engine = get_engine()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {_TABLE}"))
+        conn.execute(text(
+            f"CREATE TABLE {_TABLE} (face_id serial PRIMARY KEY, embedding vector(512))"
+        ))
+        print(f"{'rows':>8} | {'seq scan (ms)':>13} | {kind + ' (ms)':>10} | "
+              f"{'build (s)':>9} | {'recall@1':>8}")
+        print("-" * 62)
+        try:
+            rows = 0
+            for size in (int(s) for s in args.sizes.split(",")):
+                conn.execute(text(f"DROP INDEX IF EXISTS {_TABLE}_idx"))
+                for start in range(rows, size, 5000):
+                    batch = _unit_rows(min(5000, size - start), rng)
+                    conn.execute(
+                        text(f"INSERT INTO {_TABLE} (embedding) "
+                             "SELECT CAST(v AS vector) FROM unnest(CAST(:vs AS text[])) AS v"),
+                        {"vs": [_literal(r) for r in batch]},
+                    )
+                rows = size
+                conn.execute(text(f"ANALYZE {_TABLE}"))
+
+                queries = _unit_rows(args.queries, rng)
+                exact, t_seq = _time_queries(conn, queries, seqscan=True)
+                params = ", ".join(f"{k} = {v}" for k, v in index_params(kind, size).items())
+                t0 = time.perf_counter()
+                conn.execute(text(
+                    f"CREATE INDEX {_TABLE}_idx ON {_TABLE} "
+                    f"USING {kind} (embedding vector_cosine_ops) WITH ({params})"
+                ))
+                t_build = time.perf_counter() - t0
+                approx, t_idx = _time_queries(conn, queries, seqscan=False)
+                recall = float(np.mean(np.asarray(exact) == np.asarray(approx)))
+                print(f"{size:>8} | {t_seq:>13.2f} | {t_idx:>10.2f} | "
+                      f"{t_build:>9.1f} | {recall:>8.3f}")
+        finally:
+            conn.execute(text(f"DROP TABLE IF EXISTS {_TABLE}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,45 +6,134 @@ FacePass AiService — FastAPI application entry point.
 Endpoints
 ~~~~~~~~~
   GET  /health                      — liveness probe
+  GET  /ready                       — readiness probe (models warmed up)
   GET  /info                        — service metadata
+  GET  /metrics                     — runtime counters (queues, latencies)
   POST /enroll/{student_id}         — save a new face embedding
   GET  /students/{student_id}/embeddings — list stored embeddings
   DEL  /students/{student_id}       — delete all embeddings for a student
+  GET  /admin/models                — active and registered model versions
+  POST /admin/models/{version}      — hot-swap the running models
   WS   /ws                          — real-time face analysis stream
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from typing import Any
 
 import numpy as np
-from fastapi import FastAPI, HTTPException, WebSocket
+from fastapi import FastAPI, HTTPException, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.websocket import init_pipeline, manager, ws_handler
+from ai.model_registry import registry
+from app.websocket import (
+    active_model_version,
+    execution_metrics,
+    manager,
+    pipeline_ready,
+    preload_pipeline,
+    recognition_metrics,
+    running_pipeline,
+    shutdown_pipeline,
+    startup_error,
+    startup_metrics,
+    ws_handler,
+)
 from configs.logging_config import setup_logging
 from configs.settings import settings
-from storage.database import check_db_connection
+from storage.attendance_outbox import outbox
+from storage.database import check_db_connection, init_schema
 from storage.repositories import EmbeddingRepository
-from storage.vector_search import cosine_search
+from storage.vector_search import (
+    check_vector_index,
+    cosine_search,
+    gallery,
+    load_gallery,
+    save_gallery,
+    sync_gallery,
+)
 
 # Set up logging before anything else
 setup_logging()
 logger = logging.getLogger(__name__)
 
 
+# Background startup work; /ready stays 503 until it has finished
+_gallery_load: asyncio.Future | None = None
+
+
+def _bootstrap_storage() -> None:
+    """Create the schema (if enabled) and fill the in-memory gallery."""
+    if settings.db_init_schema:
+        try:
+            init_schema()
+        except Exception:
+            logger.warning("Schema bootstrap failed", exc_info=True)
+    check_vector_index()
+    load_gallery()
+
+
+def _gallery_error() -> str | None:
+    """Why the startup gallery load failed, or ``None``.
+
+    ``load_gallery`` logs and swallows its own errors, so a finished load
+    is checked against the gallery itself; a later successful
+    ``/reload-embeddings`` clears the error.
+    """
+    if _gallery_load is None or not _gallery_load.done() or gallery.loaded:
+        return None
+    exc = _gallery_load.exception()
+    if exc is not None:
+        return f"{type(exc).__name__}: {exc}"
+    return "gallery load failed (see logs); POST /reload-embeddings retries it"
+
+
+async def _follow_gallery() -> None:
+    """Pick up enrolments and deletions made through other workers.
+
+    Every ``GALLERY_SYNC_S`` the gallery's fingerprint is checked against
+    the database; after a rebuild the pipeline state is reset as after a
+    local enrol, so locks on deleted students drop.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(settings.gallery_sync_s)
+        if not await loop.run_in_executor(None, sync_gallery):
+            continue
+        pipeline = running_pipeline()
+        if pipeline is not None:
+            pipeline.reload_state()
+
+
 # ── Lifespan ─────────────────────────────────────────────────────────────────
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Startup / shutdown lifecycle manager."""
+    """Startup / shutdown lifecycle manager.
+
+    The gallery and the models load concurrently in the background, so
+    the server answers ``/health`` immediately and ``/ready`` flips once
+    both are done and the models are warmed up.
+    """
+    global _gallery_load
     logger.info("FacePass AiService starting up …")
-    init_pipeline()           # load YOLO + ArcFace models eagerly
-    logger.info("Startup complete — %d WebSocket connections active", manager.active_count)
+    _gallery_load = asyncio.get_running_loop().run_in_executor(None, _bootstrap_storage)
+    preload_pipeline()        # load + warm up YOLO, ArcFace and FaceMesh
+    outbox.start()            # background attendance delivery
+    follower = None
+    if settings.gallery_sync_s > 0 and settings.search_backend == "memory":
+        follower = asyncio.create_task(_follow_gallery())
+    logger.info("Accepting requests — models loading in the background")
     yield
     logger.info("FacePass AiService shutting down")
+    if follower is not None:
+        follower.cancel()
+    shutdown_pipeline()
+    outbox.stop()
+    save_gallery()            # keep enrols / deletes for the next start
 
 
 # ── App ───────────────────────────────────────────────────────────────────────
@@ -68,26 +157,68 @@ app.add_middleware(
 
 @app.get("/health", summary="Liveness probe")
 async def health() -> dict[str, Any]:
-    """Return service health status including database connectivity."""
+    """Return service health status including database connectivity and model load."""
     db_ok = check_db_connection()
+    error = startup_error()
+    if error is not None:
+        models = "failed"
+    else:
+        models = "ready" if pipeline_ready() else "loading"
+    gallery_error = _gallery_error()
+    if gallery_error is not None:
+        gallery_status = "failed"
+    else:
+        gallery_status = "loaded" if gallery.loaded else "loading"
     return {
-        "status": "ok" if db_ok else "degraded",
+        "status": "ok" if db_ok and error is None and gallery_error is None else "degraded",
         "db": "connected" if db_ok else "unreachable",
+        "models": models,
+        "gallery": gallery_status,
+        "startup_error": error or gallery_error,
         "active_streams": manager.active_count,
     }
 
 
+@app.get("/ready", summary="Readiness probe")
+async def ready(response: Response) -> dict[str, Any]:
+    """Return 200 once the gallery is loaded and the models are warmed up, else 503.
+
+    A failed model or gallery load stays 503 and is reported under ``error``.
+    """
+    storage_done = _gallery_load is not None and _gallery_load.done()
+    is_ready = pipeline_ready() and storage_done and gallery.loaded
+    if not is_ready:
+        response.status_code = 503
+    body = {**startup_metrics(), "ready": is_ready}
+    body["error"] = body.get("error") or _gallery_error()
+    return body
+
+
 @app.get("/info", summary="Service metadata")
 async def info() -> dict[str, str]:
     """Return service version and configuration summary."""
     return {
         "service": "FacePass AiService",
         "version": "1.0.0",
-        "model_version": settings.model_version,
+        "model_version": active_model_version(),
         "device": settings.device,
     }
 
 
+@app.get("/metrics", summary="Runtime metrics")
+async def metrics() -> dict[str, Any]:
+    """Return queue depths, counters and latencies of background workers."""
+    # asks every worker process in "process" mode — keep it off the event loop
+    recognition = await asyncio.get_running_loop().run_in_executor(None, recognition_metrics)
+    return {
+        "active_streams": manager.active_count,
+        "execution": execution_metrics(),
+        "startup": startup_metrics(),
+        "recognition": recognition,
+        "attendance_outbox": outbox.stats(),
+    }
+
+
 @app.post("/enroll/{student_id}", summary="Enrol a student face embedding")
 async def enroll(student_id: int, embedding: list[float]) -> dict[str, Any]:
 
@@ -95,23 +226,22 @@ async def enroll(student_id: int, embedding: list[float]) -> dict[str, Any]:
         raise HTTPException(status_code=422, detail="Embedding must have exactly 512 elements")
 
     try:
-        saved_id = EmbeddingRepository.save(
-            student_id,
-            np.array(embedding, dtype=np.float32)
-        )
+        vector = np.array(embedding, dtype=np.float32)
+        saved_id = EmbeddingRepository.save(student_id, vector)
+        gallery.add(saved_id, student_id, vector)
 
-        # 🔥 Automatically reload pipeline state
-        from app.websocket import get_pipeline
-        pipeline = get_pipeline()
-        pipeline.reload_state()
-
-        logger.info("Embedding saved and pipeline reloaded automatically")
+        # 🔥 Automatically reload pipeline state (a pipeline still loading
+        # starts fresh anyway — never wait for it on the event loop)
+        pipeline = running_pipeline()
+        if pipeline is not None:
+            pipeline.reload_state()
+            logger.info("Embedding saved and pipeline reloaded automatically")
 
         return {
             "status": "saved",
             "id": saved_id,
             "student_id": student_id,
-            "pipeline_reloaded": True
+            "pipeline_reloaded": pipeline is not None
         }
 
     except Exception as exc:
@@ -176,9 +306,45 @@ async def list_embeddings(student_id: int):
 
 @app.delete("/students/{student_id}", summary="Delete all embeddings for a student")
 async def delete_student(student_id: int) -> dict[str, Any]:
-    """Remove all face embeddings for *student_id* from the database."""
+    """Remove all face embeddings for *student_id* from the database.
+
+    Pipeline state is reset too, so tracks locked to the student and
+    cached matches stop naming them right away.
+    """
     count = EmbeddingRepository.delete_by_student(student_id)
-    return {"student_id": student_id, "deleted": count}
+    gallery.remove_student(student_id)
+    pipeline = running_pipeline()
+    if pipeline is not None:
+        pipeline.reload_state()
+    return {"student_id": student_id, "deleted": count, "pipeline_reloaded": pipeline is not None}
+
+
+# ── Model administration ──────────────────────────────────────────────────────
+
+@app.get("/admin/models", summary="Active and registered model versions")
+async def list_models() -> dict[str, Any]:
+    """Return the version serving frames and every version in the registry."""
+    registry.reload()
+    return {"active": active_model_version(), "available": registry.versions("yolo_face")}
+
+
+@app.post("/admin/models/{version}", summary="Hot-swap the running models")
+async def swap_models(version: str) -> dict[str, Any]:
+    """Load *version*, warm it up and switch the live pipeline to it.
+
+    Streams keep running on the current models until the switch; frames
+    already in flight finish on the old ones.
+    """
+    pipeline = running_pipeline()
+    if pipeline is None:
+        raise HTTPException(status_code=503, detail="models warming up")
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, pipeline.swap_models, version)
+    except (KeyError, FileNotFoundError) as exc:
+        raise HTTPException(status_code=404, detail=exc.args[0]) from exc
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
 
 
 # ── WebSocket ─────────────────────────────────────────────────────────────────
@@ -191,11 +357,12 @@ async def ws(ws: WebSocket) -> None:
 @app.post("/reload-embeddings")
 async def reload_embeddings():
     """
-    Reset pipeline runtime state without restarting server.
+    Reload the in-memory gallery from the database and reset pipeline
+    runtime state without restarting server.
     """
-    from app.websocket import get_pipeline
-
-    pipeline = get_pipeline()
-    pipeline.reload_state()
+    await asyncio.get_running_loop().run_in_executor(None, load_gallery, True)
+    pipeline = running_pipeline()
+    if pipeline is not None:
+        pipeline.reload_state()
 
-    return {"status": "pipeline reset"}
\ No newline at end of file
+    return {"status": "pipeline reset", "gallery_size": len(gallery)}
\ No newline at end of file
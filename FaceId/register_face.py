@@ -4,7 +4,7 @@ from sqlalchemy import text
 from storage.database import SessionLocal
 from ai.recognizer.arcface import ArcFaceRecognizer
 
-recognizer = ArcFaceRecognizer()
+recognizer = ArcFaceRecognizer(mode="full")  # whole frames need the detector
 
 student_id = 2   # 🔥 PUT YOUR REAL STUDENT ID HERE
 
@@ -0,0 +1,315 @@
+"""
+storage/attendance_outbox.py
+-----------------------------
+Background delivery of attendance events to the Spring backend.
+
+The pipeline must never wait on HTTP: :meth:`AttendanceOutbox.enqueue`
+only appends to an in-memory queue and returns.  A daemon worker thread
+drains the queue over a pooled ``requests.Session`` with per-request
+timeouts and exponential-backoff retries.
+
+Duplicate student IDs are coalesced — if a student is already waiting
+for delivery, further enqueues for them are dropped — so ten cameras
+recognising the same student produce one POST; every caller's
+``on_delivered`` callback still runs.  A student whose delivery failed
+is not queued again for ``ATTENDANCE_RETRY_AFTER_S``, so re-sightings on
+later frames cannot bypass the backoff.  Across workers, the
+delivery worker first claims the student in the shared cache backend
+(:mod:`storage.cache_backend`); only the worker that wins the claim
+POSTs, and the claim holds for ``ATTENDANCE_DEDUP_S``.
+
+Metrics (queue depth, delivered / failed counts, delivery latency) are
+available from :meth:`AttendanceOutbox.stats` and exposed on ``/metrics``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from configs.settings import settings
+
+if TYPE_CHECKING:
+    from storage.cache_backend import CacheBackend
+
+logger = logging.getLogger(__name__)
+
+# Spring answers 409 when attendance was already marked — that is success too
+_DONE_STATUSES = {200, 201, 204, 409}
+
+
+@dataclass
+class AttendanceEvent:
+    """One pending attendance report."""
+
+    student_id: int
+    session_id: str
+    timestamp: float   # time.time() at enqueue
+    on_delivered: list[Callable[[int], None]] = field(default_factory=list)
+
+
+class AttendanceOutbox:
+    """Non-blocking, coalescing attendance reporter.
+
+    Args:
+        url_template: URL with a ``{student_id}`` placeholder.
+                      Defaults to ``settings.attendance_url``.
+        timeout:      Per-request timeout in seconds.
+        max_retries:  Retries after the first failed attempt.
+        backoff:      Base delay in seconds; doubles on every retry.
+        max_queue:    Events beyond this many pending are dropped.
+        dedup_s:      Seconds a delivered student is claimed across
+                      workers; ``0`` disables the shared claim.
+        retry_after:  Seconds a student whose delivery failed is refused
+                      by :meth:`enqueue`; ``0`` = retry on the next sighting.
+        backend:      Shared cache backend; defaults to the process-wide one.
+    """
+
+    def __init__(
+        self,
+        url_template: str | None = None,
+        timeout: float | None = None,
+        max_retries: int | None = None,
+        backoff: float | None = None,
+        max_queue: int | None = None,
+        dedup_s: float | None = None,
+        retry_after: float | None = None,
+        backend: CacheBackend | None = None,
+    ) -> None:
+        self.url_template = url_template or settings.attendance_url
+        self.timeout = settings.attendance_timeout if timeout is None else timeout
+        self.max_retries = settings.attendance_max_retries if max_retries is None else max_retries
+        self.backoff = settings.attendance_backoff if backoff is None else backoff
+        self.max_queue = settings.attendance_queue_size if max_queue is None else max_queue
+        self.dedup_s = settings.attendance_dedup_s if dedup_s is None else dedup_s
+        self.retry_after = (
+            settings.attendance_retry_after_s if retry_after is None else retry_after
+        )
+        self._backend = backend
+
+        self._pending: OrderedDict[int, AttendanceEvent] = OrderedDict()
+        self._retry_at: dict[int, float] = {}   # student_id → monotonic time
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._http: requests.Session | None = None
+
+        self._delivered = 0
+        self._failed = 0
+        self._coalesced = 0
+        self._shared_coalesced = 0
+        self._dropped = 0
+        self._deferred = 0
+        self._latency_total = 0.0
+        self._latency_last = 0.0
+
+    # ── Lifecycle ────────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        """Start the delivery worker (idempotent)."""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._http = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            self._http.mount("http://", adapter)
+            self._http.mount("https://", adapter)
+            self._thread = threading.Thread(
+                target=self._run, name="attendance-outbox", daemon=True
+            )
+            self._thread.start()
+        logger.info("Attendance outbox started → %s", self.url_template)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the worker, waiting up to *timeout* seconds for it to exit."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+    # ── Producer API ─────────────────────────────────────────────────────────
+
+    def enqueue(
+        self,
+        student_id: int,
+        session_id: str = "",
+        timestamp: float | None = None,
+        on_delivered: Callable[[int], None] | None = None,
+    ) -> bool:
+        """Queue *student_id* for delivery without blocking.
+
+        Args:
+            student_id:   Student to report as present.
+            session_id:   Originating stream (for logs).
+            timestamp:    Event time; defaults to now.
+            on_delivered: Called from the worker thread with *student_id*
+                          once Spring has accepted the event — also when
+                          this call is coalesced with a pending one.
+
+        Returns:
+            ``True`` if a new event was queued, ``False`` if it was
+            coalesced with a pending one, the student is cooling down after
+            a failed delivery, or the queue is full.
+        """
+        callbacks = [on_delivered] if on_delivered is not None else []
+        event = AttendanceEvent(student_id, session_id, timestamp or time.time(), callbacks)
+        with self._cond:
+            pending = self._pending.get(student_id)
+            if pending is not None:
+                if on_delivered is not None and on_delivered not in pending.on_delivered:
+                    pending.on_delivered.append(on_delivered)
+                self._coalesced += 1
+                return False
+            retry_at = self._retry_at.get(student_id)
+            if retry_at is not None:
+                if time.monotonic() < retry_at:
+                    self._deferred += 1
+                    return False
+                del self._retry_at[student_id]
+            if len(self._pending) >= self.max_queue:
+                self._dropped += 1
+                logger.warning("Attendance outbox full — dropping student %s", student_id)
+                return False
+            self._pending[student_id] = event
+            self._cond.notify()
+        if self._thread is None:
+            self.start()
+        return True
+
+    def stats(self) -> dict[str, float]:
+        """Snapshot of queue depth, delivery counters and latency (ms)."""
+        with self._cond:
+            delivered = self._delivered
+            return {
+                "queue_depth": len(self._pending),
+                "delivered": delivered,
+                "failed": self._failed,
+                "coalesced": self._coalesced,
+                "shared_coalesced": self._shared_coalesced,
+                "dropped": self._dropped,
+                "retry_deferred": self._deferred,
+                "last_latency_ms": round(self._latency_last * 1000, 2),
+                "avg_latency_ms": round(self._latency_total / delivered * 1000, 2) if delivered else 0.0,
+            }
+
+    # ── Worker ───────────────────────────────────────────────────────────────
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                while not self._pending and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    return
+                event = next(iter(self._pending.values()))
+
+            if not self._claim(event.student_id):
+                # another worker has reported (or is reporting) this student
+                with self._cond:
+                    self._pending.pop(event.student_id, None)
+                    self._shared_coalesced += 1
+                    callbacks = list(event.on_delivered)
+                for callback in callbacks:
+                    callback(event.student_id)
+                continue
+
+            ok = self._deliver(event)
+            if not ok:
+                self._release(event.student_id)
+            with self._cond:
+                self._pending.pop(event.student_id, None)
+                callbacks = list(event.on_delivered)
+                if ok:
+                    latency = time.time() - event.timestamp
+                    self._delivered += 1
+                    self._latency_last = latency
+                    self._latency_total += latency
+                else:
+                    self._failed += 1
+                    self._cool_down(event.student_id)
+            if ok:
+                for callback in callbacks:
+                    callback(event.student_id)
+
+    @property
+    def backend(self) -> CacheBackend:
+        if self._backend is None:
+            from storage.cache_backend import get_backend
+
+            self._backend = get_backend()
+        return self._backend
+
+    def _claim(self, student_id: int) -> bool:
+        """Claim *student_id* across workers; ``False`` if another worker has it."""
+        if self.dedup_s <= 0:
+            return True
+        return self.backend.add(f"attendance:{student_id}", b"1", self.dedup_s)
+
+    def _release(self, student_id: int) -> None:
+        """Give the claim back after a failed delivery so another sighting can retry."""
+        if self.dedup_s > 0:
+            self.backend.delete(f"attendance:{student_id}")
+
+    def _cool_down(self, student_id: int) -> None:
+        """Refuse *student_id* for ``retry_after`` seconds (lock held)."""
+        if self.retry_after <= 0:
+            return
+        now = time.monotonic()
+        if len(self._retry_at) >= self.max_queue:
+            self._retry_at = {s: t for s, t in self._retry_at.items() if t > now}
+        self._retry_at[student_id] = now + self.retry_after
+
+    def _deliver(self, event: AttendanceEvent) -> bool:
+        """POST one event, retrying with exponential backoff."""
+        url = self.url_template.format(student_id=event.student_id)
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                if self._stop.wait(self.backoff * 2 ** (attempt - 1)):
+                    return False
+            try:
+                response = self._http.post(url, timeout=self.timeout)
+            except requests.RequestException as exc:
+                logger.warning(
+                    "Attendance POST for student %s failed (attempt %d): %s",
+                    event.student_id, attempt + 1, exc,
+                )
+                continue
+
+            if response.status_code in _DONE_STATUSES:
+                logger.info(
+                    "Attendance marked for student %s (session=%s, status=%d)",
+                    event.student_id, event.session_id, response.status_code,
+                )
+                return True
+            if response.status_code < 500:
+                # Client errors (unknown student, no active session) won't fix themselves
+                logger.warning(
+                    "Spring rejected attendance for student %s: %d - %s",
+                    event.student_id, response.status_code, response.text,
+                )
+                return False
+            logger.warning(
+                "Spring response %d for student %s (attempt %d)",
+                response.status_code, event.student_id, attempt + 1,
+            )
+
+        logger.error("Giving up on attendance for student %s", event.student_id)
+        return False
+
+
+# Module-level singleton — started in the FastAPI lifespan
+outbox = AttendanceOutbox()
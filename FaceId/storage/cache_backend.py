@@ -0,0 +1,234 @@
+"""
+storage/cache_backend.py
+------------------------
+Key/value backends for state shared between workers.
+
+Several uvicorn workers (or ``process``-mode workers) each run their own
+pipeline; anything one of them learns — "this face is student 42",
+"student 42's attendance is already being reported" — is invisible to
+the others unless it goes through a shared store.  Two backends
+implement the same small interface:
+
+  - :class:`MemoryBackend` – in-process dict with TTLs; the default, and
+    enough for a single worker.
+  - :class:`RedisBackend`  – any Redis-protocol server
+    (``settings.redis_url``), shared by every worker that points at it.
+
+Values are raw ``bytes``; callers serialise with ``struct`` / NumPy
+(float32 little-endian), never pickle, so the data stays portable and
+safe to read from a shared server.
+
+A Redis outage never breaks a frame: every ``RedisBackend`` call logs
+and degrades to the answer of an empty cache.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any
+
+from configs.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "facepass:"
+
+
+class CacheBackend:
+    """Interface of a shared key/value store (bytes values, TTLs in seconds)."""
+
+    name = "base"
+
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        """Set *key* only if absent; ``True`` if this call created it."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def hset(self, name: str, field: str, value: bytes) -> None:
+        """Store *field* in hash *name* (the hash lives ``shared_cache_ttl_s``)."""
+        raise NotImplementedError
+
+    def hgetall(self, name: str) -> dict[str, bytes]:
+        raise NotImplementedError
+
+    def hdel(self, name: str, *fields: str) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict[str, Any]:
+        return {"backend": self.name}
+
+
+class MemoryBackend(CacheBackend):
+    """Thread-safe in-process backend (shared by the threads of one worker).
+
+    Args:
+        max_keys: Plain keys kept at most; the oldest are dropped beyond it.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self._lock = threading.Lock()
+        self._values: dict[str, tuple[bytes, float]] = {}   # key → (value, expires_at)
+        self._hashes: dict[str, dict[str, bytes]] = {}
+        self._max_keys = max_keys
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._put(key, value, ttl)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+            self._hashes.pop(key, None)
+
+    def hset(self, name: str, field: str, value: bytes) -> None:
+        with self._lock:
+            self._hashes.setdefault(name, {})[field] = value
+
+    def hgetall(self, name: str) -> dict[str, bytes]:
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def hdel(self, name: str, *fields: str) -> None:
+        with self._lock:
+            table = self._hashes.get(name, {})
+            for field in fields:
+                table.pop(field, None)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {"backend": self.name, "keys": len(self._values)}
+
+    # ── Helpers (lock held) ──────────────────────────────────────────────────
+
+    def _live(self, key: str) -> bytes | None:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at and time.monotonic() >= expires_at:
+            del self._values[key]
+            return None
+        return value
+
+    def _put(self, key: str, value: bytes, ttl: float) -> None:
+        self._values.pop(key, None)
+        self._values[key] = (value, time.monotonic() + ttl if ttl > 0 else 0.0)
+        while len(self._values) > self._max_keys:
+            del self._values[next(iter(self._values))]
+
+
+class RedisBackend(CacheBackend):
+    """Backend on a Redis-protocol server, shared by every worker using it.
+
+    Args:
+        url:    ``redis://`` URL; defaults to ``settings.redis_url``.
+        client: Ready client with the redis-py API (tests pass a fake).
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str | None = None, client: Any = None) -> None:
+        import redis  # only needed when a Redis URL is configured
+
+        # server errors, plus socket errors some clients let through
+        self._failures = (redis.RedisError, OSError)
+        if client is None:
+            client = redis.Redis.from_url(
+                url or settings.redis_url,
+                socket_timeout=settings.redis_timeout,
+                socket_connect_timeout=settings.redis_timeout,
+            )
+        self._redis = client
+        self._errors = 0
+
+    def get(self, key: str) -> bytes | None:
+        return self._call("GET", None, self._redis.get, _KEY_PREFIX + key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._call("SET", None, self._redis.set, _KEY_PREFIX + key, value, px=_ms(ttl))
+
+    def add(self, key: str, value: bytes, ttl: float) -> bool:
+        # on an outage, let the caller proceed rather than suppress work
+        created = self._call(
+            "SET NX", True, self._redis.set, _KEY_PREFIX + key, value, px=_ms(ttl), nx=True
+        )
+        return bool(created)
+
+    def delete(self, key: str) -> None:
+        self._call("DEL", None, self._redis.delete, _KEY_PREFIX + key)
+
+    def hset(self, name: str, field: str, value: bytes) -> None:
+        key = _KEY_PREFIX + name
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.hset(key, field, value)
+        pipe.pexpire(key, _ms(settings.shared_cache_ttl_s))
+        self._call("HSET", None, pipe.execute)
+
+    def hgetall(self, name: str) -> dict[str, bytes]:
+        raw = self._call("HGETALL", {}, self._redis.hgetall, _KEY_PREFIX + name)
+        return {k.decode() if isinstance(k, bytes) else k: v for k, v in raw.items()}
+
+    def hdel(self, name: str, *fields: str) -> None:
+        if fields:
+            self._call("HDEL", None, self._redis.hdel, _KEY_PREFIX + name, *fields)
+
+    def stats(self) -> dict[str, Any]:
+        return {"backend": self.name, "errors": self._errors}
+
+    def _call(self, command: str, default: Any, fn, *args, **kwargs) -> Any:
+        try:
+            return fn(*args, **kwargs)
+        except self._failures as exc:
+            self._errors += 1
+            logger.warning("Redis %s failed: %s", command, exc)
+            return default
+
+
+def _ms(seconds: float) -> int | None:
+    return max(1, int(seconds * 1000)) if seconds > 0 else None
+
+
+def create_backend(url: str | None = None) -> CacheBackend:
+    """Redis backend when a URL is configured, otherwise in-process."""
+    url = settings.redis_url if url is None else url
+    if url:
+        logger.info("Shared cache: Redis at %s", url.split("@")[-1])
+        return RedisBackend(url)
+    return MemoryBackend()
+
+
+_backend: CacheBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> CacheBackend:
+    """Process-wide backend, created on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
@@ -6,6 +6,18 @@ SQLAlchemy engine and session management for FacePass.
 Connection parameters are read from ``settings.database_url`` so they
 can be overridden via environment variables without touching code.
 
+Importing this module has no side effects: the engine is created on
+first use (:func:`get_engine`), and the schema is only created by an
+explicit :func:`init_schema` call — at service startup when
+``settings.db_init_schema`` is set, or with::
+
+    python -m storage.database
+
+On PostgreSQL the schema bootstrap also creates the pgvector extension
+and an approximate-nearest-neighbour index on ``face_embedding.embedding``
+(:func:`ensure_vector_index`), and every pooled connection gets the
+index's search breadth (``hnsw.ef_search`` / ``ivfflat.probes``).
+
 Usage in FastAPI route handlers — use ``get_db`` as a dependency::
 
     from storage.database import get_db
@@ -18,10 +30,15 @@ Usage in FastAPI route handlers — use ``get_db`` as a dependency::
 from __future__ import annotations
 
 import logging
+import math
+import re
+import threading
+import time
 from contextlib import contextmanager
 from typing import Generator
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
 from configs.settings import settings
@@ -29,18 +46,183 @@ from configs.settings import settings
 logger = logging.getLogger(__name__)
 
 # ── Engine ────────────────────────────────────────────────────────────────────
-engine = create_engine(
-    settings.database_url,
-    pool_size=settings.db_pool_size,
-    max_overflow=settings.db_max_overflow,
-    pool_pre_ping=True,   # verify connection health before handing it out
-    echo=False,           # set to True to log all SQL (verbose, dev-only)
-)
+_engine: Engine | None = None
+_engine_lock = threading.Lock()
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+
+def get_engine() -> Engine:
+    """Return the shared engine, creating it on first use.
+
+    Creating the engine does not connect; the first connection is made
+    by the first query.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(
+                settings.database_url,
+                pool_size=settings.db_pool_size,
+                max_overflow=settings.db_max_overflow,
+                pool_pre_ping=True,   # verify connection health before handing it out
+                echo=False,           # set to True to log all SQL (verbose, dev-only)
+            )
+            if _engine.dialect.name == "postgresql":
+                event.listen(_engine, "connect", _apply_search_params)
+            _session_factory.configure(bind=_engine)
+        return _engine
+
+
+def SessionLocal() -> Session:  # noqa: N802 — kept as the familiar factory name
+    """Open a new session on the shared engine."""
+    get_engine()
+    return _session_factory()
+
+
+def init_schema() -> None:
+    """Create any missing tables and the vector index (idempotent)."""
+    from storage.models import Base
+
+    engine = get_engine()
+    if engine.dialect.name == "postgresql":
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        except Exception:
+            logger.warning("Could not create the pgvector extension", exc_info=True)
+    Base.metadata.create_all(bind=engine)
+    ensure_vector_index()
+    logger.info("Database schema ready")
+
+
+def _apply_search_params(dbapi_conn, _record) -> None:
+    """Set the pgvector search breadth for a new pooled connection."""
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute(f"SET hnsw.ef_search = {int(settings.pgvector_ef_search)}")
+        cursor.execute(f"SET ivfflat.probes = {int(settings.pgvector_probes)}")
+        dbapi_conn.commit()   # a rolled-back SET would be undone
+    except Exception:
+        dbapi_conn.rollback()
+        logger.warning("Could not set pgvector search parameters", exc_info=True)
+    finally:
+        cursor.close()
+
+
+# ── pgvector index ────────────────────────────────────────────────────────────
+
+VECTOR_INDEX_NAMES = {
+    "hnsw": "face_embedding_embedding_hnsw_idx",
+    "ivfflat": "face_embedding_embedding_ivfflat_idx",
+}
+
+_INDEX_SQL = """
+    SELECT c.relname, pg_get_indexdef(c.oid), i.indisvalid
+    FROM   pg_index i
+    JOIN   pg_class c ON c.oid = i.indexrelid
+    WHERE  i.indrelid = 'face_embedding'::regclass
+"""
 
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
-from storage.models import Base
-Base.metadata.create_all(bind=engine)
+def ivfflat_lists(rows: int) -> int:
+    """IVFFlat list count: ``settings.pgvector_ivf_lists`` or pgvector's rule of thumb."""
+    if settings.pgvector_ivf_lists:
+        return settings.pgvector_ivf_lists
+    return max(1, rows // 1000) if rows <= 1_000_000 else int(math.sqrt(rows))
+
+
+def index_params(kind: str, rows: int) -> dict[str, int]:
+    """Build parameters of the *kind* index for a table of *rows* rows."""
+    if kind == "hnsw":
+        return {"m": settings.pgvector_hnsw_m,
+                "ef_construction": settings.pgvector_hnsw_ef_construction}
+    return {"lists": ivfflat_lists(rows)}
+
+
+def index_ddl(kind: str, rows: int, name: str | None = None) -> str:
+    """``CREATE INDEX`` statement for the *kind* cosine index.
+
+    *name* defaults to the index's usual name; a rebuild passes a
+    temporary one.
+    """
+    params = ", ".join(f"{k} = {v}" for k, v in index_params(kind, rows).items())
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name or VECTOR_INDEX_NAMES[kind]} "
+        f"ON face_embedding USING {kind} (embedding vector_cosine_ops) WITH ({params})"
+    )
+
+
+def needs_rebuild(kind: str, indexdef: str, rows: int) -> bool:
+    """Whether an existing index no longer matches the configuration.
+
+    HNSW is rebuilt when ``m`` / ``ef_construction`` change.  IVFFlat
+    centroids are fixed at build time, so it is rebuilt once the table
+    has grown or shrunk enough that the ideal list count is 2× off.
+    """
+    current = {k: int(v) for k, v in re.findall(r"(\w+)='?(\d+)'?", indexdef)}
+    wanted = index_params(kind, rows)
+    if kind == "hnsw":
+        return any(current.get(k) != v for k, v in wanted.items())
+    lists = current.get("lists", 0)
+    return not lists or max(lists, wanted["lists"]) >= 2 * min(lists, wanted["lists"])
+
+
+def ensure_vector_index() -> str | None:
+    """Create or rebuild the ``settings.pgvector_index`` index on ``face_embedding``.
+
+    Indexes are built ``CONCURRENTLY``, so enrolment keeps working.  A
+    rebuild creates the replacement as ``<name>_new`` and only then drops
+    the old index and renames the new one, so searches keep an index
+    throughout; an index of the other kind is dropped once the new one
+    is in place.  A ``_new`` index left by an interrupted rebuild is
+    dropped and built again.
+
+    Returns:
+        Name of the index in place, or ``None`` (not PostgreSQL,
+        ``PGVECTOR_INDEX=none`` or the build failed).
+    """
+    kind = settings.pgvector_index
+    engine = get_engine()
+    if engine.dialect.name != "postgresql" or kind == "none":
+        return None
+    if kind not in VECTOR_INDEX_NAMES:
+        raise ValueError(f"Unknown PGVECTOR_INDEX {kind!r}; expected hnsw, ivfflat or none")
+
+    name = VECTOR_INDEX_NAMES[kind]
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            existing = {row[0]: (row[1], row[2]) for row in conn.execute(text(_INDEX_SQL))}
+            rows = conn.execute(text("SELECT count(*) FROM face_embedding")).scalar_one()
+
+            for leftover in (f"{n}_new" for n in VECTOR_INDEX_NAMES.values()):
+                if leftover in existing:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {leftover}"))
+
+            stale = name in existing and (
+                not existing[name][1] or needs_rebuild(kind, existing[name][0], rows)
+            )
+            if stale or name not in existing:
+                build = f"{name}_new" if stale else name
+                if stale:
+                    logger.info("Rebuilding pgvector index %s (%d rows)", name, rows)
+                t0 = time.perf_counter()
+                conn.execute(text(index_ddl(kind, rows, build)))
+                if stale:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                    conn.execute(text(f"ALTER INDEX {build} RENAME TO {name}"))
+                logger.info("Created pgvector %s index on %d embeddings in %.1fs",
+                            kind, rows, time.perf_counter() - t0)
+            for other in VECTOR_INDEX_NAMES.values():
+                if other != name and other in existing:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {other}"))
+                    logger.info("Dropped pgvector index %s", other)
+    except Exception:
+        logger.warning(
+            "Could not create the pgvector %s index (HNSW needs pgvector ≥ 0.5.0); "
+            "database searches will scan the whole table", kind, exc_info=True,
+        )
+        return None
+    return name
 
 # ── Session helpers ───────────────────────────────────────────────────────────
 
@@ -68,9 +250,14 @@ def get_db() -> Generator[Session, None, None]:
 def check_db_connection() -> bool:
     """Return *True* if the database is reachable, *False* otherwise."""
     try:
-        with engine.connect() as conn:
+        with get_engine().connect() as conn:
             conn.execute(text("SELECT 1"))
         return True
     except Exception:
         logger.error("Database connectivity check failed")
         return False
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    init_schema()
@@ -12,6 +12,7 @@ from __future__ import annotations
 import logging
 
 import numpy as np
+from sqlalchemy import func
 
 from storage.database import get_db
 from storage.models import FaceEmbedding
@@ -56,12 +57,26 @@ class EmbeddingRepository:
             # Convert BEFORE session closes
             return [
                 {
+                    "face_id": r.face_id,
                     "student_id": r.student_id,
                     "embedding": r.embedding,
                 }
                 for r in records
             ]
 
+    @staticmethod
+    def fingerprint() -> tuple[int, int]:
+        """Return ``(row count, highest face_id)`` without reading embeddings.
+
+        Any enrol or delete changes it, so it tells whether a saved
+        gallery snapshot still matches the table.
+        """
+        with get_db() as db:
+            count, top = db.query(
+                func.count(FaceEmbedding.face_id), func.max(FaceEmbedding.face_id)
+            ).one()
+            return int(count), int(top or 0)
+
     @staticmethod
     def get_by_student(student_id: int) -> list[dict]:
         with get_db() as db:
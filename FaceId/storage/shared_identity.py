@@ -0,0 +1,301 @@
+"""
+storage/shared_identity.py
+--------------------------
+Recent identity resolutions shared between workers.
+
+When a track is resolved against the gallery, the worker publishes the
+track's query vector under the student's ID in the shared cache backend
+(:mod:`storage.cache_backend`).  Every worker keeps a small local
+"hot set" of these recently seen faces, refreshed from the backend at
+most every ``SHARED_REFRESH_S``, and checks new queries against it
+before the full gallery search: a student already recognised by any
+worker is resolved with one tiny matrix product and a check against
+that student's own embeddings instead of a search of the whole gallery
+(or pgvector).
+
+Every resolution also records how far the nearest *other* student was
+from the published vector.  A query near a hot vector can only have a
+different gallery argmin if it moved by at least half of that gap, so a
+hot-set hit is taken only while twice the query's angle to the hot
+vector stays below the gap; closer calls go to the full search.  This
+keeps results independent of what happens to be in the hot set.
+
+A hot-set hit within ``SHARED_MATCH_THRESHOLD`` only names a candidate:
+it is re-scored against the candidate's enrolled embeddings, and the
+returned distance is that gallery distance, so hits never compound
+probe-to-probe distances and confidence / lock hysteresis see the same
+numbers as after a full search.  A candidate farther than
+``SIM_THRESHOLD`` from its enrolment is a miss.  Entries expire after
+``SHARED_CACHE_TTL_S``; removing a student forgets them immediately.
+
+Resolutions are only valid for the gallery they were scored against, so
+the shared hash is named after the gallery fingerprint (embedding count,
+highest ``face_id``).  Loading or adding to the gallery moves this worker
+to the hash of its new fingerprint and clears its local hot set; the
+hashes of other galleries are left to the workers still using them and
+expire on their own.
+
+Off by default (``SHARED_MATCH_THRESHOLD=0``): it only pays off when
+several workers share a Redis backend (``REDIS_URL``).
+
+Wire format (one hash field per student, no pickle)::
+
+    key   = resolutions:<count>:<max face_id>   ("resolutions" before the gallery loads)
+    field = str(student_id)
+    value = <f8 published_at (unix s)> <f4 distance> <f4 rival distance> <f4 × 512 vector>
+"""
+
+from __future__ import annotations
+
+import logging
+import struct
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+from configs.settings import settings
+from storage.cache_backend import CacheBackend, get_backend
+from storage.vector_search import (
+    SearchResult,
+    gallery,
+    rival_distances,
+    student_distances,
+)
+
+logger = logging.getLogger(__name__)
+
+_HASH = "resolutions"
+_DIM = 512
+_HEADER = struct.Struct("<dff")
+_DTYPE = np.dtype("<f4")
+
+
+def pack_resolution(vector: np.ndarray, d: float, rival: float, published_at: float) -> bytes:
+    """Serialise one resolution (header + float32 little-endian vector)."""
+    return _HEADER.pack(published_at, d, rival) + np.asarray(vector, dtype=_DTYPE).tobytes()
+
+
+def unpack_resolution(raw: bytes) -> tuple[np.ndarray, float, float, float]:
+    """Inverse of :func:`pack_resolution`: ``(vector, d, rival, published_at)``."""
+    published_at, d, rival = _HEADER.unpack_from(raw)
+    vector = np.frombuffer(raw, dtype=_DTYPE, offset=_HEADER.size).astype(np.float32)
+    return vector, d, rival, published_at
+
+
+def _angle(d):
+    """Angle (rad) between unit vectors at cosine distance *d*."""
+    return np.arccos(np.clip(1.0 - np.asarray(d, dtype=np.float64), -1.0, 1.0))
+
+
+def _empty_hot() -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    return (
+        np.empty((0, _DIM), dtype=np.float32),
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.float64),
+    )
+
+
+class SharedIdentity:
+    """Publish and look up recent student resolutions across workers.
+
+    Args:
+        backend:   Cache backend; defaults to the process-wide one.
+        threshold: Max cosine distance for a hot-set hit.
+        ttl:       Seconds a resolution stays usable.
+        refresh:   Min seconds between two reloads of the hot set.
+        rescore:   ``(vectors, student_ids) -> distances`` against the
+                   gallery; defaults to :func:`storage.vector_search.student_distances`.
+        rival:     ``(vectors, student_ids) -> distances`` to the nearest
+                   other student; defaults to
+                   :func:`storage.vector_search.rival_distances`.
+    """
+
+    def __init__(
+        self,
+        backend: CacheBackend | None = None,
+        threshold: float | None = None,
+        ttl: float | None = None,
+        refresh: float | None = None,
+        rescore: Callable[[np.ndarray, list[int]], list[float | None]] | None = None,
+        rival: Callable[[np.ndarray, list[int]], list[float | None]] | None = None,
+    ) -> None:
+        self._backend = backend
+        self.threshold = settings.shared_match_threshold if threshold is None else threshold
+        self.ttl = settings.shared_cache_ttl_s if ttl is None else ttl
+        self.refresh = settings.shared_refresh_s if refresh is None else refresh
+        self._rescore = rescore or student_distances
+        self._rival = rival or rival_distances
+        self._lock = threading.Lock()
+        self._key = _HASH
+        # (unit vectors, student_ids, angular gap to the runner-up) — swapped as one
+        self._hot = _empty_hot()
+        self._loaded_at = float("-inf")
+        self._lookups = 0
+        self._hits = 0
+        self._published = 0
+
+    @property
+    def backend(self) -> CacheBackend:
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    # ── Lookup ───────────────────────────────────────────────────────────────
+
+    def lookup(self, queries: np.ndarray) -> list[SearchResult | None]:
+        """Resolve each query row against the hot set; ``None`` = go to the gallery.
+
+        Hits carry the distance to the student's enrolled embeddings.  A
+        query is only a candidate while it is close enough to the hot
+        vector that no other student can be nearer (see the module notes).
+        """
+        if not self.enabled or len(queries) == 0:
+            return [None] * len(queries)
+        self._maybe_reload()
+        matrix, student_ids, margins = self._hot   # snapshot
+        results: list[SearchResult | None] = [None] * len(queries)
+        if len(student_ids):
+            q = np.asarray(queries, dtype=np.float32)
+            q = q / (np.linalg.norm(q, axis=1, keepdims=True) + 1e-8)
+            sims = q @ matrix.T
+            best = np.argmax(sims, axis=1)
+            dist = 1.0 - sims[np.arange(len(q)), best]
+            safe = (dist <= self.threshold) & (2.0 * _angle(dist) < margins[best])
+            candidates = np.flatnonzero(safe).tolist()
+            if candidates:
+                students = [int(student_ids[best[i]]) for i in candidates]
+                distances = self._rescore(q[candidates], students)
+                for i, student_id, d in zip(candidates, students, distances):
+                    if d is not None and d <= settings.sim_threshold:
+                        results[i] = SearchResult(student_id=student_id, d=d)
+        hits = sum(r is not None for r in results)
+        with self._lock:
+            self._lookups += len(results)
+            self._hits += hits
+        return results
+
+    # ── Publishing ───────────────────────────────────────────────────────────
+
+    def publish(self, student_id: int, vector: np.ndarray, d: float) -> None:
+        """Share a gallery-verified resolution with every worker.
+
+        Looks up the runner-up student first; a resolution whose
+        runner-up cannot be determined is not shared.
+        """
+        if not self.enabled:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) + 1e-8)
+        rival = self._rival(vector[None], [student_id])[0]
+        if rival is None:
+            return
+        key = self._key
+        self.backend.hset(key, str(student_id), pack_resolution(vector, d, rival, time.time()))
+        with self._lock:
+            self._published += 1
+            if key == self._key:   # not re-keyed meanwhile
+                self._install(student_id, vector, float(_angle(rival) - _angle(d)))
+
+    def forget(self, student_id: int) -> None:
+        """Drop *student_id* from the shared and local hot sets."""
+        self.backend.hdel(self._key, str(student_id))
+        with self._lock:
+            matrix, student_ids, margins = self._hot
+            keep = student_ids != student_id
+            self._hot = (matrix[keep], student_ids[keep], margins[keep])
+
+    def clear(self) -> None:
+        """Drop the local hot set; it is refilled from the shared hash.
+
+        The shared hash is left alone: other workers are still using it.
+        """
+        with self._lock:
+            self._hot = _empty_hot()
+            self._loaded_at = float("-inf")
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                **self.backend.stats(),
+                "hot_students": len(self._hot[1]),
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "published": self._published,
+                "hit_rate": round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+            }
+
+    # ── Helpers ──────────────────────────────────────────────────────────────
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._loaded_at < self.refresh:
+            return
+        with self._lock:
+            if now - self._loaded_at < self.refresh:
+                return
+            self._loaded_at = now   # one reloader; others keep the old snapshot
+
+        key = self._key
+        raw = self.backend.hgetall(key)
+        cutoff = time.time() - self.ttl
+        vectors, student_ids, margins, stale = [], [], [], []
+        for field, value in raw.items():
+            try:
+                vector, d, rival, published_at = unpack_resolution(value)
+            except (struct.error, ValueError):
+                stale.append(field)
+                continue
+            if published_at < cutoff:
+                stale.append(field)
+                continue
+            vectors.append(vector)
+            student_ids.append(int(field))
+            margins.append(_angle(rival) - _angle(d))
+        if stale:
+            self.backend.hdel(key, *stale)
+
+        hot = _empty_hot()
+        if vectors:
+            hot = (
+                np.stack(vectors),
+                np.asarray(student_ids, dtype=np.int64),
+                np.asarray(margins, dtype=np.float64),
+            )
+        with self._lock:
+            if key == self._key:   # not re-keyed meanwhile
+                self._hot = hot
+
+    def _install(self, student_id: int, vector: np.ndarray, margin: float) -> None:
+        """Put *vector* into the local hot set right away (lock held)."""
+        matrix, student_ids, margins = self._hot
+        keep = student_ids != student_id
+        self._hot = (
+            np.vstack([matrix[keep], vector[None]]),
+            np.append(student_ids[keep], student_id),
+            np.append(margins[keep], margin),
+        )
+
+    def _rekey(self) -> None:
+        """Follow the gallery to the hash of its new fingerprint."""
+        count, max_face_id = gallery.fingerprint()
+        with self._lock:
+            self._key = f"{_HASH}:{count}:{max_face_id}"
+        self.clear()
+
+    def _on_gallery(self, event: str, *args: Any) -> None:
+        if event == "remove":
+            self.forget(args[0])
+        elif event in ("load", "add") and self.enabled:
+            self._rekey()   # resolutions of the old gallery may now be wrong
+
+
+# Module-level singleton; the backend is created on first use
+shared_identity = SharedIdentity()
+gallery.add_listener(shared_identity._on_gallery)
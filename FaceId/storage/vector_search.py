@@ -3,7 +3,16 @@ storage/vector_search.py
 -------------------------
 Cosine similarity search over stored face embeddings.
 
-Primary backend: **pgvector** (PostgreSQL extension).
+Hot path:        **In-memory gallery** — a process-resident index of every
+                 L2-normalised enrolled embedding: exact (one matrix
+                 product) or approximate (HNSW / IVF) per
+                 ``settings.gallery_index``.  Loaded once at startup —
+                 from a saved snapshot when ``settings.gallery_index_dir``
+                 is set — and kept in sync on enrol / delete; no database
+                 round trip per query.
+Primary backend: **pgvector** (PostgreSQL extension) — the source of truth,
+                 queried directly when the gallery is not loaded or
+                 ``settings.search_backend == "pgvector"``.
 Fallback:        Pure NumPy brute-force search — used automatically when
                  the database is unavailable (development, CI, unit tests).
 
@@ -11,20 +20,29 @@ pgvector SQL note
 -~~~~~~~~~~~~~~~~
 ``<=>`` is the pgvector cosine-distance operator.  Distance 0 = identical,
 distance 2 = opposite direction.  We keep results where distance ≤
-``settings.sim_threshold``.
+``settings.sim_threshold``.  Queries ``ORDER BY embedding <=> …  LIMIT 1``
+so the planner can walk the HNSW / IVFFlat index created by
+:func:`storage.database.ensure_vector_index`;
+:func:`check_vector_index` verifies with ``EXPLAIN`` that it does.
 """
 
 from __future__ import annotations
 
+import json
 import logging
+import os
+import threading
 import time
+import uuid
+from collections.abc import Callable
+from pathlib import Path
 from typing import Any, NamedTuple
 
 import numpy as np
 from sqlalchemy import text
 
 from configs.settings import settings
-from storage.database import SessionLocal
+from storage.database import VECTOR_INDEX_NAMES, SessionLocal, get_engine
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +54,723 @@ class SearchResult(NamedTuple):
     d: float          # cosine distance (0 = identical, lower = better)
 
 
+# ── Index backends ────────────────────────────────────────────────────────────
+
+_EMBEDDING_DIM = 512
+
+
+class VectorIndex:
+    """Top-1 inner-product index over unit vectors labelled by ``face_id``.
+
+    Backends differ in speed and recall, not in interface:
+
+      - :class:`FlatIndex` – exact; one GEMM per batch of queries.
+      - :class:`HnswIndex` – HNSW graph (``hnswlib``); sub-millisecond
+        at millions of vectors, recall tuned by ``GALLERY_HNSW_EF_SEARCH``.
+      - :class:`IvfIndex`  – inverted lists (``faiss``); recall tuned by
+        ``GALLERY_IVF_NPROBE``.
+
+    Every backend supports incremental :meth:`add` / :meth:`remove` and
+    round-trips through :meth:`save` / :meth:`load`.
+    """
+
+    name = "base"
+    suffix = "bin"
+
+    def build(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        """Replace the contents with *vectors* (``(N, 512)``, unit rows)."""
+        raise NotImplementedError
+
+    def add(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def remove(self, labels: np.ndarray) -> None:
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Best ``(similarity, label)`` per query row; label ``-1`` = none."""
+        sims, labels = self.search_k(queries, 1)
+        return sims[:, 0], labels[:, 0]
+
+    def search_k(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """``(N, k)`` similarities and labels, best first; missing slots are ``-1``."""
+        raise NotImplementedError
+
+    def vectors(self, labels: np.ndarray) -> np.ndarray:
+        """Stored rows for *labels* (unknown or removed labels are skipped)."""
+        raise NotImplementedError
+
+    def save(self, path: Path) -> None:
+        raise NotImplementedError
+
+    def load(self, path: Path) -> None:
+        raise NotImplementedError
+
+
+class FlatIndex(VectorIndex):
+    """Exact search over one contiguous float32 matrix.
+
+    Readers never lock: every mutation builds new arrays and publishes
+    them with one attribute assignment.
+    """
+
+    name = "flat"
+    suffix = "npz"
+
+    def __init__(self) -> None:
+        self._snapshot = (
+            np.empty((0, _EMBEDDING_DIM), dtype=np.float32),
+            np.empty(0, dtype=np.int64),
+        )
+
+    def build(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        self._publish(vectors, labels)
+
+    def add(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        matrix, ids = self._snapshot
+        self._publish(np.vstack([matrix, vectors]), np.append(ids, labels))
+
+    def remove(self, labels: np.ndarray) -> None:
+        matrix, ids = self._snapshot
+        keep = ~np.isin(ids, labels)
+        self._publish(matrix[keep], ids[keep])
+
+    def search_k(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        matrix, ids = self._snapshot
+        sims, labels = _empty_hits(len(queries), k)
+        n = min(k, len(ids))
+        if n == 0:
+            return sims, labels
+        all_sims = queries @ matrix.T
+        if n == 1:
+            top = np.argmax(all_sims, axis=1)[:, None]
+        else:
+            top = np.argpartition(-all_sims, n - 1, axis=1)[:, :n]
+            order = np.argsort(-np.take_along_axis(all_sims, top, axis=1), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+        sims[:, :n] = np.take_along_axis(all_sims, top, axis=1)
+        labels[:, :n] = ids[top]
+        return sims, labels
+
+    def vectors(self, labels: np.ndarray) -> np.ndarray:
+        matrix, ids = self._snapshot
+        return matrix[np.isin(ids, labels)]
+
+    def save(self, path: Path) -> None:
+        matrix, ids = self._snapshot
+        with open(path, "wb") as f:
+            np.savez(f, matrix=matrix, labels=ids)
+
+    def load(self, path: Path) -> None:
+        with np.load(path, allow_pickle=False) as data:
+            self._publish(data["matrix"], data["labels"])
+
+    def _publish(self, matrix: np.ndarray, labels: np.ndarray) -> None:
+        self._snapshot = (
+            np.ascontiguousarray(matrix, dtype=np.float32),
+            np.asarray(labels, dtype=np.int64),
+        )
+
+
+class HnswIndex(VectorIndex):
+    """Approximate search on an ``hnswlib`` HNSW graph.
+
+    Removed labels are marked deleted and their slots reused by later
+    adds; the graph grows by doubling when it runs out of room.
+    """
+
+    name = "hnsw"
+    suffix = "hnsw"
+
+    def __init__(
+        self,
+        m: int | None = None,
+        ef_construction: int | None = None,
+        ef_search: int | None = None,
+    ) -> None:
+        import hnswlib  # optional: only needed for GALLERY_INDEX=hnsw
+
+        self._hnswlib = hnswlib
+        self.m = settings.gallery_hnsw_m if m is None else m
+        self.ef_construction = (
+            settings.gallery_hnsw_ef_construction if ef_construction is None else ef_construction
+        )
+        self.ef_search = settings.gallery_hnsw_ef_search if ef_search is None else ef_search
+        self._lock = threading.Lock()
+        self._index = self._new(1024)
+
+    def build(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        index = self._new(max(1024, len(labels)))
+        if len(labels):
+            index.add_items(vectors, labels)
+        with self._lock:
+            self._index = index
+
+    def add(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        with self._lock:
+            needed = self._index.get_current_count() + len(labels)
+            if needed > self._index.get_max_elements():
+                self._index.resize_index(max(needed, 2 * self._index.get_max_elements()))
+            self._index.add_items(vectors, labels, replace_deleted=True)
+
+    def remove(self, labels: np.ndarray) -> None:
+        with self._lock:
+            for label in labels:
+                try:
+                    self._index.mark_deleted(int(label))
+                except RuntimeError:
+                    pass   # unknown or already deleted
+
+    def search_k(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        sims, labels = _empty_hits(len(queries), k)
+        n = k
+        while n > 0:
+            try:
+                with self._lock:
+                    found, distances = self._index.knn_query(queries, k=n)
+                break
+            except RuntimeError:
+                n //= 2   # fewer live elements than asked for
+        else:
+            return sims, labels
+        sims[:, :n] = 1.0 - distances
+        labels[:, :n] = found
+        return sims, labels
+
+    def vectors(self, labels: np.ndarray) -> np.ndarray:
+        rows = []
+        with self._lock:
+            for label in labels:
+                try:
+                    rows.append(self._index.get_items([int(label)], return_type="numpy")[0])
+                except RuntimeError:
+                    pass   # unknown or deleted
+        return np.asarray(rows, dtype=np.float32).reshape(-1, _EMBEDDING_DIM)
+
+    def save(self, path: Path) -> None:
+        with self._lock:
+            self._index.save_index(str(path))
+
+    def load(self, path: Path) -> None:
+        index = self._hnswlib.Index(space="ip", dim=_EMBEDDING_DIM)
+        index.load_index(str(path), allow_replace_deleted=True)
+        index.set_ef(self.ef_search)
+        with self._lock:
+            self._index = index
+
+    def _new(self, capacity: int):
+        index = self._hnswlib.Index(space="ip", dim=_EMBEDDING_DIM)
+        index.init_index(
+            max_elements=capacity,
+            M=self.m,
+            ef_construction=self.ef_construction,
+            allow_replace_deleted=True,
+        )
+        index.set_ef(self.ef_search)
+        return index
+
+
+class IvfIndex(VectorIndex):
+    """Approximate search on a ``faiss`` IVF-Flat index.
+
+    The coarse quantiser is trained on :meth:`build`; galleries too small
+    to train ``nlist`` lists use an exact faiss flat index until the next
+    rebuild.  Adds go to the trained lists without retraining.  IVF lists
+    keep a hash-table direct map so stored rows can be read back by label.
+    """
+
+    name = "ivf"
+    suffix = "faiss"
+    _MIN_POINTS_PER_LIST = 39   # faiss warns below this when training
+
+    def __init__(self, nlist: int | None = None, nprobe: int | None = None) -> None:
+        import faiss  # optional: only needed for GALLERY_INDEX=ivf
+
+        self._faiss = faiss
+        self.nlist = settings.gallery_ivf_nlist if nlist is None else nlist
+        self.nprobe = settings.gallery_ivf_nprobe if nprobe is None else nprobe
+        self._lock = threading.Lock()
+        self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(_EMBEDDING_DIM))
+
+    def build(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        faiss = self._faiss
+        nlist = self.nlist or int(4 * np.sqrt(len(labels)))
+        if nlist > 1 and len(labels) >= nlist * self._MIN_POINTS_PER_LIST:
+            index = faiss.IndexIVFFlat(
+                faiss.IndexFlatIP(_EMBEDDING_DIM), _EMBEDDING_DIM, nlist,
+                faiss.METRIC_INNER_PRODUCT,
+            )
+            index.train(vectors)
+            index.nprobe = self.nprobe
+            index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        else:
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(_EMBEDDING_DIM))
+        if len(labels):
+            index.add_with_ids(vectors, np.asarray(labels, dtype=np.int64))
+        with self._lock:
+            self._index = index
+
+    def add(self, vectors: np.ndarray, labels: np.ndarray) -> None:
+        with self._lock:
+            self._index.add_with_ids(vectors, np.asarray(labels, dtype=np.int64))
+
+    def remove(self, labels: np.ndarray) -> None:
+        with self._lock:
+            self._index.remove_ids(np.asarray(labels, dtype=np.int64))
+
+    def search_k(self, queries: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            sims, labels = self._index.search(queries, k)
+        return sims, labels.astype(np.int64)
+
+    def vectors(self, labels: np.ndarray) -> np.ndarray:
+        rows = []
+        with self._lock:
+            for label in labels:
+                try:
+                    rows.append(self._index.reconstruct(int(label)))
+                except RuntimeError:
+                    pass   # unknown or removed
+        return np.asarray(rows, dtype=np.float32).reshape(-1, _EMBEDDING_DIM)
+
+    def save(self, path: Path) -> None:
+        with self._lock:
+            self._faiss.write_index(self._index, str(path))
+
+    def load(self, path: Path) -> None:
+        index = self._faiss.read_index(str(path))
+        ivf = self._faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+        with self._lock:
+            self._index = index
+
+
+def _empty_hits(n: int, k: int) -> tuple[np.ndarray, np.ndarray]:
+    return np.zeros((n, k), dtype=np.float32), np.full((n, k), -1, dtype=np.int64)
+
+
+_INDEX_KINDS: dict[str, type[VectorIndex]] = {
+    "flat": FlatIndex,
+    "hnsw": HnswIndex,
+    "ivf": IvfIndex,
+}
+
+
+def make_index(kind: str | None = None) -> VectorIndex:
+    """Create an empty index of *kind* (default ``settings.gallery_index``)."""
+    kind = kind or settings.gallery_index
+    try:
+        return _INDEX_KINDS[kind]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown gallery index {kind!r}; expected one of {sorted(_INDEX_KINDS)}"
+        ) from None
+
+
+# ── In-memory gallery ─────────────────────────────────────────────────────────
+
+_META_FILE = "meta.npz"
+_SEARCH_K = 4   # neighbours fetched per query, so a racing add cannot hide the match
+
+
+class GalleryIndex:
+    """Process-resident cosine index over enrolled embeddings.
+
+    Embeddings are L2-normalised into a :class:`VectorIndex` of kind
+    ``settings.gallery_index`` (exact ``flat`` by default), labelled by
+    ``face_id``, next to a ``face_id → student_id`` map.  The index is
+    created on the first :meth:`load` / :meth:`add`, so importing this
+    module never imports ``hnswlib`` / ``faiss``.
+
+    Readers never take the gallery lock: the index, the student map and
+    its reverse (``student_id → face_ids``) are published together as one
+    tuple, read once per search, so a concurrent search never pairs the
+    rows of one state with the students of another.  The HNSW and IVF
+    backends grow in place, so a search may still meet a label added
+    after its snapshot was taken; searches ask for a few neighbours and
+    skip labels the snapshot does not know.  Writers serialise on an
+    internal lock.
+
+    :meth:`save` / :meth:`restore` persist the index to a directory so a
+    restart does not rebuild it from Postgres.
+
+    Listeners registered with :meth:`add_listener` are called after every
+    mutation as ``listener(event, *args)`` — ``("load",)``,
+    ``("add", face_id, student_id, embedding)`` or
+    ``("remove", student_id)`` — so copies of the gallery held by worker
+    processes can follow along.
+    """
+
+    def __init__(self, kind: str | None = None) -> None:
+        self.kind = kind or settings.gallery_index
+        # (index, face_id → student_id, student_id → face_ids)
+        self._state: tuple[VectorIndex | None, dict[int, int], dict[int, tuple[int, ...]]] = (
+            None, {}, {}
+        )
+        self._lock = threading.Lock()
+        self._listeners: list[Callable[..., None]] = []
+        self.loaded: bool = False
+        self.dirty: bool = False   # changed since the last save / restore
+
+    def add_listener(self, listener: Callable[..., None]) -> None:
+        """Call *listener* after every load / add / remove."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[..., None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    # ── Loading ──────────────────────────────────────────────────────────────
+
+    def load(self, records: list[dict]) -> None:
+        """Replace the gallery with *records*.
+
+        Args:
+            records: Dicts with ``face_id``, ``student_id`` and
+                     ``embedding`` keys (as returned by
+                     :meth:`EmbeddingRepository.get_all`).
+        """
+        if records:
+            matrix = _normalise_rows(
+                np.asarray([r["embedding"] for r in records], dtype=np.float32)
+            )
+            face_ids = np.asarray([r["face_id"] for r in records], dtype=np.int64)
+            student_ids = np.asarray([r["student_id"] for r in records], dtype=np.int64)
+        else:
+            matrix = np.empty((0, _EMBEDDING_DIM), dtype=np.float32)
+            face_ids = np.empty(0, dtype=np.int64)
+            student_ids = np.empty(0, dtype=np.int64)
+
+        index = make_index(self.kind)
+        index.build(matrix, face_ids)
+        students = dict(zip(face_ids.tolist(), student_ids.tolist()))
+        with self._lock:
+            self._state = (index, students, _faces_by_student(students))
+            self.loaded = True
+            self.dirty = True
+        logger.info("Gallery loaded: %d embeddings (%s index)", len(face_ids), index.name)
+        self._notify("load")
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+
+    def save(self, directory: str | Path) -> None:
+        """Write the index and the student map to *directory*.
+
+        The index goes to a new file named after this process and
+        ``meta.npz`` is replaced atomically last (from a per-process temp
+        file), so a crash mid-save leaves the previous snapshot usable and
+        processes sharing the directory never overwrite each other's
+        files.  Afterwards only index files this process wrote, or whose
+        writer has exited, are deleted — never the one ``meta.npz`` names.
+        """
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            index, students, _ = self._state
+            if index is None:
+                return
+            name = f"index-{os.getpid()}-{uuid.uuid4().hex[:12]}.{index.suffix}"
+            index.save(path / name)
+            face_ids = np.fromiter(students.keys(), dtype=np.int64, count=len(students))
+            student_ids = np.fromiter(students.values(), dtype=np.int64, count=len(students))
+            tmp = path / f"meta.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                np.savez(f, kind=index.name, index_file=name,
+                         face_ids=face_ids, student_ids=student_ids)
+            os.replace(tmp, path / _META_FILE)
+            self.dirty = False
+            for stale in path.glob("index-*"):
+                if stale.name != name and _writer_gone(stale.name):
+                    stale.unlink(missing_ok=True)
+        logger.info("Gallery index saved to %s (%d embeddings)", path, len(face_ids))
+
+    def restore(self, directory: str | Path, fingerprint: tuple[int, int] | None = None) -> bool:
+        """Load a snapshot written by :meth:`save`.
+
+        Args:
+            directory:   Directory passed to :meth:`save`.
+            fingerprint: ``(count, max face_id)`` of the database; a
+                         snapshot that does not match it is stale.
+
+        Returns:
+            ``True`` if the gallery now holds the snapshot; ``False``
+            (gallery unchanged) if it is missing, stale, of another index
+            kind or unreadable.
+        """
+        path = Path(directory)
+        if not (path / _META_FILE).exists():
+            return False
+        try:
+            with np.load(path / _META_FILE, allow_pickle=False) as meta:
+                kind = str(meta["kind"])
+                index_file = str(meta["index_file"])
+                face_ids, student_ids = meta["face_ids"], meta["student_ids"]
+            if kind != self.kind:
+                logger.info("Gallery snapshot is a %r index, %r configured", kind, self.kind)
+                return False
+            if fingerprint is not None and tuple(fingerprint) != _fingerprint(face_ids):
+                logger.info("Gallery snapshot is stale (%s ≠ database %s)",
+                            _fingerprint(face_ids), tuple(fingerprint))
+                return False
+            index = make_index(kind)
+            index.load(path / index_file)
+        except Exception:
+            logger.warning("Could not restore gallery snapshot from %s", path, exc_info=True)
+            return False
+
+        students = dict(zip(face_ids.tolist(), student_ids.tolist()))
+        with self._lock:
+            self._state = (index, students, _faces_by_student(students))
+            self.loaded = True
+            self.dirty = False
+        logger.info("Gallery restored from %s: %d embeddings (%s index)",
+                    path, len(face_ids), kind)
+        self._notify("load")
+        return True
+
+    # ── Mutation ─────────────────────────────────────────────────────────────
+
+    def add(self, face_id: int, student_id: int, embedding: np.ndarray) -> None:
+        """Append one enrolled embedding."""
+        row = _normalise_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))
+        with self._lock:
+            index, students, faces = self._state
+            if index is None:
+                index = make_index(self.kind)
+                index.build(row[:0], np.empty(0, dtype=np.int64))
+            students = {**students, face_id: student_id}
+            faces = {**faces, student_id: (*faces.get(student_id, ()), face_id)}
+            index.add(row, np.asarray([face_id], dtype=np.int64))
+            self._state = (index, students, faces)
+            self.dirty = True
+        self._notify("add", face_id, student_id, row[0])
+
+    def remove_student(self, student_id: int) -> int:
+        """Drop every embedding belonging to *student_id*; return the count."""
+        with self._lock:
+            index, students, faces = self._state
+            face_ids = faces.get(student_id, ())
+            if face_ids:
+                index.remove(np.asarray(face_ids, dtype=np.int64))
+                self._state = (
+                    index,
+                    {f: s for f, s in students.items() if s != student_id},
+                    {s: f for s, f in faces.items() if s != student_id},
+                )
+                self.dirty = True
+        if face_ids:
+            self._notify("remove", student_id)
+        return len(face_ids)
+
+    # ── Search ───────────────────────────────────────────────────────────────
+
+    def search(self, vector: np.ndarray) -> SearchResult | None:
+        """Return the nearest enrolled embedding to *vector*, or ``None``."""
+        return self.search_many(vector)[0]
+
+    def search_many(self, vectors: np.ndarray) -> list[SearchResult | None]:
+        """Return the nearest enrolled embedding for each row of *vectors*.
+
+        With the ``flat`` index all queries are resolved with one
+        ``(Q, 512) × (512, N)`` GEMM.  The best neighbour whose label this
+        snapshot knows wins; labels added since are skipped.
+        """
+        index, students, _ = self._state  # snapshot
+        queries = np.asarray(vectors, dtype=np.float32).reshape(-1, _EMBEDDING_DIM)
+        if not students:
+            return [None] * len(queries)
+        sims, labels = index.search_k(_normalise_rows(queries), _SEARCH_K)
+        results: list[SearchResult | None] = []
+        for row_sims, row_labels in zip(sims.tolist(), labels.tolist()):
+            result = None
+            for sim, label in zip(row_sims, row_labels):
+                student_id = students.get(label)
+                if student_id is not None:
+                    result = SearchResult(student_id=student_id, d=1.0 - sim)
+                    break
+            results.append(result)
+        return results
+
+    def student_distances(
+        self, vectors: np.ndarray, student_ids: list[int]
+    ) -> list[float | None]:
+        """Distance from each row of *vectors* to the nearest embedding of
+        the matching entry of *student_ids*; ``None`` if that student is
+        not enrolled."""
+        index, _, faces = self._state  # snapshot
+        queries = _normalise_rows(
+            np.asarray(vectors, dtype=np.float32).reshape(-1, _EMBEDDING_DIM)
+        )
+        distances: list[float | None] = []
+        for query, student_id in zip(queries, student_ids):
+            face_ids = faces.get(student_id, ())
+            rows = index.vectors(np.asarray(face_ids, dtype=np.int64)) if face_ids else ()
+            distances.append(float(1.0 - np.max(rows @ query)) if len(rows) else None)
+        return distances
+
+    def rival_distances(
+        self, vectors: np.ndarray, student_ids: list[int]
+    ) -> list[float | None]:
+        """Distance from each row of *vectors* to the nearest embedding of
+        any student *other* than the matching entry of *student_ids*;
+        ``inf`` when nobody else is enrolled, ``None`` if the index did
+        not return one."""
+        index, students, faces = self._state  # snapshot
+        queries = _normalise_rows(
+            np.asarray(vectors, dtype=np.float32).reshape(-1, _EMBEDDING_DIM)
+        )
+        distances: list[float | None] = []
+        for query, student_id in zip(queries, student_ids):
+            if len(faces) - (student_id in faces) == 0:
+                distances.append(float("inf"))
+                continue
+            # the student's own rows can fill at most len(faces[student]) slots
+            k = len(faces.get(student_id, ())) + _SEARCH_K
+            sims, labels = index.search_k(query[None], k)
+            d = None
+            for sim, label in zip(sims[0].tolist(), labels[0].tolist()):
+                other = students.get(label)
+                if other is not None and other != student_id:
+                    d = 1.0 - sim
+                    break
+            distances.append(d)
+        return distances
+
+    def fingerprint(self) -> tuple[int, int]:
+        """``(count, max face_id)`` of the loaded embeddings."""
+        return _fingerprint(np.fromiter(self._state[1], dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self._state[1])
+
+    # ── Helpers ──────────────────────────────────────────────────────────────
+
+    def _notify(self, event: str, *args: Any) -> None:
+        for listener in list(self._listeners):
+            try:
+                listener(event, *args)
+            except Exception:
+                logger.warning("Gallery listener failed on %r", event, exc_info=True)
+
+
+def _normalise_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalise each row of *matrix*."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / (norms + 1e-8)
+
+
+def _faces_by_student(students: dict[int, int]) -> dict[int, tuple[int, ...]]:
+    faces: dict[int, list[int]] = {}
+    for face_id, student_id in students.items():
+        faces.setdefault(student_id, []).append(face_id)
+    return {student_id: tuple(ids) for student_id, ids in faces.items()}
+
+
+def _writer_gone(file_name: str) -> bool:
+    """Whether the process that wrote ``index-<pid>-…`` is this one or has exited.
+
+    Files of live processes are left alone: one of them may be restoring
+    from it right now.
+    """
+    try:
+        pid = int(file_name.split("-")[1])
+    except (IndexError, ValueError):
+        return True   # not written by :meth:`GalleryIndex.save`
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False   # exists, owned by another user
+    return False
+
+
+def _fingerprint(face_ids: np.ndarray) -> tuple[int, int]:
+    return len(face_ids), int(face_ids.max()) if len(face_ids) else 0
+
+
+# Module-level singleton — loaded at startup via ``load_gallery()``
+gallery = GalleryIndex()
+
+
+def load_gallery(rebuild: bool = False, save: bool = True) -> bool:
+    """Fill the in-memory gallery, from disk when possible.
+
+    With ``settings.gallery_index_dir`` set, a saved snapshot whose
+    embedding count and highest ``face_id`` still match the database is
+    loaded without reading the embeddings from Postgres; otherwise the
+    gallery is built from the database and saved there.
+
+    Args:
+        rebuild: Ignore any snapshot and read the database.
+        save:    Write the snapshot after a rebuild.  Worker processes
+                 pass ``False`` and leave the directory to the server.
+
+    Returns:
+        ``True`` on success.  On failure the previous gallery contents
+        are kept and searches fall back to pgvector if it was never loaded.
+    """
+    from storage.repositories import EmbeddingRepository  # avoid circular at top
+
+    t0 = time.perf_counter()
+    directory = settings.gallery_index_dir
+    try:
+        restored = bool(directory) and not rebuild and gallery.restore(
+            directory, EmbeddingRepository.fingerprint()
+        )
+        if not restored:
+            gallery.load(EmbeddingRepository.get_all())
+    except Exception:
+        logger.warning("Failed to load in-memory gallery", exc_info=True)
+        return False
+    if directory and save and not restored:
+        save_gallery()
+    logger.info("Gallery ready in %.1fms", (time.perf_counter() - t0) * 1000)
+    return True
+
+
+def save_gallery() -> bool:
+    """Persist the gallery to ``settings.gallery_index_dir`` if it changed."""
+    if not (settings.gallery_index_dir and gallery.loaded and gallery.dirty):
+        return False
+    try:
+        gallery.save(settings.gallery_index_dir)
+    except Exception:
+        logger.warning("Failed to save the gallery index", exc_info=True)
+        return False
+    return True
+
+
+def sync_gallery() -> bool:
+    """Rebuild the gallery if the database changed under it.
+
+    The gallery only follows enrolments and deletions made through this
+    process; with several server workers the others change the table
+    behind its back.  Comparing :meth:`GalleryIndex.fingerprint` with the
+    database's catches that without reading any embedding.
+
+    Returns:
+        ``True`` if the gallery was rebuilt.
+    """
+    from storage.repositories import EmbeddingRepository  # avoid circular at top
+
+    if not gallery.loaded:
+        return False
+    try:
+        fingerprint = EmbeddingRepository.fingerprint()
+    except Exception:
+        logger.warning("Gallery sync check failed", exc_info=True)
+        return False
+    if fingerprint == gallery.fingerprint():
+        return False
+    logger.info("Gallery out of date (%s ≠ database %s) — rebuilding",
+                gallery.fingerprint(), fingerprint)
+    return load_gallery(rebuild=True, save=False)
+
+
 # ── pgvector search ───────────────────────────────────────────────────────────
 
 _COSINE_SQL = text(
@@ -43,7 +778,7 @@ _COSINE_SQL = text(
     SELECT student_id,
            embedding <=> CAST(:v AS vector) AS distance
     FROM   face_embedding
-    ORDER  BY distance
+    ORDER  BY embedding <=> CAST(:v AS vector)
     LIMIT  1
     """
 )
@@ -52,7 +787,8 @@ _COSINE_SQL = text(
 def cosine_search(vector: np.ndarray) -> SearchResult | None:
     """Find the closest stored embedding to *vector* using cosine distance.
 
-    Tries pgvector first; falls back to NumPy brute-force if the query
+    Uses the in-memory gallery when it is loaded (no database access).
+    Otherwise tries pgvector; falls back to NumPy brute-force if the query
     fails (e.g., no database connection or pgvector not installed).
 
     Args:
@@ -63,7 +799,10 @@ def cosine_search(vector: np.ndarray) -> SearchResult | None:
         cosine distance, or ``None`` if no embeddings are stored.
     """
     t0 = time.perf_counter()
-    result = _pgvector_search(vector) or _numpy_fallback_search(vector)
+    if settings.search_backend == "memory" and gallery.loaded:
+        result = gallery.search(vector)
+    else:
+        result = _pgvector_search(vector) or _numpy_fallback_search(vector)
     elapsed = (time.perf_counter() - t0) * 1000
     if result:
         logger.debug(
@@ -75,6 +814,238 @@ def cosine_search(vector: np.ndarray) -> SearchResult | None:
     return result
 
 
+def cosine_search_many(embeddings: np.ndarray) -> list[SearchResult | None]:
+    """Resolve a whole frame's embeddings in one search call.
+
+    Uses one GEMM against the in-memory gallery when it is loaded,
+    otherwise one ``LATERAL`` pgvector query, falling back to NumPy.
+
+    Args:
+        embeddings: ``(N, 512)`` float32 query matrix.
+
+    Returns:
+        One entry per input row: a :class:`SearchResult`, or ``None`` if
+        no embeddings are stored.
+    """
+    queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, _EMBEDDING_DIM)
+    if len(queries) == 0:
+        return []
+
+    t0 = time.perf_counter()
+    if settings.search_backend == "memory" and gallery.loaded:
+        results = gallery.search_many(queries)
+    else:
+        results = _pgvector_search_many(queries) or _numpy_fallback_search_many(queries)
+    logger.debug(
+        "cosine_search_many → %d queries in %.1fms",
+        len(queries), (time.perf_counter() - t0) * 1000,
+    )
+    return results
+
+
+def student_distances(
+    embeddings: np.ndarray, student_ids: list[int]
+) -> list[float | None]:
+    """Distance from each embedding to its candidate student's enrolment.
+
+    Verifies a candidate resolution (e.g. a shared hot-set hit) against
+    the gallery: row *i* of *embeddings* is compared only with the
+    embeddings of ``student_ids[i]``.  Uses the in-memory gallery when
+    it is loaded, otherwise pgvector.
+
+    Returns:
+        One cosine distance per row, ``None`` where the student has no
+        embeddings or the database is unavailable.
+    """
+    queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, _EMBEDDING_DIM)
+    if settings.search_backend == "memory" and gallery.loaded:
+        return gallery.student_distances(queries, list(student_ids))
+    return _pgvector_student_distances(queries, list(student_ids))
+
+
+def rival_distances(
+    embeddings: np.ndarray, student_ids: list[int]
+) -> list[float | None]:
+    """Distance from each embedding to the nearest *other* student.
+
+    Row *i* of *embeddings* is compared with every enrolled embedding not
+    belonging to ``student_ids[i]``, so callers can tell how far a match
+    is ahead of the runner-up.  Uses the in-memory gallery when it is
+    loaded, otherwise pgvector.
+
+    Returns:
+        One cosine distance per row; ``inf`` when no other student is
+        enrolled, ``None`` when it could not be determined.
+    """
+    queries = np.asarray(embeddings, dtype=np.float32).reshape(-1, _EMBEDDING_DIM)
+    if settings.search_backend == "memory" and gallery.loaded:
+        return gallery.rival_distances(queries, list(student_ids))
+    return _pgvector_rival_distances(queries, list(student_ids))
+
+
+_STUDENT_DISTANCE_SQL = text(
+    """
+    SELECT min(embedding <=> CAST(:v AS vector))
+    FROM   face_embedding
+    WHERE  student_id = :s
+    """
+)
+
+
+def _pgvector_student_distances(
+    queries: np.ndarray, student_ids: list[int]
+) -> list[float | None]:
+    db = SessionLocal()
+    try:
+        distances: list[float | None] = []
+        for row, student_id in zip(queries, student_ids):
+            d = db.execute(
+                _STUDENT_DISTANCE_SQL, {"v": row.tolist(), "s": int(student_id)}
+            ).scalar_one()
+            distances.append(None if d is None else float(d))
+        return distances
+    except Exception:
+        logger.warning("pgvector candidate check failed", exc_info=True)
+        return [None] * len(queries)
+    finally:
+        db.close()
+
+
+_RIVAL_DISTANCE_SQL = text(
+    """
+    SELECT embedding <=> CAST(:v AS vector) AS distance
+    FROM   face_embedding
+    WHERE  student_id <> :s
+    ORDER  BY embedding <=> CAST(:v AS vector)
+    LIMIT  1
+    """
+)
+
+
+def _pgvector_rival_distances(
+    queries: np.ndarray, student_ids: list[int]
+) -> list[float | None]:
+    db = SessionLocal()
+    try:
+        distances: list[float | None] = []
+        for row, student_id in zip(queries, student_ids):
+            d = db.execute(
+                _RIVAL_DISTANCE_SQL, {"v": row.tolist(), "s": int(student_id)}
+            ).scalar_one_or_none()
+            distances.append(float("inf") if d is None else float(d))
+        return distances
+    except Exception:
+        logger.warning("pgvector runner-up check failed", exc_info=True)
+        return [None] * len(queries)
+    finally:
+        db.close()
+
+
+_COSINE_MANY_SQL = text(
+    """
+    SELECT q.ord, m.student_id, m.distance
+    FROM   unnest(CAST(:vs AS text[])) WITH ORDINALITY AS q(v, ord)
+    CROSS  JOIN LATERAL (
+        SELECT student_id,
+               embedding <=> CAST(q.v AS vector) AS distance
+        FROM   face_embedding
+        ORDER  BY embedding <=> CAST(q.v AS vector)
+        LIMIT  1
+    ) AS m
+    ORDER  BY q.ord
+    """
+)
+
+
+_EXPLAIN_SQL = text(
+    """
+    EXPLAIN (FORMAT JSON)
+    SELECT student_id
+    FROM   face_embedding
+    ORDER  BY embedding <=> CAST(:v AS vector)
+    LIMIT  1
+    """
+)
+
+_MIN_INDEXED_ROWS = 1000   # below this a sequential scan is legitimately cheaper
+
+
+def check_vector_index() -> bool | None:
+    """``EXPLAIN`` the nearest-neighbour query and warn unless it uses the index.
+
+    Returns:
+        ``True`` if the plan scans a pgvector index, ``False`` if it does
+        not, ``None`` when there is nothing to check (not PostgreSQL,
+        ``PGVECTOR_INDEX=none`` or the database is unreachable).
+    """
+    if settings.pgvector_index == "none" or get_engine().dialect.name != "postgresql":
+        return None
+    probe = "[" + ",".join(["0"] * (_EMBEDDING_DIM - 1) + ["1"]) + "]"
+    db = SessionLocal()
+    try:
+        plan = db.execute(_EXPLAIN_SQL, {"v": probe}).scalar_one()
+        rows = db.execute(
+            text("SELECT reltuples FROM pg_class WHERE relname = 'face_embedding'")
+        ).scalar_one()
+        if rows <= 0:
+            # -1 (PG14+) or 0: never ANALYZEd, which is when the index is skipped
+            rows = db.execute(text("SELECT count(*) FROM face_embedding")).scalar_one()
+    except Exception:
+        logger.warning("Vector index self-check failed", exc_info=True)
+        return None
+    finally:
+        db.close()
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    used = _plan_uses_index(plan, set(VECTOR_INDEX_NAMES.values()))
+    if used:
+        logger.info("pgvector index in use for nearest-neighbour search")
+    elif rows >= _MIN_INDEXED_ROWS:
+        logger.warning(
+            "pgvector nearest-neighbour search does not use the %s index "
+            "(~%d rows): every database search scans the whole table. "
+            "Check the index exists and is valid, then run ANALYZE face_embedding",
+            settings.pgvector_index, rows,
+        )
+    else:
+        logger.info("pgvector index not used yet (~%d rows; a sequential scan is cheaper)",
+                    max(0, int(rows)))
+    return used
+
+
+def _plan_uses_index(plan: Any, names: set[str]) -> bool:
+    """Whether any node of an ``EXPLAIN (FORMAT JSON)`` plan scans one of *names*."""
+    if isinstance(plan, list):
+        return any(_plan_uses_index(p, names) for p in plan)
+    if not isinstance(plan, dict):
+        return False
+    if plan.get("Index Name") in names:
+        return True
+    return any(
+        _plan_uses_index(plan[key], names) for key in ("Plan", "Plans") if key in plan
+    )
+
+
+def _pgvector_search_many(queries: np.ndarray) -> list[SearchResult | None] | None:
+    """Run one batched pgvector query. Returns None on any DB error."""
+    literals = ["[" + ",".join(map(str, row.tolist())) + "]" for row in queries]
+    db = SessionLocal()
+    try:
+        rows = db.execute(_COSINE_MANY_SQL, {"vs": literals}).fetchall()
+        if not rows:
+            return None
+        results: list[SearchResult | None] = [None] * len(queries)
+        for ord_, student_id, distance in rows:
+            results[int(ord_) - 1] = SearchResult(student_id=int(student_id), d=float(distance))
+        return results
+    except Exception:
+        logger.warning("pgvector batch search failed — falling back to NumPy", exc_info=True)
+        return None
+    finally:
+        db.close()
+
+
 def _pgvector_search(vector: np.ndarray) -> SearchResult | None:
     """Run the pgvector SQL search. Returns None on any DB error."""
     db = SessionLocal()
@@ -93,20 +1064,10 @@ def _pgvector_search(vector: np.ndarray) -> SearchResult | None:
 def _numpy_fallback_search(vector: np.ndarray) -> SearchResult | None:
     """Brute-force cosine search over all stored embeddings using NumPy.
 
-    O(n) — acceptable for small datasets (<10 k embeddings).
-    For large datasets consider FAISS (see note below).
-
-    .. note::
-        **FAISS upgrade path**: replace this function body with:
-
-        .. code-block:: python
-
-            import faiss
-            index = faiss.IndexFlatIP(512)   # inner product on L2-norm vecs
-            # index.add(all_embeddings)       # rebuild at startup
-            q = vector / np.linalg.norm(vector)
-            D, I = index.search(q[None], k=1)
-            return SearchResult(student_id=ids[I[0][0]], d=1.0 - D[0][0])
+    O(n) and reads every embedding from the database — a last resort
+    when neither the in-memory gallery nor pgvector is usable.  Large
+    galleries belong in :class:`GalleryIndex` (``GALLERY_INDEX=hnsw`` /
+    ``ivf``).
     """
     from storage.repositories import EmbeddingRepository  # avoid circular at top
 
@@ -130,3 +1091,19 @@ def _numpy_fallback_search(vector: np.ndarray) -> SearchResult | None:
     if best_sid is None:
         return None
     return SearchResult(student_id=best_sid, d=best_d)
+
+
+def _numpy_fallback_search_many(queries: np.ndarray) -> list[SearchResult | None]:
+    """Batched brute-force search: one GEMM over every embedding in the DB."""
+    from storage.repositories import EmbeddingRepository  # avoid circular at top
+
+    records = EmbeddingRepository.get_all()
+    if not records:
+        return [None] * len(queries)
+    matrix = _normalise_rows(np.asarray([r["embedding"] for r in records], dtype=np.float32))
+    sims = _normalise_rows(queries) @ matrix.T
+    best = np.argmax(sims, axis=1)
+    return [
+        SearchResult(student_id=int(records[b]["student_id"]), d=float(1.0 - sims[i, b]))
+        for i, b in enumerate(best)
+    ]
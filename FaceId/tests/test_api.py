@@ -6,7 +6,8 @@ FastAPI endpoint tests using Starlette's TestClient.
 The FacePipeline is mocked at import time so no models are loaded.
 """
 
-from unittest.mock import MagicMock, patch
+import time
+from unittest.mock import patch
 
 import numpy as np
 import pytest
@@ -20,6 +21,7 @@ def client():
         patch("ai.detector.yolo_face.torch"),
         patch("ai.recognizer.arcface.insightface"),
         patch("storage.database.create_engine"),
+        patch("storage.database._engine", None),   # drop the mock engine afterwards
         patch("storage.database.check_db_connection", return_value=True),
         patch("app.websocket.init_pipeline"),
     ):
@@ -40,6 +42,77 @@ def test_health_returns_ok(client):
     assert "active_streams" in data
 
 
+# ── /ready ────────────────────────────────────────────────────────────────────
+
+def test_ready_flips_only_after_warm_up(client):
+    with patch("main.pipeline_ready", return_value=False):
+        response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["ready"] is False
+
+    with patch("main.pipeline_ready", return_value=True):
+        for _ in range(100):          # gallery load runs in the background
+            response = client.get("/ready")
+            if response.status_code == 200:
+                break
+            time.sleep(0.02)
+    assert response.status_code == 200
+    assert "cold_start_s" in response.json()
+
+
+def test_startup_failure_is_reported():
+    """A model load that raises is logged and surfaced by /ready and /health."""
+    import app.websocket as module
+    import main
+
+    with (
+        patch.dict(module._startup, {"error": None}),
+        patch.object(module, "init_pipeline", side_effect=FileNotFoundError("yolo.pt")),
+    ):
+        module.preload_pipeline().exception(timeout=5)
+        for _ in range(100):          # the done-callback runs after waiters wake
+            if module.startup_error() is not None:
+                break
+            time.sleep(0.01)
+        assert module.startup_error() == "FileNotFoundError: yolo.pt"
+
+        with (
+            patch("main.check_db_connection", return_value=True),
+            patch("main.pipeline_ready", return_value=False),
+        ):
+            ready = TestClient(main.app).get("/ready")
+            health = TestClient(main.app).get("/health").json()
+    assert ready.status_code == 503
+    assert ready.json()["error"] == "FileNotFoundError: yolo.pt"
+    assert health["status"] == "degraded" and health["models"] == "failed"
+
+
+def test_failed_gallery_load_keeps_ready_503(client):
+    """load_gallery swallows its errors; /ready must not treat that as loaded."""
+    from concurrent.futures import Future
+
+    done = Future()   # same done() / exception() interface as the asyncio one
+    done.set_result(None)
+    with (
+        patch("main._gallery_load", done),
+        patch("main.gallery.loaded", False),
+        patch("main.pipeline_ready", return_value=True),
+        patch("main.check_db_connection", return_value=True),
+    ):
+        ready = client.get("/ready")
+        health = client.get("/health").json()
+    assert ready.status_code == 503
+    assert "gallery load failed" in ready.json()["error"]
+    assert health["status"] == "degraded" and health["gallery"] == "failed"
+
+    with (
+        patch("main._gallery_load", done),
+        patch("main.gallery.loaded", True),     # e.g. after /reload-embeddings succeeded
+        patch("main.pipeline_ready", return_value=True),
+    ):
+        assert client.get("/ready").status_code == 200
+
+
 # ── /info ─────────────────────────────────────────────────────────────────────
 
 def test_info_returns_metadata(client):
@@ -51,19 +124,37 @@ def test_info_returns_metadata(client):
     assert "device" in data
 
 
+# ── /metrics ──────────────────────────────────────────────────────────────────
+
+def test_metrics_exposes_outbox_stats(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert "queue_depth" in response.json()["attendance_outbox"]
+
+
 # ── /enroll ───────────────────────────────────────────────────────────────────
 
-@patch("main.EmbeddingRepository.save")
-def test_enroll_valid(mock_save, client):
+@patch("main.running_pipeline")
+@patch("main.gallery")
+@patch("main.EmbeddingRepository.save", return_value=42)
+def test_enroll_valid(mock_save, mock_gallery, mock_get_pipeline, client):
     """POST /enroll/{id} with 512-element embedding should return 200."""
-    mock_record = MagicMock()
-    mock_record.id = 42
-    mock_save.return_value = mock_record
 
     embedding = list(np.random.rand(512).astype(float))
     response = client.post("/enroll/1", json=embedding)
     assert response.status_code == 200
     assert response.json()["student_id"] == 1
+    mock_gallery.add.assert_called_once()
+    mock_get_pipeline.return_value.reload_state.assert_called_once()
+
+
+@patch("main.running_pipeline", return_value=None)
+@patch("main.gallery")
+@patch("main.EmbeddingRepository.save", return_value=42)
+def test_enroll_while_models_load_does_not_wait(mock_save, mock_gallery, mock_running, client):
+    response = client.post("/enroll/1", json=[0.1] * 512)
+    assert response.status_code == 200
+    assert response.json()["pipeline_reloaded"] is False
 
 
 def test_enroll_wrong_dimension(client):
@@ -84,8 +175,45 @@ def test_list_embeddings_empty(mock_get, client):
 
 # ── /students/{id} DELETE ─────────────────────────────────────────────────────
 
+@patch("main.running_pipeline")
 @patch("main.EmbeddingRepository.delete_by_student", return_value=3)
-def test_delete_student(mock_del, client):
+def test_delete_student(mock_del, mock_get_pipeline, client):
     response = client.delete("/students/1")
     assert response.status_code == 200
     assert response.json()["deleted"] == 3
+    assert response.json()["pipeline_reloaded"] is True
+    mock_get_pipeline.return_value.reload_state.assert_called_once()   # locks on the student drop now
+
+
+# ── /admin/models ─────────────────────────────────────────────────────────────
+
+@patch("main.running_pipeline")
+def test_swap_models_endpoint(mock_get_pipeline, client):
+    mock_get_pipeline.return_value.swap_models.return_value = {"version": "v2", "previous": "v1"}
+    response = client.post("/admin/models/v2")
+    assert response.status_code == 200
+    assert response.json()["previous"] == "v1"
+    mock_get_pipeline.return_value.swap_models.assert_called_once_with("v2")
+
+
+@patch("main.running_pipeline")
+def test_swap_models_unknown_version_is_404(mock_get_pipeline, client):
+    mock_get_pipeline.return_value.swap_models.side_effect = KeyError("Version 'v9' not found")
+    response = client.post("/admin/models/v9")
+    assert response.status_code == 404
+    assert "v9" in response.json()["detail"]
+
+
+@patch("main.running_pipeline", return_value=None)
+def test_swap_models_while_warming_up_is_503(mock_running, client):
+    assert client.post("/admin/models/v2").status_code == 503
+
+
+# ── Import side effects ───────────────────────────────────────────────────────
+
+def test_import_main_is_side_effect_free():
+    """``import main`` must not connect to the DB or import the ML frameworks."""
+    from benchmarks.import_time import _HEAVY, measure
+
+    _, modules = measure("main")   # against an unreachable database
+    assert not [name for name in _HEAVY if name in modules]
@@ -0,0 +1,212 @@
+"""
+tests/test_attendance_outbox.py
+--------------------------------
+AttendanceOutbox tests against a local stub of the Spring endpoint.
+
+The stub is a real ``http.server`` on an ephemeral port, so timeouts,
+retries and connection pooling go through the actual HTTP stack.
+"""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _StubSpring(BaseHTTPRequestHandler):
+    """Answers POSTs with the next status from ``server.statuses``."""
+
+    def do_POST(self):  # noqa: N802 — http.server naming
+        srv = self.server
+        with srv.lock:
+            srv.paths.append(self.path)
+            status = srv.statuses.pop(0) if srv.statuses else 200
+        if srv.delay:
+            time.sleep(srv.delay)
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def spring():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubSpring)
+    server.lock = threading.Lock()
+    server.paths = []
+    server.statuses = []
+    server.delay = 0.0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _outbox(spring, **kwargs):
+    from storage.attendance_outbox import AttendanceOutbox
+    from storage.cache_backend import MemoryBackend
+
+    host, port = spring.server_address
+    params = dict(timeout=1.0, max_retries=2, backoff=0.01, backend=MemoryBackend())
+    params.update(kwargs)
+    return AttendanceOutbox(
+        url_template=f"http://{host}:{port}/attendance/auto/{{student_id}}", **params
+    )
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_enqueue_delivers_and_reports(spring):
+    delivered = []
+    box = _outbox(spring)
+    try:
+        assert box.enqueue(42, "cam-a", on_delivered=delivered.append)
+        assert _wait_for(lambda: delivered == [42])
+    finally:
+        box.stop()
+
+    assert spring.paths == ["/attendance/auto/42"]
+    stats = box.stats()
+    assert stats["delivered"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_server_errors_are_retried(spring):
+    spring.statuses = [503, 500]
+    box = _outbox(spring)
+    try:
+        box.enqueue(7)
+        assert _wait_for(lambda: box.stats()["delivered"] == 1)
+    finally:
+        box.stop()
+    assert len(spring.paths) == 3
+
+
+def test_conflict_counts_as_delivered(spring):
+    spring.statuses = [409]
+    box = _outbox(spring)
+    try:
+        box.enqueue(7)
+        assert _wait_for(lambda: box.stats()["delivered"] == 1)
+    finally:
+        box.stop()
+    assert len(spring.paths) == 1
+
+
+def test_client_error_is_not_retried(spring):
+    spring.statuses = [404]
+    box = _outbox(spring)
+    try:
+        box.enqueue(7)
+        assert _wait_for(lambda: box.stats()["failed"] == 1)
+    finally:
+        box.stop()
+    assert len(spring.paths) == 1
+
+
+def test_duplicates_are_coalesced(spring):
+    """Enqueuing a student who is still pending must not POST twice."""
+    spring.delay = 0.2
+    box = _outbox(spring)
+    try:
+        assert box.enqueue(5)
+        assert not box.enqueue(5)
+        assert not box.enqueue(5)
+        assert _wait_for(lambda: box.stats()["delivered"] == 1)
+    finally:
+        box.stop()
+
+    assert spring.paths == ["/attendance/auto/5"]
+    assert box.stats()["coalesced"] == 2
+
+
+def test_coalesced_callers_are_all_notified(spring):
+    spring.delay = 0.2
+    first, second = [], []
+    box = _outbox(spring)
+    try:
+        assert box.enqueue(5, "cam-a", on_delivered=first.append)
+        assert not box.enqueue(5, "cam-b", on_delivered=second.append)
+        assert not box.enqueue(5, "cam-b", on_delivered=second.append)
+        assert _wait_for(lambda: first == [5] and second == [5])
+    finally:
+        box.stop()
+    assert len(spring.paths) == 1
+
+
+def test_failed_student_cools_down_before_a_retry(spring):
+    """Re-sightings right after a failed delivery must not bypass the backoff."""
+    spring.statuses = [404]
+    box = _outbox(spring, retry_after=0.3)
+    try:
+        box.enqueue(3)
+        assert _wait_for(lambda: box.stats()["failed"] == 1)
+        assert not box.enqueue(3)
+        assert box.stats()["retry_deferred"] == 1
+        time.sleep(0.3)
+        assert box.enqueue(3)
+        assert _wait_for(lambda: box.stats()["delivered"] == 1)
+    finally:
+        box.stop()
+    assert len(spring.paths) == 2
+
+
+def test_enqueue_never_blocks_on_slow_backend(spring):
+    spring.delay = 0.5
+    box = _outbox(spring)
+    try:
+        t0 = time.perf_counter()
+        for sid in range(20):
+            box.enqueue(sid)
+        assert time.perf_counter() - t0 < 0.1
+    finally:
+        box.stop(timeout=0.1)
+
+
+def test_workers_sharing_a_backend_report_once(spring):
+    """Two workers (outboxes) on one backend POST a student only once."""
+    from storage.cache_backend import MemoryBackend
+
+    shared = MemoryBackend()
+    first, second = _outbox(spring, backend=shared), _outbox(spring, backend=shared)
+    delivered = []
+    try:
+        first.enqueue(9)
+        assert _wait_for(lambda: first.stats()["delivered"] == 1)
+        second.enqueue(9, on_delivered=delivered.append)
+        assert _wait_for(lambda: delivered == [9])
+    finally:
+        first.stop()
+        second.stop()
+
+    assert spring.paths == ["/attendance/auto/9"]
+    assert second.stats()["shared_coalesced"] == 1
+    assert second.stats()["delivered"] == 0
+
+
+def test_failed_delivery_releases_the_claim(spring):
+    from storage.cache_backend import MemoryBackend
+
+    spring.statuses = [404]
+    shared = MemoryBackend()
+    first, second = _outbox(spring, backend=shared), _outbox(spring, backend=shared)
+    try:
+        first.enqueue(3)
+        assert _wait_for(lambda: first.stats()["failed"] == 1)
+        second.enqueue(3)
+        assert _wait_for(lambda: second.stats()["delivered"] == 1)
+    finally:
+        first.stop()
+        second.stop()
+    assert len(spring.paths) == 2
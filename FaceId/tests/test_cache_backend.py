@@ -0,0 +1,225 @@
+"""
+tests/test_cache_backend.py
+----------------------------
+Shared cache backends and cross-worker identity resolutions.
+
+Every backend test runs against the in-process backend and against
+:class:`RedisBackend` on an in-memory fake server (``fakeredis``), so
+the Redis code path is exercised without a running server.
+"""
+
+import time
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+
+def _unit(seed: int) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(512).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    from storage.cache_backend import MemoryBackend, RedisBackend
+
+    if request.param == "memory":
+        return MemoryBackend()
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisBackend(client=fakeredis.FakeRedis())
+
+
+def test_get_set_delete(backend):
+    assert backend.get("k") is None
+    backend.set("k", b"\x00\x01", ttl=10)
+    assert backend.get("k") == b"\x00\x01"
+    backend.delete("k")
+    assert backend.get("k") is None
+
+
+def test_add_is_set_if_absent(backend):
+    assert backend.add("claim", b"1", ttl=10)
+    assert not backend.add("claim", b"1", ttl=10)
+    backend.delete("claim")
+    assert backend.add("claim", b"1", ttl=10)
+
+
+def test_values_expire(backend):
+    backend.set("k", b"v", ttl=0.05)
+    time.sleep(0.1)
+    assert backend.get("k") is None
+    assert backend.add("k", b"v", ttl=10)
+
+
+def test_hash_round_trip(backend):
+    backend.hset("h", "1", b"a")
+    backend.hset("h", "2", b"b")
+    assert backend.hgetall("h") == {"1": b"a", "2": b"b"}
+    backend.hdel("h", "1")
+    assert backend.hgetall("h") == {"2": b"b"}
+
+
+def test_memory_backend_is_bounded():
+    from storage.cache_backend import MemoryBackend
+
+    backend = MemoryBackend(max_keys=2)
+    for key in ("a", "b", "c"):
+        backend.set(key, b"v", ttl=10)
+    assert backend.get("a") is None
+    assert backend.get("c") == b"v"
+
+
+def test_redis_outage_degrades_to_a_miss():
+    from storage.cache_backend import RedisBackend
+
+    client = MagicMock()
+    client.get.side_effect = ConnectionError("down")
+    client.set.side_effect = ConnectionError("down")
+    client.hgetall.side_effect = ConnectionError("down")
+    backend = RedisBackend(client=client)
+
+    assert backend.get("k") is None
+    assert backend.add("claim", b"1", ttl=10)   # never suppress work on an outage
+    assert backend.hgetall("h") == {}
+    assert backend.stats()["errors"] == 3
+
+
+def test_resolution_wire_format_is_float32():
+    from storage.shared_identity import pack_resolution, unpack_resolution
+
+    vector = _unit(0)
+    raw = pack_resolution(vector, 0.125, 0.5, 1234.5)
+    assert len(raw) == 16 + 512 * 4
+    out, d, rival, published_at = unpack_resolution(raw)
+    assert out.dtype == np.float32
+    np.testing.assert_array_equal(out, vector)
+    assert (d, rival, published_at) == (0.125, 0.5, 1234.5)
+
+
+def _far_rival(vectors, students):
+    return [0.9] * len(students)
+
+
+def test_resolutions_are_shared_between_workers(backend):
+    from storage.shared_identity import SharedIdentity
+
+    rescore = MagicMock(side_effect=lambda vectors, students: [0.18] * len(students))
+    publisher = SharedIdentity(backend=backend, threshold=0.25, ttl=60, refresh=0, rival=_far_rival)
+    reader = SharedIdentity(backend=backend, threshold=0.25, ttl=60, refresh=0, rescore=rescore)
+    face, stranger = _unit(1), _unit(2)
+
+    assert reader.lookup(face[None]) == [None]
+    publisher.publish(42, face, d=0.2)
+
+    noisy = face + 0.01 * _unit(3)
+    hit, miss = reader.lookup(np.stack([noisy, stranger]))
+    assert hit == (42, 0.18)                     # the gallery distance, not probe-to-probe
+    assert rescore.call_args.args[1] == [42]     # only the candidate is re-scored
+    assert miss is None
+    assert reader.stats()["hits"] == 1
+
+    publisher.forget(42)
+    assert reader.lookup(face[None]) == [None]
+
+
+def test_stale_resolutions_are_pruned(backend):
+    from storage.shared_identity import SharedIdentity, pack_resolution
+
+    backend.hset("resolutions", "5", pack_resolution(_unit(5), 0.1, 0.9, time.time() - 120))
+    backend.hset("resolutions", "6", b"garbage")
+    reader = SharedIdentity(backend=backend, threshold=0.25, ttl=60, refresh=0)
+
+    assert reader.lookup(_unit(5)[None]) == [None]
+    assert backend.hgetall("resolutions") == {}
+
+
+def test_disabled_shared_identity_touches_nothing():
+    from storage.shared_identity import SharedIdentity
+
+    backend = MagicMock()
+    shared = SharedIdentity(backend=backend, threshold=0)
+    assert shared.lookup(_unit(0)[None]) == [None]
+    shared.publish(1, _unit(0), 0.1)
+    backend.hset.assert_not_called()
+    backend.hgetall.assert_not_called()
+
+
+def test_hits_far_from_the_gallery_are_misses(backend):
+    from storage.shared_identity import SharedIdentity
+
+    shared = SharedIdentity(
+        backend=backend, threshold=0.25, ttl=60, refresh=0,
+        rescore=lambda vectors, students: [0.9, None][:len(students)], rival=_far_rival,
+    )
+    shared.publish(1, _unit(1), d=0.2)
+    shared.publish(2, _unit(2), d=0.2)
+    assert shared.lookup(np.stack([_unit(1), _unit(2)])) == [None, None]
+    assert shared.stats()["hits"] == 0
+
+
+def test_close_calls_go_to_the_full_search(backend):
+    """A hit is only taken while no other student can be nearer the query."""
+    from storage.shared_identity import SharedIdentity
+
+    rescore = MagicMock(side_effect=lambda vectors, students: [0.1] * len(students))
+    shared = SharedIdentity(
+        backend=backend, threshold=0.25, ttl=60, refresh=0, rescore=rescore,
+        rival=lambda vectors, students: [0.21] * len(students),   # runner-up barely farther
+    )
+    face = _unit(1)
+    shared.publish(1, face, d=0.2)
+
+    assert shared.lookup(face[None])[0] is not None              # the published vector itself
+    assert shared.lookup((face + 0.2 * _unit(3))[None]) == [None]
+    assert rescore.call_count == 1
+
+
+def test_unknown_runner_up_is_not_published(backend):
+    from storage.shared_identity import SharedIdentity
+
+    shared = SharedIdentity(
+        backend=backend, threshold=0.25, ttl=60, refresh=0,
+        rival=lambda vectors, students: [None] * len(students),
+    )
+    shared.publish(1, _unit(1), d=0.2)
+    assert shared.stats()["published"] == 0
+    assert backend.hgetall("resolutions") == {}
+
+
+def test_gallery_reload_keeps_the_fleet_resolutions(backend):
+    """Restarting one worker must not empty the hot set of the others."""
+    from storage.shared_identity import SharedIdentity
+
+    def worker():
+        return SharedIdentity(
+            backend=backend, threshold=0.25, ttl=60, refresh=0,
+            rescore=lambda vectors, students: [0.1] * len(students), rival=_far_rival,
+        )
+
+    first, second = worker(), worker()
+    first._on_gallery("load")
+    second._on_gallery("load")
+    first.publish(1, _unit(1), d=0.2)
+    assert second.lookup(_unit(1)[None])[0] is not None
+
+    second._on_gallery("load")                   # restart / reload of the same gallery
+    assert first.lookup(_unit(1)[None])[0] is not None
+    assert second.lookup(_unit(1)[None])[0] is not None
+
+
+def test_gallery_change_moves_to_a_new_hash(backend):
+    from storage.shared_identity import SharedIdentity
+
+    shared = SharedIdentity(
+        backend=backend, threshold=0.25, ttl=60, refresh=0,
+        rescore=lambda vectors, students: [0.1] * len(students), rival=_far_rival,
+    )
+    shared.publish(1, _unit(1), d=0.2)
+    assert shared.lookup(_unit(1)[None])[0] is not None
+
+    with patch("storage.shared_identity.gallery") as gallery:
+        gallery.fingerprint.return_value = (51, 999)
+        shared._on_gallery("add", 999, 7, _unit(7))
+    assert shared.lookup(_unit(1)[None]) == [None]
+    assert backend.hgetall("resolutions")        # left for workers on the old gallery
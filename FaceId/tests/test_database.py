@@ -0,0 +1,217 @@
+"""
+tests/test_database.py
+-----------------------
+pgvector index management and the EXPLAIN self-check.
+
+No PostgreSQL server is needed: DDL is checked as text, and the
+connection the index manager talks to is a mock that records every
+statement.
+"""
+
+import logging
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+_HNSW_DEF = (
+    "CREATE INDEX face_embedding_embedding_hnsw_idx ON public.face_embedding "
+    "USING hnsw (embedding vector_cosine_ops) WITH (m='16', ef_construction='64')"
+)
+
+
+def _postgres(existing=(), rows=0):
+    """Engine mock whose AUTOCOMMIT connection reports *existing* indexes."""
+    conn = MagicMock()
+    statements = []
+
+    def execute(clause):
+        sql = str(clause)
+        statements.append(" ".join(sql.split()))
+        result = MagicMock()
+        result.__iter__.return_value = iter(existing)
+        result.scalar_one.return_value = rows
+        return result
+
+    conn.execute.side_effect = execute
+    engine = MagicMock()
+    engine.dialect.name = "postgresql"
+    engine.connect.return_value.execution_options.return_value.__enter__.return_value = conn
+    return engine, statements
+
+
+def test_index_ddl_uses_cosine_ops():
+    from storage.database import index_ddl
+
+    hnsw = index_ddl("hnsw", rows=0)
+    assert "CONCURRENTLY IF NOT EXISTS face_embedding_embedding_hnsw_idx" in hnsw
+    assert "USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)" in hnsw
+    assert "WITH (lists = 50)" in index_ddl("ivfflat", rows=50_000)
+
+
+@pytest.mark.parametrize("rows, lists", [(0, 1), (50_000, 50), (4_000_000, 2000)])
+def test_ivfflat_lists_follow_table_size(rows, lists):
+    from storage.database import ivfflat_lists
+
+    assert ivfflat_lists(rows) == lists
+
+
+def test_needs_rebuild():
+    from storage.database import needs_rebuild
+
+    assert not needs_rebuild("hnsw", _HNSW_DEF, rows=10)
+    with patch("storage.database.settings.pgvector_hnsw_m", 32):
+        assert needs_rebuild("hnsw", _HNSW_DEF, rows=10)
+
+    ivf = "CREATE INDEX x ON face_embedding USING ivfflat (embedding vector_cosine_ops) WITH (lists='50')"
+    assert not needs_rebuild("ivfflat", ivf, rows=70_000)
+    assert needs_rebuild("ivfflat", ivf, rows=100_000)    # table doubled: re-cluster
+
+
+def test_ensure_vector_index_skips_other_databases():
+    from storage.database import ensure_vector_index
+
+    engine = MagicMock()
+    engine.dialect.name = "sqlite"
+    with patch("storage.database.get_engine", return_value=engine):
+        assert ensure_vector_index() is None
+    engine.connect.assert_not_called()
+
+
+def test_ensure_vector_index_creates_missing_index():
+    from storage.database import ensure_vector_index
+
+    engine, statements = _postgres(rows=1200)
+    with patch("storage.database.get_engine", return_value=engine):
+        assert ensure_vector_index() == "face_embedding_embedding_hnsw_idx"
+    assert any(s.startswith("CREATE INDEX CONCURRENTLY") for s in statements)
+    assert not any(s.startswith("DROP") for s in statements)
+
+
+def test_ensure_vector_index_keeps_a_valid_index():
+    from storage.database import ensure_vector_index
+
+    engine, statements = _postgres(
+        existing=[("face_embedding_embedding_hnsw_idx", _HNSW_DEF, True)], rows=1200
+    )
+    with patch("storage.database.get_engine", return_value=engine):
+        ensure_vector_index()
+    assert not any(s.startswith(("CREATE", "DROP")) for s in statements)
+
+
+def test_ensure_vector_index_switches_kind_and_replaces_invalid_builds():
+    from storage.database import ensure_vector_index
+
+    engine, statements = _postgres(
+        existing=[
+            ("face_embedding_embedding_hnsw_idx", _HNSW_DEF, True),
+            ("face_embedding_embedding_ivfflat_idx", "… WITH (lists='5')", False),
+        ],
+        rows=5000,
+    )
+    with (
+        patch("storage.database.get_engine", return_value=engine),
+        patch("storage.database.settings.pgvector_index", "ivfflat"),
+    ):
+        assert ensure_vector_index() == "face_embedding_embedding_ivfflat_idx"
+
+    ddl = [s.split(" ON ")[0] for s in statements if s.startswith(("CREATE", "DROP", "ALTER"))]
+    assert ddl == [
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS face_embedding_embedding_ivfflat_idx_new",
+        "DROP INDEX CONCURRENTLY IF EXISTS face_embedding_embedding_ivfflat_idx",
+        "ALTER INDEX face_embedding_embedding_ivfflat_idx_new RENAME TO face_embedding_embedding_ivfflat_idx",
+        "DROP INDEX CONCURRENTLY IF EXISTS face_embedding_embedding_hnsw_idx",
+    ]
+
+
+def test_rebuild_keeps_the_old_index_until_the_new_one_is_built():
+    from storage.database import ensure_vector_index
+
+    engine, statements = _postgres(
+        existing=[
+            ("face_embedding_embedding_hnsw_idx", _HNSW_DEF, True),
+            ("face_embedding_embedding_hnsw_idx_new", "… interrupted", False),
+        ],
+        rows=1200,
+    )
+    with (
+        patch("storage.database.get_engine", return_value=engine),
+        patch("storage.database.settings.pgvector_hnsw_m", 32),
+    ):
+        assert ensure_vector_index() == "face_embedding_embedding_hnsw_idx"
+
+    ddl = [s.split(" ON ")[0] for s in statements if s.startswith(("CREATE", "DROP", "ALTER"))]
+    assert ddl == [
+        "DROP INDEX CONCURRENTLY IF EXISTS face_embedding_embedding_hnsw_idx_new",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS face_embedding_embedding_hnsw_idx_new",
+        "DROP INDEX CONCURRENTLY IF EXISTS face_embedding_embedding_hnsw_idx",
+        "ALTER INDEX face_embedding_embedding_hnsw_idx_new RENAME TO face_embedding_embedding_hnsw_idx",
+    ]
+
+
+def test_search_params_are_set_per_connection():
+    from storage.database import _apply_search_params
+
+    dbapi_conn = MagicMock()
+    cursor = dbapi_conn.cursor.return_value
+    with patch("storage.database.settings.pgvector_ef_search", 100):
+        _apply_search_params(dbapi_conn, None)
+
+    executed = [c.args[0] for c in cursor.execute.call_args_list]
+    assert executed == ["SET hnsw.ef_search = 100", "SET ivfflat.probes = 10"]
+    dbapi_conn.commit.assert_called_once()
+
+
+# ── EXPLAIN self-check ────────────────────────────────────────────────────────
+
+_INDEX_PLAN = [{"Plan": {"Node Type": "Limit", "Plans": [
+    {"Node Type": "Index Scan", "Index Name": "face_embedding_embedding_hnsw_idx"},
+]}}]
+_SEQ_PLAN = [{"Plan": {"Node Type": "Limit", "Plans": [
+    {"Node Type": "Sort", "Plans": [{"Node Type": "Seq Scan"}]},
+]}}]
+
+
+def _check(plan, rows, count=None):
+    import storage.vector_search as vs
+
+    db = MagicMock()
+    db.execute.return_value.scalar_one.side_effect = [plan, rows, count]
+    engine = MagicMock()
+    engine.dialect.name = "postgresql"
+    with (
+        patch.object(vs, "get_engine", return_value=engine),
+        patch.object(vs, "SessionLocal", return_value=db),
+    ):
+        return vs.check_vector_index()
+
+
+def test_self_check_accepts_index_scan():
+    assert _check(_INDEX_PLAN, rows=50_000) is True
+
+
+def test_self_check_warns_on_sequential_scan(caplog):
+    with caplog.at_level(logging.WARNING, logger="storage.vector_search"):
+        assert _check(_SEQ_PLAN, rows=50_000) is False
+    assert "scans the whole table" in caplog.text
+
+
+def test_self_check_tolerates_small_tables(caplog):
+    with caplog.at_level(logging.WARNING, logger="storage.vector_search"):
+        assert _check(_SEQ_PLAN, rows=20) is False
+    assert not caplog.records
+
+
+def test_self_check_counts_rows_of_unanalysed_tables(caplog):
+    """reltuples is -1 before the first ANALYZE — exactly when the index is skipped."""
+    with caplog.at_level(logging.WARNING, logger="storage.vector_search"):
+        assert _check(_SEQ_PLAN, rows=-1, count=50_000) is False
+    assert "scans the whole table" in caplog.text
+
+
+def test_self_check_skips_other_databases():
+    import storage.vector_search as vs
+
+    engine = MagicMock()
+    engine.dialect.name = "sqlite"
+    with patch.object(vs, "get_engine", return_value=engine):
+        assert vs.check_vector_index() is None
@@ -0,0 +1,69 @@
+"""
+tests/test_decoding.py
+-----------------------
+Unit tests for WebSocket frame decoding and reduced-resolution decode.
+"""
+
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+
+
+def _jpeg(width: int, height: int) -> bytes:
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    ok, buf = cv2.imencode(".jpg", img)
+    assert ok
+    return buf.tobytes()
+
+
+def test_jpeg_size_reads_header():
+    from app.decoding import jpeg_size
+
+    assert jpeg_size(_jpeg(320, 240)) == (320, 240)
+    assert jpeg_size(b"not an image") is None
+
+
+def test_large_frame_decoded_at_reduced_size():
+    from app.decoding import decode_frame
+
+    with (
+        patch("app.decoding.settings.detection_input_size", 416),
+        patch("app.decoding.settings.decode_max_reduction", 4),
+    ):
+        frame, factor = decode_frame(_jpeg(1920, 1080))
+
+    assert factor == 4
+    assert frame.shape == (270, 480, 3)
+
+
+def test_small_frame_decoded_at_full_size():
+    from app.decoding import decode_frame
+
+    frame, factor = decode_frame(_jpeg(320, 240))
+    assert factor == 1
+    assert frame.shape == (240, 320, 3)
+
+
+def test_reduced_decode_can_be_disabled():
+    from app.decoding import decode_frame
+
+    with patch("app.decoding.settings.decode_reduced", False):
+        frame, factor = decode_frame(_jpeg(1920, 1080))
+    assert factor == 1
+    assert frame.shape == (1080, 1920, 3)
+
+
+def test_invalid_bytes_return_none():
+    from app.decoding import decode_frame
+
+    frame, _ = decode_frame(b"\x00\x01garbage")
+    assert frame is None
+
+
+def test_scale_results_restores_original_coordinates():
+    from app.decoding import scale_results
+
+    results = scale_results([{"bbox": [10, 20, 30, 40]}], 2)
+    assert results[0]["bbox"] == [20, 40, 60, 80]
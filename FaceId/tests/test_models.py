@@ -0,0 +1,85 @@
+"""
+tests/test_models.py
+---------------------
+ModelSet loading, warm-up and lease accounting with stub models.
+"""
+
+import time
+from unittest.mock import MagicMock, patch
+
+
+def _slow(seconds, model):
+    def build(version=None):
+        time.sleep(seconds)
+        return model
+    return build
+
+
+def test_load_builds_detector_and_recognizer_concurrently():
+    from ai.models import ModelSet
+
+    detector, recognizer = MagicMock(), MagicMock()
+    with (
+        patch("ai.models.registry"),
+        patch("ai.models.create_detector", _slow(0.2, detector)),
+        patch("ai.recognizer.arcface.ArcFaceRecognizer", _slow(0.2, recognizer)),
+    ):
+        t0 = time.perf_counter()
+        models = ModelSet.load("v1")
+        elapsed = time.perf_counter() - t0
+
+    assert models.detector is detector and models.recognizer is recognizer
+    assert elapsed < 0.35            # sequential loading would take 0.4 s
+
+
+def test_warm_up_covers_every_configured_batch_size():
+    from ai.models import ModelSet
+
+    models = ModelSet(MagicMock(input_size=320), MagicMock(), "v1")
+    with (
+        patch("ai.models.settings.execution_mode", "batched"),
+        patch("ai.models.settings.batch_max_frames", 4),
+    ):
+        models.warm_up()
+
+    batches = [c.args[0] for c in models.detector.detect_batch.call_args_list]
+    assert [len(b) for b in batches] == [1, 4]
+    assert batches[0][0].shape == (320, 320, 3)
+    assert [len(c.args[0]) for c in models.recognizer.rec_model.get_feat.call_args_list] == [1, 4]
+
+
+def test_warm_up_runs_the_recognition_net_past_the_landmark_step():
+    from ai.models import ModelSet
+
+    class _Recognizer:
+        """Finds no keypoints on blank crops, like SCRFD — embed_batch would stop there."""
+
+        def __init__(self):
+            self.rec_model = MagicMock()
+            self.det_model = MagicMock()
+            self.det_model.detect.return_value = (None, None)
+
+    recognizer = _Recognizer()
+    models = ModelSet(MagicMock(input_size=320), recognizer, "v1")
+    with (
+        patch("ai.models.settings.execution_mode", "staged"),
+        patch("ai.models.settings.batch_max_frames", 8),
+    ):
+        models.warm_up()
+
+    sizes = [len(c.args[0]) for c in recognizer.rec_model.get_feat.call_args_list]
+    assert sizes == [1, 8]
+    assert all(chip.shape == (112, 112, 3) for chip in recognizer.rec_model.get_feat.call_args_list[-1].args[0])
+    recognizer.det_model.detect.assert_called_once()
+
+
+def test_retired_set_is_released_with_its_last_lease():
+    from ai.models import ModelSet
+
+    models = ModelSet(MagicMock(), MagicMock(), "v1")
+    models.acquire(2)
+    models.retire()
+    models.release()
+    assert models.detector is not None
+    models.release()
+    assert models.detector is None and models.in_flight == 0
@@ -0,0 +1,171 @@
+"""
+tests/test_onnx_detector.py
+----------------------------
+Unit tests for the onnxruntime face detector and backend selection.
+
+A tiny ONNX graph with a constant YOLOv8-layout output stands in for the
+exported model, so pre/post-processing runs through a real session.
+"""
+
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from ai.detector.onnx_face import decode, letterbox, nms
+
+
+def _constant_model(path, size: int, anchors: np.ndarray, metadata=None) -> None:
+    """Write an ONNX model with input (1,3,size,size) and a constant output."""
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+
+    value = numpy_helper.from_array(anchors[None].astype(np.float32), "value")
+    graph = helper.make_graph(
+        [helper.make_node("Constant", [], ["output0"], value=value)],
+        "stub",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, [1, 3, size, size])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, list(value.dims))],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 12)])
+    model.ir_version = 8
+    helper.set_model_props(model, metadata or {})
+    onnx.save(model, str(path))
+
+
+def test_letterbox_pads_to_square():
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    blob, (ratio, (left, top)) = letterbox(frame, 160)
+    assert blob.shape == (3, 160, 160)
+    assert blob.dtype == np.float32
+    assert ratio == pytest.approx(0.5)
+    assert (left, top) == (0, 20)
+    assert blob[0, 0, 0] == pytest.approx(114 / 255)   # padding
+    assert blob[0, 80, 80] == 0.0                      # image
+
+
+def test_nms_drops_overlapping_lower_scores():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [50, 50, 60, 60]], dtype=np.float32)
+    scores = np.array([0.6, 0.9, 0.8], dtype=np.float32)
+    assert nms(boxes, scores, 0.45).tolist() == [1, 2]
+
+
+def test_decode_maps_boxes_back_to_frame():
+    # two anchors: one confident face at (80, 80) of the 160px input, one below threshold
+    pred = np.array([[80, 10], [80, 10], [40, 4], [40, 4], [0.9, 0.1]], dtype=np.float32)
+    boxes = decode(pred, ratio=0.5, pad=(0, 20), shape=(240, 320), conf_threshold=0.5)
+    assert boxes == [[120, 80, 200, 160]]
+
+
+def test_decode_ignores_keypoint_channels():
+    # one anchor, 1 class, 5 keypoints × (x, y, visibility): keypoint values are not scores
+    pred = np.array([[80], [80], [40], [40], [0.1]] + [[70.0]] * 15, dtype=np.float32)
+    assert decode(pred, 0.5, (0, 20), (240, 320), 0.5, num_classes=1) == []
+    pred[4] = 0.9
+    assert decode(pred, 0.5, (0, 20), (240, 320), 0.5, num_classes=1) == [[120, 80, 200, 160]]
+
+
+@pytest.mark.parametrize("metadata, channels, expected", [
+    ({"names": "{0: 'face'}", "kpt_shape": "[5, 3]"}, 20, 1),
+    ({"nc": "2"}, 6, 2),
+    ({"kpt_shape": "[5, 3]"}, 20, 1),
+    ({}, 5, None),
+])
+def test_class_channels_from_export_metadata(metadata, channels, expected):
+    from ai.detector.onnx_face import class_channels
+
+    assert class_channels(metadata, channels) == expected
+
+
+def test_onnx_detector_end_to_end(tmp_path):
+    pytest.importorskip("onnxruntime")
+    from ai.detector.onnx_face import ONNXFaceDetector
+
+    anchors = np.array([[80, 10], [80, 10], [40, 4], [40, 4], [0.9, 0.1]], dtype=np.float32)
+    path = tmp_path / "face.onnx"
+    _constant_model(path, 160, anchors)
+
+    det = ONNXFaceDetector(path)
+    assert det.input_size == 160
+    assert not det.dynamic_batch
+
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    assert det.detect(frame) == [[120, 80, 200, 160]]
+    assert det.detect_batch([frame, frame]) == [[[120, 80, 200, 160]]] * 2
+
+
+def test_onnx_detector_reads_pose_export_metadata(tmp_path):
+    pytest.importorskip("onnxruntime")
+    from ai.detector.onnx_face import ONNXFaceDetector
+
+    # low face score, keypoint channels full of pixel coordinates
+    anchors = np.array([[80], [80], [40], [40], [0.1]] + [[70.0]] * 15, dtype=np.float32)
+    path = tmp_path / "face-pose.onnx"
+    _constant_model(path, 160, anchors, {"names": "{0: 'face'}", "kpt_shape": "[5, 3]"})
+
+    det = ONNXFaceDetector(path)
+    assert det.num_classes == 1
+    assert det.detect(np.zeros((240, 320, 3), dtype=np.uint8)) == []
+
+
+def test_create_detector_selects_backend():
+    import ai.detector as detector_pkg
+
+    fake_registry = MagicMock()
+    fake_registry.get_model_path.return_value = "models/v1/yolo_face.onnx"
+    with (
+        patch("ai.model_registry.registry", fake_registry),
+        patch("ai.detector.onnx_face.ONNXFaceDetector") as onnx_cls,
+        patch("ai.detector.settings.device", "cpu"),
+    ):
+        assert detector_pkg.create_detector("auto") is onnx_cls.return_value
+        onnx_cls.assert_called_once_with("models/v1/yolo_face.onnx")
+
+    with pytest.raises(ValueError):
+        detector_pkg.create_detector("tensorrt")
+
+
+def test_create_detector_auto_falls_back_without_export():
+    import ai.detector as detector_pkg
+
+    fake_registry = MagicMock()
+    fake_registry.get_model_path.side_effect = FileNotFoundError("missing")
+    fake_yolo = MagicMock()
+    with (
+        patch("ai.model_registry.registry", fake_registry),
+        patch.dict(sys.modules, {"ai.detector.yolo_face": MagicMock(YOLOFaceDetector=fake_yolo)}),
+        patch("ai.detector.settings.device", "cpu"),
+    ):
+        assert detector_pkg.create_detector("auto") is fake_yolo.return_value
+        with pytest.raises(FileNotFoundError):
+            detector_pkg.create_detector("onnx")
+
+
+def test_onnx_backend_does_not_import_torch(tmp_path):
+    path = tmp_path / "face.onnx"
+    _constant_model(path, 64, np.zeros((5, 4), dtype=np.float32))
+    code = (
+        "import sys\n"
+        "import ai.pipeline\n"
+        "from ai.detector.onnx_face import ONNXFaceDetector\n"
+        f"ONNXFaceDetector({str(path)!r})\n"
+        "print('torch' in sys.modules)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, timeout=120
+    )
+    assert out.stdout.strip().splitlines()[-1] == "False"
+
+
+def test_registry_register_persists(tmp_path):
+    from ai.model_registry import ModelRegistry
+
+    (tmp_path / "v1").mkdir()
+    (tmp_path / "v1" / "yolo_face.onnx").write_bytes(b"")
+    reg = ModelRegistry(model_dir=tmp_path)
+    reg.register("yolo_face_onnx", "v1", "v1/yolo_face.onnx")
+
+    reloaded = ModelRegistry(model_dir=tmp_path)
+    assert reloaded.get_model_path("yolo_face_onnx", "v1") == tmp_path / "v1" / "yolo_face.onnx"
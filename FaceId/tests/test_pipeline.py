@@ -15,13 +15,20 @@ import pytest
 
 def _build_mock_pipeline():
     """Return a FacePipeline with all sub-components mocked."""
+    import threading
+
+    from ai.models import ModelSet
     from ai.pipeline import FacePipeline
+    from ai.session import SessionState
 
     p = FacePipeline.__new__(FacePipeline)
-    p.frame_id = 0
+    p._sessions = {}
+    p._sessions_lock = threading.Lock()
+    p._models_lock = threading.Lock()
+    p._swap_lock = threading.Lock()
+    p.models = ModelSet(detector=MagicMock(), recognizer=MagicMock(), version="v1")
 
     # Mock detector: always returns one box
-    p.detector = MagicMock()
     p.detector.detect.return_value = [[50, 60, 200, 250]]
 
     # Mock tracker: wraps box in a Track-like object
@@ -30,20 +37,40 @@ def _build_mock_pipeline():
     track = Track(track_id=1, bbox=np.array([50, 60, 200, 250]), last_seen=0.0)
     p.tracker = MagicMock()
     p.tracker.update.return_value = [track]
+    p._default_session = SessionState(tracker=p.tracker)
 
     # Mock recognizer: returns a dummy embedding
     dummy_emb = np.random.rand(512).astype(np.float32)
-    p.recognizer = MagicMock()
     p.recognizer.embed.return_value = dummy_emb
+    p.recognizer.embed_batch.side_effect = lambda crops, boxes=None: np.stack(
+        [dummy_emb] * len(crops)
+    )
+
+    # Identity cache; every due track is re-embedded unless a test opts in
+    from ai.recognizer.embedding_cache import EmbeddingCache
+
+    p.cache = EmbeddingCache(max_size=64, ttl=0, fresh=0)
+
+    # Quality gate with every check off (blank test frames would fail the blur check)
+    from ai.recognizer.quality import QualityGate
 
-    # Mock cache
-    p.cache = MagicMock()
-    p.cache.get.return_value = dummy_emb
+    p.quality = QualityGate(min_face_px=0, min_sharpness=0, min_symmetry=0)
+    from ai.recognizer.budget import EmbedBudget
+
+    p.budget = EmbedBudget(budget_ms=0)
+
+    # Cross-worker resolutions off unless a test opts in
+    from storage.cache_backend import MemoryBackend
+    from storage.shared_identity import SharedIdentity
+
+    p.shared = SharedIdentity(backend=MemoryBackend(), threshold=0)
+    p._search_lock = threading.Lock()
+    p._search_counts = {"searched": 0, "reused": 0, "unlocks": 0}
 
     return p
 
 
-@patch("ai.pipeline.cosine_search", return_value=None)
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
 @patch("ai.pipeline.estimate_pose", return_value=(5.0, 3.0, 1.0))
 @patch("ai.pipeline.compute_engagement", return_value="high")
 def test_process_returns_list(mock_eng, mock_pose, mock_search, blank_frame):
@@ -55,7 +82,7 @@ def test_process_returns_list(mock_eng, mock_pose, mock_search, blank_frame):
     assert len(results) == 1
 
 
-@patch("ai.pipeline.cosine_search", return_value=None)
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
 @patch("ai.pipeline.estimate_pose", return_value=(5.0, 3.0, 1.0))
 @patch("ai.pipeline.compute_engagement", return_value="high")
 def test_process_output_has_required_keys(mock_eng, mock_pose, mock_search, blank_frame):
@@ -66,7 +93,7 @@ def test_process_output_has_required_keys(mock_eng, mock_pose, mock_search, blan
     assert required.issubset(set(results[0].keys()))
 
 
-@patch("ai.pipeline.cosine_search", return_value=None)
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
 @patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
 @patch("ai.pipeline.compute_engagement", return_value="high")
 def test_process_returns_empty_on_no_detections(mock_eng, mock_pose, mock_search, blank_frame):
@@ -79,7 +106,7 @@ def test_process_returns_empty_on_no_detections(mock_eng, mock_pose, mock_search
     assert results == []
 
 
-@patch("ai.pipeline.cosine_search", side_effect=Exception("DB error"))
+@patch("ai.pipeline.cosine_search_many", side_effect=Exception("DB error"))
 @patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
 @patch("ai.pipeline.compute_engagement", return_value="low")
 def test_process_is_resilient_to_search_errors(mock_eng, mock_pose, mock_search, blank_frame):
@@ -88,3 +115,369 @@ def test_process_is_resilient_to_search_errors(mock_eng, mock_pose, mock_search,
     results = p.process(blank_frame)
     # Any exception inside process() is caught and logged; returns []
     assert isinstance(results, list)
+
+
+# ── Per-session state ─────────────────────────────────────────────────────────
+
+def test_sessions_have_independent_state():
+    """Each stream gets its own tracker and frame counter."""
+    p = _build_mock_pipeline()
+    a = p.open_session("cam-a")
+    b = p.open_session("cam-b")
+
+    assert a is not b
+    assert a.tracker is not b.tracker
+    assert p.open_session("cam-a") is a
+    assert p.session_count == 2
+
+    p.close_session("cam-a")
+    assert p.session_count == 1
+
+
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+def test_process_advances_only_its_own_session(mock_eng, mock_pose, mock_search, blank_frame):
+    """Processing one stream must not touch another stream's tracker."""
+    from ai.session import SessionState
+
+    p = _build_mock_pipeline()
+    a = SessionState(session_id="a", tracker=MagicMock())
+    a.tracker.update.return_value = []
+    b = SessionState(session_id="b", tracker=MagicMock())
+    b.tracker.update.return_value = []
+
+    p.process(blank_frame, a)
+    p.process(blank_frame, a)
+    p.process(blank_frame, b)
+
+    assert a.frame_id == 2
+    assert b.frame_id == 1
+    assert a.tracker.update.call_count == 2
+    assert b.tracker.update.call_count == 1
+
+
+# ── Frame-level batched search ────────────────────────────────────────────────
+
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+def test_process_resolves_all_tracks_with_one_search(mock_eng, mock_pose, blank_frame):
+    """A frame with several faces must cost exactly one search call."""
+    from ai.types import Track
+    from storage.vector_search import SearchResult
+
+    p = _build_mock_pipeline()
+    p.tracker.update.return_value = [
+        Track(
+            track_id=i,
+            bbox=np.array([10 + 60 * i, 10, 60 + 60 * i, 80]),
+            last_seen=0.0,
+            embedding=np.random.rand(512).astype(np.float32),
+        )
+        for i in range(5)
+    ]
+
+    with (
+        patch(
+            "ai.pipeline.cosine_search_many",
+            side_effect=lambda embs: [SearchResult(student_id=7, d=0.1)] * len(embs),
+        ) as mock_search,
+        patch("ai.pipeline.outbox") as mock_outbox,
+    ):
+        results = p.process(blank_frame)
+
+    assert mock_search.call_count == 1
+    assert mock_search.call_args[0][0].shape == (5, 512)
+    assert [r["student_id"] for r in results] == [7] * 5
+    assert mock_outbox.enqueue.call_count == 5  # coalesced by the outbox, never blocking
+
+
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+def test_process_embeds_due_tracks_in_one_batch(mock_eng, mock_pose, mock_search, blank_frame):
+    """All tracks due for an embedding are sent to embed_batch together."""
+    from ai.types import Track
+
+    p = _build_mock_pipeline()
+    p.tracker.update.return_value = [
+        Track(track_id=i, bbox=np.array([10 + 60 * i, 10, 60 + 60 * i, 80]),
+              last_seen=0.0, last_embed_frame=-100)
+        for i in range(4)
+    ]
+
+    p.process(blank_frame)
+
+    assert p.recognizer.embed_batch.call_count == 1
+    assert len(p.recognizer.embed_batch.call_args[0][0]) == 4
+    p.recognizer.embed.assert_not_called()
+
+
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+def test_process_skips_low_quality_crops(mock_eng, mock_pose, mock_search, face_frame):
+    """Crops failing the quality gate never reach the recognizer and stay due."""
+    from ai.recognizer.quality import QualityGate
+    from ai.types import Track
+
+    p = _build_mock_pipeline()
+    p.quality = QualityGate(min_face_px=40, min_sharpness=0, min_symmetry=0)
+    tiny = Track(track_id=1, bbox=np.array([10, 10, 30, 30]), last_seen=0.0, last_embed_frame=-100)
+    large = Track(track_id=2, bbox=np.array([100, 100, 200, 220]), last_seen=0.0,
+                  last_embed_frame=-100)
+    p.tracker.update.return_value = [tiny, large]
+
+    p.process(face_frame)
+
+    assert len(p.recognizer.embed_batch.call_args[0][0]) == 1
+    assert tiny.embedding is None and tiny.last_embed_frame == -100
+    assert large.embedding is not None
+    assert p.recognition_stats()["quality"]["skipped_by_reason"]["size"] == 1
+
+
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+def test_quality_gate_sees_the_decode_factor(mock_eng, mock_pose, mock_search, face_frame):
+    """A 20 px box on a frame decoded at half size is a 40 px face."""
+    from ai.recognizer.quality import QualityGate
+    from ai.types import Track
+
+    p = _build_mock_pipeline()
+    p.quality = QualityGate(min_face_px=40, min_sharpness=0, min_symmetry=0)
+    p.tracker.update.return_value = [
+        Track(track_id=1, bbox=np.array([10, 10, 30, 30]), last_seen=0.0, last_embed_frame=-100)
+    ]
+
+    p.process(face_frame, scale=2)
+
+    assert p.recognizer.embed_batch.call_count == 1
+    assert p.recognition_stats()["quality"]["skipped"] == 0
+
+
+# ── Fused templates ───────────────────────────────────────────────────────────
+
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+@patch("ai.pipeline.outbox")
+@patch("ai.pipeline.settings.embed_interval", 1)
+def test_template_skips_searches_and_absorbs_outliers(mock_outbox, mock_eng, mock_pose, blank_frame):
+    """A steady track is searched once; outlier embeddings only move the
+    template, which is re-searched once it drifts and stays locked."""
+    from ai.recognizer.template import cosine_distance
+    from storage.vector_search import SearchResult
+
+    enrolled = np.zeros(512, dtype=np.float32)
+    enrolled[0] = 1.0
+    outlier = np.zeros(512, dtype=np.float32)
+    outlier[1] = 1.0
+
+    p = _build_mock_pipeline()
+    stream = iter([enrolled] * 4 + [outlier] * 2)
+    p.recognizer.embed_batch.side_effect = lambda crops, boxes=None: np.stack(
+        [next(stream) for _ in crops]
+    )
+    queries = []
+
+    def search(embs):
+        queries.extend(embs)
+        return [SearchResult(student_id=7, d=cosine_distance(e, enrolled)) for e in embs]
+
+    with patch("ai.pipeline.cosine_search_many", side_effect=search) as mock_search:
+        results = [p.process(blank_frame)[0] for _ in range(6)]
+
+    assert [r["student_id"] for r in results] == [7] * 6
+    assert mock_search.call_count == 2            # first frame + once drifted by the outliers
+    assert 0.05 < cosine_distance(queries[-1], enrolled) < 0.2
+    assert p.recognition_stats()["search"] == {"searched": 2, "reused": 4, "unlocks": 0}
+
+
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+@patch("ai.pipeline.settings.embed_interval", 3)
+def test_search_rate_never_exceeds_embed_rate(mock_eng, mock_pose, mock_search, blank_frame):
+    """Frames between embedding refreshes reuse the last search result."""
+    p = _build_mock_pipeline()
+    p.recognizer.embed_batch.side_effect = lambda crops, boxes=None: np.random.rand(
+        len(crops), 512
+    ).astype(np.float32)
+
+    with patch("ai.pipeline.settings.template_drift", -1.0):   # every refresh drifts
+        for _ in range(9):
+            p.process(blank_frame)
+
+    assert p.recognizer.embed_batch.call_count == 3
+    assert mock_search.call_count == 3
+
+
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+@patch("ai.pipeline.outbox")
+@patch("ai.pipeline.settings.embed_interval", 1)
+@patch("ai.pipeline.settings.template_drift", -1.0)
+@patch("ai.pipeline.settings.sim_threshold", 0.35)
+@patch("ai.pipeline.settings.unlock_threshold", 0.45)
+def test_lock_unlock_hysteresis(mock_outbox, mock_eng, mock_pose, blank_frame):
+    """Lock within sim_threshold, hold up to unlock_threshold, then unlock."""
+    from storage.vector_search import SearchResult
+
+    p = _build_mock_pipeline()
+    answers = iter([
+        SearchResult(student_id=7, d=0.2),   # locks
+        SearchResult(student_id=7, d=0.4),   # inside the band: stays locked
+        SearchResult(student_id=7, d=0.5),   # beyond unlock_threshold: unlocks
+        SearchResult(student_id=7, d=0.3),   # locks again
+        SearchResult(student_id=9, d=0.1),   # another student: unlocks
+    ])
+    with patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [next(answers)]):
+        ids = [p.process(blank_frame)[0]["student_id"] for _ in range(5)]
+
+    assert ids == [7, 7, None, 7, None]
+    assert p.recognition_stats()["search"]["unlocks"] == 2
+
+
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+@patch("ai.pipeline.outbox")
+@patch("ai.pipeline.settings.embed_interval", 1)
+def test_fresh_cache_entries_skip_embedding(mock_outbox, mock_eng, mock_pose, blank_frame):
+    """A matched track reuses its cached embedding instead of running ArcFace."""
+    from ai.recognizer.embedding_cache import EmbeddingCache
+    from storage.vector_search import SearchResult
+
+    p = _build_mock_pipeline()
+    p.cache = EmbeddingCache(max_size=64, ttl=0, fresh=60.0)
+    search = MagicMock(side_effect=lambda embs: [SearchResult(student_id=7, d=0.1)] * len(embs))
+    with patch("ai.pipeline.cosine_search_many", search):
+        ids = [p.process(blank_frame)[0]["student_id"] for _ in range(4)]
+
+    assert ids == [7] * 4
+    assert p.recognizer.embed_batch.call_count == 1
+    assert search.call_count == 1
+    assert p.cache.stats()["embeds_saved"] == 3
+
+
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+def test_identity_cache_is_per_session(mock_eng, mock_pose, mock_search, blank_frame):
+    """Track 1 of two streams gets two cache entries; closing a stream drops its own."""
+    from ai.types import Track
+
+    p = _build_mock_pipeline()
+    sessions = []
+    for name in ("cam-a", "cam-b"):
+        s = p.open_session(name)
+        s.tracker = MagicMock()
+        s.tracker.update.return_value = [
+            Track(track_id=1, bbox=np.array([50, 60, 200, 250]), last_seen=0.0,
+                  last_embed_frame=-100)
+        ]
+        sessions.append(s)
+
+    for _ in range(3):
+        for s in sessions:
+            p.process(blank_frame, s)
+
+    assert mock_search.call_count == 2            # one search per stream, then cache hits
+    assert p.cache.stats()["hits"] == 4
+    assert p.cache.get("cam-a", 1) is not None and p.cache.get("cam-b", 1) is not None
+    p.close_session("cam-a")
+    assert p.cache.get("cam-a", 1) is None
+    assert p.cache.get("cam-b", 1) is not None
+
+
+@patch("ai.pipeline.outbox")
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+@patch("ai.pipeline.settings.embed_interval", 1)
+def test_workers_share_resolutions(mock_eng, mock_pose, mock_outbox, blank_frame):
+    """A student resolved by one worker is found by another without a gallery search."""
+    from storage.cache_backend import MemoryBackend
+    from storage.shared_identity import SharedIdentity
+    from storage.vector_search import SearchResult
+
+    backend = MemoryBackend()
+    first, second = _build_mock_pipeline(), _build_mock_pipeline()
+    second.recognizer.embed_batch.side_effect = first.recognizer.embed_batch.side_effect
+    rescore = MagicMock(side_effect=lambda vectors, students: [0.1] * len(students))
+    for p in (first, second):
+        p.shared = SharedIdentity(
+            backend=backend, threshold=0.25, refresh=0, rescore=rescore,
+            rival=lambda vectors, students: [0.9] * len(students),
+        )
+
+    search = MagicMock(side_effect=lambda embs: [SearchResult(student_id=7, d=0.1)] * len(embs))
+    with patch("ai.pipeline.cosine_search_many", search):
+        assert first.process(blank_frame)[0]["student_id"] == 7
+        assert second.process(blank_frame)[0]["student_id"] == 7
+
+    assert search.call_count == 1
+    assert rescore.call_args.args[1] == [7]      # the hit was checked against the gallery
+    assert second.recognition_stats()["search"]["searched"] == 0
+    assert second.recognition_stats()["shared"]["hits"] == 1
+
+
+# ── Cross-session batching ────────────────────────────────────────────────────
+
+@patch("ai.pipeline.cosine_search_many", side_effect=lambda embs: [None] * len(embs))
+@patch("ai.pipeline.estimate_pose", return_value=(0.0, 0.0, 0.0))
+@patch("ai.pipeline.compute_engagement", return_value="high")
+def test_process_batch_shares_model_calls(mock_eng, mock_pose, mock_search, blank_frame):
+    """Frames from several sessions cost one detect, one embed and one search."""
+    from ai.session import SessionState
+    from ai.types import Track
+
+    p = _build_mock_pipeline()
+    p.detector.detect_batch.return_value = [[[50, 60, 200, 250]]] * 3
+    sessions = []
+    for i in range(3):
+        s = SessionState(session_id=f"cam-{i}", tracker=MagicMock())
+        s.tracker.update.return_value = [
+            Track(track_id=1, bbox=np.array([50, 60, 200, 250]), last_seen=0.0,
+                  last_embed_frame=-100)
+        ]
+        sessions.append(s)
+
+    outputs = p.process_batch([blank_frame] * 3, sessions)
+
+    assert [len(o) for o in outputs] == [1, 1, 1]
+    assert p.detector.detect_batch.call_count == 1
+    p.detector.detect.assert_not_called()
+    assert p.recognizer.embed_batch.call_count == 1
+    assert len(p.recognizer.embed_batch.call_args[0][0]) == 3
+    assert mock_search.call_count == 1
+    assert all(s.frame_id == 1 for s in sessions)
+
+
+# ── Model hot-swap ────────────────────────────────────────────────────────────
+
+def test_swap_models_releases_old_set_after_in_flight_frames(blank_frame):
+    """A frame started before the swap keeps its models until it ends."""
+    from ai.models import ModelSet
+
+    p = _build_mock_pipeline()
+    old = p.models
+    new = ModelSet(detector=MagicMock(), recognizer=MagicMock(), version="v2")
+    in_flight = p._begin(blank_frame, None)
+
+    with patch("ai.pipeline.ModelSet.load", return_value=new):
+        info = p.swap_models("v2")
+
+    assert p.model_version == "v2"
+    assert info["previous"] == "v1" and info["draining_frames"] == 1
+    new.detector.detect_batch.assert_called_once()      # warmed up before the swap
+    assert in_flight.models is old and old.detector is not None
+
+    p._end(in_flight)
+    assert old.detector is None and old.recognizer is None
+    assert p._begin(blank_frame, None).models is new
+
+
+def test_swap_models_rejects_concurrent_swap():
+    p = _build_mock_pipeline()
+    p._swap_lock.acquire()
+    with pytest.raises(RuntimeError):
+        p.swap_models("v2")
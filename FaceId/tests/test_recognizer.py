@@ -60,36 +60,373 @@ def test_embed_handles_empty_crop(mock_insightface):
     assert result is None
 
 
+@patch("ai.recognizer.arcface.insightface")
+def test_rec_only_mode_skips_face_analysis(mock_insightface, face_frame):
+    """rec_only mode must run only the recognition net on a 112×112 chip."""
+    rec_mock = MagicMock()
+    rec_mock.get_feat.return_value = np.ones((1, 512), dtype=np.float32)
+    mock_insightface.utils.ensure_available.return_value = "/tmp/buffalo_l"
+    mock_insightface.model_zoo.get_model.return_value = rec_mock
+
+    from ai.recognizer.arcface import ArcFaceRecognizer
+
+    rec = ArcFaceRecognizer(mode="rec_only")
+    result = rec.embed(face_frame, box=[100, 80, 300, 330])
+
+    mock_insightface.app.FaceAnalysis.assert_not_called()
+    chip = rec_mock.get_feat.call_args[0][0]
+    assert chip.shape == (112, 112, 3)
+    assert result.shape == (512,)
+
+
+@patch("ai.recognizer.arcface.insightface")
+def test_embed_batch_chunks_by_max_batch(mock_insightface, face_frame):
+    """embed_batch() stacks chips into ceil(N / max_batch) network calls."""
+    rec_mock = MagicMock()
+    rec_mock.get_feat.side_effect = lambda chips: np.ones((len(chips), 512), dtype=np.float32)
+    mock_insightface.utils.ensure_available.return_value = "/tmp/buffalo_l"
+    mock_insightface.model_zoo.get_model.return_value = rec_mock
+
+    from ai.recognizer.arcface import ArcFaceRecognizer
+
+    rec = ArcFaceRecognizer(mode="rec_only")
+    crops = [face_frame[:100, :100]] * 5 + [np.array([])]
+    with patch("ai.recognizer.arcface.settings.arcface_max_batch", 2):
+        out = rec.embed_batch(crops)
+
+    assert out.shape == (6, 512)
+    assert rec_mock.get_feat.call_count == 3   # 5 valid chips in batches of 2
+    assert out[:5].all()
+    assert not out[5].any()                    # empty crop → zero row
+
+
+@patch("ai.recognizer.arcface.insightface")
+def test_full_mode_batches_the_recognition_net(mock_insightface, face_frame):
+    """full mode runs detection per crop but one recognition call per batch."""
+    app_mock = MagicMock()
+    app_mock.det_model.detect.side_effect = [
+        (np.ones((1, 5)), np.array([[[30, 40], [70, 40], [50, 60], [35, 80], [65, 80]]], np.float32)),
+        (np.empty((0, 5)), None),                       # no face in the second crop
+        (np.ones((1, 5)), np.array([[[30, 40], [70, 40], [50, 60], [35, 80], [65, 80]]], np.float32)),
+    ]
+    rec_mock = app_mock.models.__getitem__.return_value
+    rec_mock.get_feat.side_effect = lambda chips: np.ones((len(chips), 512), dtype=np.float32)
+    mock_insightface.app.FaceAnalysis.return_value = app_mock
+
+    from ai.recognizer.arcface import ArcFaceRecognizer
+
+    rec = ArcFaceRecognizer(mode="full")
+    out = rec.embed_batch([face_frame[:120, :120]] * 3)
+
+    app_mock.get.assert_not_called()
+    assert rec_mock.get_feat.call_count == 1
+    assert [chip.shape for chip in rec_mock.get_feat.call_args[0][0]] == [(112, 112, 3)] * 2
+    assert out[0].all() and not out[1].any() and out[2].all()
+
+
+@patch("ai.recognizer.arcface.insightface")
+def test_aligned_mode_returns_none_without_keypoints(mock_insightface, face_frame):
+    model_mock = MagicMock()
+    model_mock.detect.return_value = (np.empty((0, 5)), None)
+    mock_insightface.utils.ensure_available.return_value = "/tmp/buffalo_l"
+    mock_insightface.model_zoo.get_model.return_value = model_mock
+
+    from ai.recognizer.arcface import ArcFaceRecognizer
+
+    rec = ArcFaceRecognizer(mode="aligned")
+    assert rec.embed(face_frame) is None
+    model_mock.get_feat.assert_not_called()
+
+
+def test_unknown_mode_rejected():
+    from ai.recognizer.arcface import ArcFaceRecognizer
+
+    with pytest.raises(ValueError):
+        ArcFaceRecognizer(mode="turbo")
+
+
+def test_compare_modes_reports_agreement(dummy_embedding):
+    from ai.recognizer.validate import compare_modes
+
+    reference = MagicMock()
+    reference.embed.return_value = dummy_embedding
+    candidate = MagicMock()
+    candidate.embed.side_effect = [dummy_embedding, None]
+
+    stats = compare_modes([np.zeros((4, 4, 3)), np.zeros((4, 4, 3))], reference, candidate)
+
+    assert stats["count"] == 1
+    assert stats["missed"] == 1
+    assert stats["mean"] == pytest.approx(1.0, abs=1e-5)
+
+
+# ── QualityGate ───────────────────────────────────────────────────────────────
+
+def _drawn_face(profile: bool = False) -> np.ndarray:
+    """A crude cartoon face: frontal (symmetric) or turned to one side."""
+    import cv2
+
+    img = np.full((200, 200, 3), 90, np.uint8)
+    if profile:
+        cv2.ellipse(img, (130, 100), (45, 70), 0, 0, 360, (200, 180, 160), -1)
+        cv2.circle(img, (150, 80), 8, (20, 20, 20), -1)
+    else:
+        cv2.ellipse(img, (100, 100), (60, 80), 0, 0, 360, (200, 180, 160), -1)
+        for x in (75, 125):
+            cv2.circle(img, (x, 80), 8, (20, 20, 20), -1)
+        cv2.ellipse(img, (100, 140), (25, 8), 0, 0, 180, (40, 40, 120), 3)
+    return img
+
+
+def test_quality_gate_skips_small_blurry_and_profile_faces():
+    import cv2
+
+    from ai.recognizer.quality import QualityGate
+
+    gate = QualityGate(min_face_px=40, min_sharpness=40.0, min_symmetry=0.25)
+    box = [20, 10, 180, 190]
+    crops = [
+        _drawn_face(),
+        _drawn_face(),
+        cv2.GaussianBlur(_drawn_face(), (0, 0), 6),
+        _drawn_face(profile=True),
+    ]
+    boxes = [box, [0, 0, 30, 30], box, box]
+
+    assert [q.passed for q in gate.check(crops, boxes)] == [True, False, False, False]
+    stats = gate.stats()
+    assert stats["checked"] == 4 and stats["skipped"] == 3
+    assert stats["skipped_by_reason"] == {"size": 1, "blur": 1, "pose": 1}
+
+
+def test_quality_gate_measures_faces_in_client_pixels():
+    """A 60 px face in a 1080p JPEG is 30 px after the reduced decode."""
+    import cv2
+
+    from ai.recognizer.quality import QualityGate
+    from app.decoding import decode_frame
+
+    client = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    client[500:560, 900:960] = cv2.resize(_drawn_face(), (60, 60))
+    ok, jpeg = cv2.imencode(".jpg", client)
+    assert ok
+
+    frame, factor = decode_frame(jpeg.tobytes())
+    assert factor == 2
+    box = [900 // factor, 500 // factor, 960 // factor, 560 // factor]
+
+    gate = QualityGate(min_face_px=40, min_sharpness=0, min_symmetry=0)
+    (quality,) = gate.check([frame], [box], [factor])
+    assert quality.passed and quality.size == 60
+    assert not gate.check([frame], [box])[0].passed   # the decoded size alone is too small
+
+
+def test_quality_gate_with_zero_thresholds_passes_everything(blank_frame):
+    from ai.recognizer.quality import QualityGate
+
+    gate = QualityGate(min_face_px=0, min_sharpness=0, min_symmetry=0)
+    assert gate.check([blank_frame], [[0, 0, 5, 5]])[0].passed
+    assert gate.stats()["checked"] == 0
+
+
+# ── EmbeddingTemplate ─────────────────────────────────────────────────────────
+
+def test_template_is_weighted_mean_of_recent_embeddings():
+    from ai.recognizer.template import EmbeddingTemplate
+
+    template = EmbeddingTemplate(size=2)
+    assert template.vector is None
+
+    template.add(np.array([2.0, 0.0]), weight=1.0)
+    template.add(np.array([0.0, 5.0]), weight=3.0)
+    assert np.allclose(template.vector, np.array([1.0, 3.0]) / np.sqrt(10))
+
+    template.add(np.array([0.0, 1.0]))   # pushes out the first sample
+    assert len(template) == 2
+    assert np.allclose(template.vector, [0.0, 1.0])
+
+
+# ── EmbedBudget ───────────────────────────────────────────────────────────────
+
+@patch("ai.recognizer.budget.settings.embed_interval", 3)
+def test_embed_budget_caps_crowded_frames_and_bounds_staleness():
+    """50 tracks due at once: each frame embeds ~budget worth, and every
+    track is still refreshed within embed_interval + max_defer frames."""
+    from ai.recognizer.budget import EmbedBudget
+    from ai.types import Track
+
+    budget = EmbedBudget(budget_ms=20, max_defer=15)
+    budget.record(crops=1, seconds=0.004)            # 4 ms per crop → 5 per frame
+    tracks = [Track(track_id=i, bbox=np.zeros(4), last_seen=0.0) for i in range(50)]
+    tracks[7].locked_id = 3
+    tracks[7].embedding = np.ones(512, np.float32)
+    tracks[7].last_embed_frame = 0
+
+    refreshed: dict[int, list[int]] = {i: [] for i in range(50)}
+    per_frame = []
+    for frame in range(1, 61):
+        due = [t for t in tracks if frame - t.last_embed_frame >= 3]
+        chosen = budget.select(due, [frame] * len(due))
+        per_frame.append(len(chosen))
+        for i in chosen:
+            due[i].last_embed_frame = frame
+            due[i].embedding = np.ones(512, np.float32)
+            refreshed[due[i].track_id].append(frame)
+
+    assert refreshed[7][0] > 1                        # locked track waits behind new ones
+    assert max(per_frame[:10]) == 5                   # first frames: exactly the budget
+    for frames in refreshed.values():
+        gaps = np.diff([0, *frames])
+        assert gaps.max() <= 3 + 15
+    stats = budget.stats()
+    assert stats["deferred"] > 0 and stats["crop_ms"] == pytest.approx(4.0)
+
+
+def test_embed_budget_holds_for_new_tracks_late_in_a_session():
+    """Never-embedded tracks go first but stay within capacity, however
+    far the session's frame counter is from their default embed frame."""
+    from ai.recognizer.budget import EmbedBudget
+    from ai.types import Track
+
+    budget = EmbedBudget(budget_ms=24, max_defer=15)
+    budget.record(crops=1, seconds=0.004)            # 4 ms per crop → 6 per frame
+    tracks = [Track(track_id=i, bbox=np.zeros(4), last_seen=0.0) for i in range(50)]
+    tracks[0].embedding = np.ones(512, np.float32)
+    tracks[0].locked_id = 3
+
+    chosen = budget.select(tracks, [500] * len(tracks))
+    assert len(chosen) == budget.capacity() == 6
+    assert 0 not in chosen                           # new faces before the locked one
+    assert budget.stats()["forced"] == 0
+    assert tracks[0].deferred_since == 500 and tracks[chosen[0]].deferred_since is None
+
+
+def test_embed_budget_unlimited_until_first_timing():
+    from ai.recognizer.budget import EmbedBudget
+    from ai.types import Track
+
+    budget = EmbedBudget(budget_ms=1, max_defer=5)
+    tracks = [Track(track_id=i, bbox=np.zeros(4), last_seen=0.0) for i in range(10)]
+    assert budget.select(tracks, [1] * 10) == list(range(10))
+
+
 # ── EmbeddingCache ────────────────────────────────────────────────────────────
 
-def test_cache_set_and_get(dummy_embedding):
+def _store(cache, session_id, track_id, embedding, student_id=1, embed_frame=3):
+    from storage.vector_search import SearchResult
+
+    cache.store(session_id, track_id, embedding, embedding,
+                SearchResult(student_id=student_id, d=0.1), embed_frame)
+
+
+def test_cache_store_and_get(dummy_embedding):
     from ai.recognizer.embedding_cache import EmbeddingCache
 
-    cache = EmbeddingCache()
-    cache.set(1, dummy_embedding)
-    result = cache.get(1)
+    cache = EmbeddingCache(max_size=8, ttl=0)
+    _store(cache, "cam-a", 1, dummy_embedding)
+    entry = cache.get("cam-a", 1)
 
-    assert result is not None
-    assert np.allclose(result, dummy_embedding)
+    assert entry is not None
+    assert np.allclose(entry.embedding, dummy_embedding)
+    assert entry.match.student_id == 1 and entry.embed_frame == 3
+
+    cache.touch("cam-a", 1, dummy_embedding, embed_frame=6)
+    assert cache.get("cam-a", 1).embed_frame == 6
+
+
+def test_cache_is_scoped_by_session(dummy_embedding):
+    """Track IDs restart per tracker, so (session, track) must not collide."""
+    from ai.recognizer.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_size=8, ttl=0)
+    _store(cache, "cam-a", 1, dummy_embedding, student_id=10)
+    _store(cache, "cam-b", 1, dummy_embedding, student_id=20)
+
+    assert cache.get("cam-a", 1).match.student_id == 10
+    assert cache.get("cam-b", 1).match.student_id == 20
+    assert cache.drop_session("cam-a") == 1
+    assert cache.get("cam-a", 1) is None
+    assert cache.get("cam-b", 1) is not None
 
 
 def test_cache_get_missing_returns_none():
     from ai.recognizer.embedding_cache import EmbeddingCache
 
-    cache = EmbeddingCache()
-    assert cache.get(999) is None
+    cache = EmbeddingCache(max_size=8, ttl=0)
+    assert cache.get("cam-a", 999) is None
+    assert cache.stats()["misses"] == 1
 
 
 def test_cache_lru_eviction(dummy_embedding):
     """Oldest entries should be evicted when max_size is exceeded."""
     from ai.recognizer.embedding_cache import EmbeddingCache
 
-    cache = EmbeddingCache(max_size=2)
-    cache.set(1, dummy_embedding)
-    cache.set(2, dummy_embedding)
-    cache.set(3, dummy_embedding)  # evicts track_id=1
+    cache = EmbeddingCache(max_size=2, ttl=0)
+    _store(cache, "s", 1, dummy_embedding)
+    _store(cache, "s", 2, dummy_embedding)
+    _store(cache, "s", 3, dummy_embedding)  # evicts track_id=1
 
-    assert cache.get(1) is None   # evicted
-    assert cache.get(2) is not None
-    assert cache.get(3) is not None
+    assert cache.get("s", 1) is None   # evicted
+    assert cache.get("s", 2) is not None
+    assert cache.get("s", 3) is not None
     assert len(cache) == 2
+    assert cache.stats() == {
+        "size": 2, "hits": 2, "misses": 1, "evictions": 1, "expirations": 0,
+        "embeds_saved": 0, "hit_rate": 0.6667,
+    }
+
+
+def test_cache_entries_expire_after_ttl(dummy_embedding):
+    from ai.recognizer.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_size=8, ttl=30.0)
+    with patch("ai.recognizer.embedding_cache.time.monotonic", return_value=100.0):
+        _store(cache, "s", 1, dummy_embedding)
+    with patch("ai.recognizer.embedding_cache.time.monotonic", return_value=129.0):
+        assert cache.get("s", 1) is not None
+    with patch("ai.recognizer.embedding_cache.time.monotonic", return_value=131.0):
+        assert cache.get("s", 1) is None
+    assert cache.stats()["expirations"] == 1 and len(cache) == 0
+
+
+def test_cache_reuses_only_fresh_confident_embeddings(dummy_embedding):
+    from ai.recognizer.embedding_cache import EmbeddingCache
+    from storage.vector_search import SearchResult
+
+    cache = EmbeddingCache(max_size=8, ttl=0, fresh=1.0)
+    with patch("ai.recognizer.embedding_cache.time.monotonic", return_value=100.0):
+        _store(cache, "s", 1, dummy_embedding)
+        cache.store("s", 2, dummy_embedding, dummy_embedding, SearchResult(student_id=1, d=0.9), 3)
+        cache.store("s", 3, dummy_embedding, dummy_embedding, None, 3)
+    with patch("ai.recognizer.embedding_cache.time.monotonic", return_value=100.5):
+        assert cache.reuse_embedding("s", 1, embed_frame=4) is dummy_embedding
+        assert cache.reuse_embedding("s", 2, embed_frame=4) is None   # not a match
+        assert cache.reuse_embedding("s", 3, embed_frame=4) is None   # unknown face
+    assert cache.get("s", 1).embed_frame == 4
+    with patch("ai.recognizer.embedding_cache.time.monotonic", return_value=101.5):
+        assert cache.reuse_embedding("s", 1, embed_frame=5) is None   # window passed
+    assert cache.stats()["embeds_saved"] == 1
+
+
+def test_cache_is_thread_safe(dummy_embedding):
+    import threading
+
+    from ai.recognizer.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache(max_size=50, ttl=0)
+
+    def worker(session_id):
+        for track_id in range(200):
+            _store(cache, session_id, track_id, dummy_embedding)
+            cache.get(session_id, track_id - 1)
+
+    threads = [threading.Thread(target=worker, args=(f"cam-{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stats = cache.stats()
+    assert len(cache) == 50
+    assert stats["hits"] + stats["misses"] == 8 * 200
+    assert stats["evictions"] == 8 * 200 - 50
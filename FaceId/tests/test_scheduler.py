@@ -0,0 +1,138 @@
+"""
+tests/test_scheduler.py
+------------------------
+InferenceScheduler tests with a mock pipeline.
+"""
+
+import threading
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+
+def _pipeline(delay: float = 0.0):
+    """Mock whose process_batch echoes the session id of every frame."""
+    p = MagicMock()
+
+    def process_batch(frames, sessions, scales=None):
+        time.sleep(delay)
+        return [[{"session": s.session_id, "frame": int(f[0, 0, 0])}] for f, s in zip(frames, sessions)]
+
+    p.process_batch.side_effect = process_batch
+    return p
+
+
+def _frame(value: int) -> np.ndarray:
+    return np.full((4, 4, 3), value, dtype=np.uint8)
+
+
+@pytest.fixture()
+def scheduler():
+    from ai.scheduler import InferenceScheduler
+
+    created = []
+
+    def make(pipeline, **kwargs):
+        s = InferenceScheduler(pipeline, **kwargs)
+        s.start()
+        created.append(s)
+        return s
+
+    yield make
+    for s in created:
+        s.stop()
+
+
+def test_frames_from_many_sessions_share_a_batch(scheduler):
+    from ai.session import SessionState
+
+    pipeline = _pipeline()
+    sched = scheduler(pipeline, window_ms=50, max_batch=8)
+    sessions = [SessionState(session_id=f"cam-{i}") for i in range(4)]
+
+    futures = [sched.submit(_frame(i), s) for i, s in enumerate(sessions)]
+    results = [f.result(timeout=2) for f in futures]
+
+    assert pipeline.process_batch.call_count == 1
+    assert [r[0]["session"] for r in results] == ["cam-0", "cam-1", "cam-2", "cam-3"]
+    assert sched.stats()["avg_batch"] == 4
+
+
+def test_one_frame_per_session_per_batch(scheduler):
+    """A session's second frame waits for the next batch, keeping order."""
+    from ai.session import SessionState
+
+    pipeline = _pipeline()
+    sched = scheduler(pipeline, window_ms=50, max_batch=8)
+    a, b = SessionState(session_id="a"), SessionState(session_id="b")
+
+    futures = [sched.submit(_frame(1), a), sched.submit(_frame(2), a), sched.submit(_frame(3), b)]
+    results = [f.result(timeout=2) for f in futures]
+
+    assert [r[0]["frame"] for r in results] == [1, 2, 3]
+    for frames, sessions, _ in (c.args for c in pipeline.process_batch.call_args_list):
+        assert len({id(s) for s in sessions}) == len(sessions)
+    assert pipeline.process_batch.call_count == 2
+
+
+def test_max_batch_caps_batch_size(scheduler):
+    from ai.session import SessionState
+
+    pipeline = _pipeline()
+    sched = scheduler(pipeline, window_ms=50, max_batch=2)
+    futures = [sched.submit(_frame(i), SessionState(session_id=str(i))) for i in range(5)]
+    for f in futures:
+        f.result(timeout=2)
+
+    sizes = [len(c.args[0]) for c in pipeline.process_batch.call_args_list]
+    assert max(sizes) <= 2
+    assert sum(sizes) == 5
+
+
+def test_pipeline_error_fails_only_that_batch(scheduler):
+    from ai.session import SessionState
+
+    pipeline = _pipeline()
+    pipeline.process_batch.side_effect = [RuntimeError("boom"), [[{"ok": True}]]]
+    sched = scheduler(pipeline, window_ms=0)
+    state = SessionState()
+
+    with pytest.raises(RuntimeError):
+        sched.process(_frame(0), state)
+    assert sched.process(_frame(0), state) == [{"ok": True}]
+
+
+def test_stop_fails_pending_requests():
+    from ai.scheduler import InferenceScheduler
+    from ai.session import SessionState
+
+    started = threading.Event()
+    release = threading.Event()
+    pipeline = MagicMock()
+
+    def slow(frames, sessions, scales):
+        started.set()
+        release.wait(2)
+        return [[] for _ in frames]
+
+    pipeline.process_batch.side_effect = slow
+    sched = InferenceScheduler(pipeline, window_ms=0, max_batch=1)
+    sched.start()
+    state = SessionState()
+    first = sched.submit(_frame(0), state)
+    started.wait(2)
+    pending = sched.submit(_frame(1), state)
+
+    stopper = threading.Thread(target=sched.stop)
+    stopper.start()
+    while sched._running:
+        time.sleep(0.01)
+    release.set()
+    stopper.join(2)
+    assert first.result(timeout=1) == []
+    with pytest.raises(RuntimeError):
+        pending.result(timeout=1)
+    with pytest.raises(RuntimeError):
+        sched.submit(_frame(2), state)
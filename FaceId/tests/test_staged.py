@@ -0,0 +1,214 @@
+"""
+tests/test_staged.py
+---------------------
+StagedExecutor tests with a fake pipeline whose stages just sleep.
+"""
+
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+class _FakePipeline:
+    """Implements the stage hooks StagedExecutor calls, with fixed costs."""
+
+    def __init__(self, detect=0.0, recognise=0.0, behave=lambda: 0.0):
+        self.cost = {"detect": detect, "recognise": recognise}
+        self.behave_cost = behave
+        self.active = {"detect": 0, "recognise": 0}
+        self.overlap = False
+        self.lock = threading.Lock()
+        self.models = SimpleNamespace(
+            detector=SimpleNamespace(detect_batch=self._detect_batch), release=self._release
+        )
+        self.leases = 0
+        self.recognise_batches = []
+        self.fail_on = None
+        self.fail_begin_on = None
+
+    def _busy(self, stage):
+        with self.lock:
+            self.active[stage] += 1
+            if all(self.active.values()):
+                self.overlap = True
+        time.sleep(self.cost[stage])
+        with self.lock:
+            self.active[stage] -= 1
+
+    def _lease(self, count=1):
+        with self.lock:
+            self.leases += count
+        return self.models
+
+    def _release(self, count=1):
+        with self.lock:
+            self.leases -= count
+
+    def _begin(self, frame, state, models, scale=1):
+        if self.fail_begin_on is not None and int(frame[0, 0, 0]) == self.fail_begin_on:
+            raise RuntimeError("bad frame")
+        state.frame_id += 1
+        return SimpleNamespace(state=state, frame=frame, timings={}, log_prefix="", output=None)
+
+    def _end(self, work):
+        with self.lock:
+            self.leases -= 1
+
+    def _detect_batch(self, frames):
+        self._busy("detect")
+        return [[] for _ in frames]
+
+    def _track(self, work, detections):
+        work.timings["track"] = 0.0
+
+    def _recognise(self, works):
+        self.recognise_batches.append(len(works))
+        self._busy("recognise")
+
+    def _identify(self, work):
+        work.output = [{"session": work.state.session_id, "frame": int(work.frame[0, 0, 0])}]
+
+    def _behave(self, work):
+        if self.fail_on is not None and int(work.frame[0, 0, 0]) == self.fail_on:
+            raise RuntimeError("pose failure")
+        time.sleep(self.behave_cost())
+        return work.output
+
+
+def _frame(value):
+    return np.full((2, 2, 3), value, dtype=np.uint8)
+
+
+@pytest.fixture()
+def staged():
+    from ai.staged import StagedExecutor
+
+    created = []
+
+    def make(pipeline, **kwargs):
+        ex = StagedExecutor(pipeline, **kwargs)
+        ex.start()
+        created.append(ex)
+        return ex
+
+    yield make
+    for ex in created:
+        ex.stop()
+
+
+def test_results_are_released_in_session_order(staged):
+    """Parallel behaviour workers finish out of order; results must not."""
+    from ai.session import SessionState
+
+    rng = random.Random(0)
+    pipeline = _FakePipeline(behave=lambda: rng.uniform(0, 0.01))
+    ex = staged(pipeline, behaviour_workers=4)
+    a, b = SessionState(session_id="a"), SessionState(session_id="b")
+
+    released = []
+    futures = []
+    for i in range(30):
+        state = a if i % 2 else b
+        f = ex.submit(_frame(i), state)
+        f.add_done_callback(lambda f: released.append(f.result()[0]))
+        futures.append(f)
+    for f in futures:
+        f.result(timeout=5)
+
+    for sid in ("a", "b"):
+        frames = [r["frame"] for r in released if r["session"] == sid]
+        assert frames == sorted(frames)
+    assert a.frame_id == b.frame_id == 15
+
+
+def test_detection_overlaps_recognition(staged):
+    from ai.session import SessionState
+
+    pipeline = _FakePipeline(detect=0.02, recognise=0.02)
+    ex = staged(pipeline)
+    state = SessionState()
+    futures = []
+    for i in range(6):            # a camera delivering frames every 15 ms
+        futures.append(ex.submit(_frame(i), state))
+        time.sleep(0.015)
+    for f in futures:
+        f.result(timeout=5)
+
+    assert pipeline.overlap
+
+
+def test_stats_report_every_stage(staged):
+    from ai.session import SessionState
+
+    ex = staged(_FakePipeline(detect=0.001))
+    ex.process(_frame(0), SessionState())
+
+    stats = ex.stats()
+    assert stats["completed"] == 1
+    assert set(stats["stages"]) == {"detect", "recognise", "behaviour"}
+    assert all(s["frames"] == 1 for s in stats["stages"].values())
+    assert stats["stages"]["detect"]["queue_depth"] == 0
+
+
+def test_failed_frame_resolves_empty_without_blocking_later_frames(staged):
+    from ai.session import SessionState
+
+    pipeline = _FakePipeline()
+    pipeline.fail_on = 1
+    ex = staged(pipeline)
+    state = SessionState()
+    futures = [ex.submit(_frame(i), state) for i in range(3)]
+
+    assert [f.result(timeout=5) for f in futures] == [
+        [{"session": "", "frame": 0}],
+        [],
+        [{"session": "", "frame": 2}],
+    ]
+    assert pipeline.leases == 0   # every model lease returned, failed frame included
+
+
+def test_detect_failure_returns_leases_of_unopened_frames(staged):
+    from ai.session import SessionState
+
+    pipeline = _FakePipeline(detect=0.02)
+    pipeline.fail_begin_on = 1
+    ex = staged(pipeline)
+    state = SessionState()
+    futures = [ex.submit(_frame(i), state) for i in range(6)]
+    for f in futures:
+        f.result(timeout=5)
+
+    assert futures[1].result() == []
+    assert pipeline.leases == 0
+
+
+def test_stop_drains_submitted_frames():
+    from ai.session import SessionState
+    from ai.staged import StagedExecutor
+
+    ex = StagedExecutor(_FakePipeline(detect=0.005), queue_size=16)
+    ex.start()
+    state = SessionState()
+    futures = [ex.submit(_frame(i), state) for i in range(5)]
+    ex.stop()
+
+    assert all(f.done() for f in futures)
+    with pytest.raises(RuntimeError):
+        ex.submit(_frame(9), state)
+
+
+def test_backed_up_stage_batches_waiting_frames(staged):
+    from ai.session import SessionState
+
+    pipeline = _FakePipeline(detect=0.01, recognise=0.03)
+    ex = staged(pipeline)
+    futures = [ex.submit(_frame(i), SessionState(session_id=str(i))) for i in range(8)]
+    for f in futures:
+        f.result(timeout=5)
+
+    assert max(pipeline.recognise_batches) > 1
+    assert sum(pipeline.recognise_batches) == 8
@@ -0,0 +1,111 @@
+"""
+tests/test_tracker.py
+----------------------
+Unit tests for the Kalman filter and BoTSORT lost-track handling.
+"""
+
+import numpy as np
+import pytest
+
+
+# ── KalmanFilter ──────────────────────────────────────────────────────────────
+
+def test_kalman_roundtrip_box():
+    from ai.tracker.kalman import xyah_to_xyxy, xyxy_to_xyah
+
+    box = [50.0, 60.0, 200.0, 250.0]
+    assert np.allclose(xyah_to_xyxy(xyxy_to_xyah(box)), box)
+
+
+def test_kalman_learns_constant_velocity():
+    """After a few updates the prediction should lead the last measurement."""
+    from ai.tracker.kalman import KalmanFilter, xyah_to_xyxy
+
+    kf = KalmanFilter()
+    mean, cov = kf.initiate([0, 0, 100, 100])
+    for step in range(1, 10):
+        mean, cov = kf.predict(mean, cov)
+        mean, cov = kf.update(mean, cov, [10 * step, 0, 100 + 10 * step, 100])
+
+    mean, cov = kf.predict(mean, cov)
+    predicted = xyah_to_xyxy(mean)
+    assert predicted[0] == pytest.approx(100, abs=5)  # moving 10 px / frame
+
+
+# ── BoTSORT ───────────────────────────────────────────────────────────────────
+
+def test_track_survives_missed_detection():
+    """A one-frame occlusion must not create a new track or drop the embedding."""
+    from ai.tracker.bot_sort import BoTSORT
+
+    tracker = BoTSORT(track_buffer=5)
+    (t,) = tracker.update([[50, 60, 200, 250]])
+    t.embedding = np.ones(512, dtype=np.float32)
+    t.last_embed_frame = 1
+
+    assert tracker.update([]) == []            # occluded → lost, not returned
+    (revived,) = tracker.update([[52, 61, 202, 251]])
+
+    assert revived.track_id == t.track_id
+    assert revived.embedding is not None
+    assert revived.last_embed_frame == 1
+
+
+def test_lost_track_dropped_after_buffer():
+    from ai.tracker.bot_sort import BoTSORT
+
+    tracker = BoTSORT(track_buffer=2)
+    (t,) = tracker.update([[50, 60, 200, 250]])
+    for _ in range(3):
+        tracker.update([])
+
+    (new,) = tracker.update([[50, 60, 200, 250]])
+    assert new.track_id != t.track_id
+
+
+def test_distant_detection_starts_new_track():
+    """Detections far from every predicted box must not steal an existing ID."""
+    from ai.tracker.bot_sort import BoTSORT
+
+    tracker = BoTSORT()
+    (a,) = tracker.update([[0, 0, 50, 50]])
+    tracks = tracker.update([[400, 400, 450, 450]])
+
+    assert [t.track_id for t in tracks] == [a.track_id + 1]
+
+
+# ── Matching ──────────────────────────────────────────────────────────────────
+
+def test_iou_matrix_matches_scalar_iou():
+    from ai.tracker.matching import iou, iou_matrix
+
+    rng = np.random.default_rng(1)
+    xy = rng.uniform(0, 300, (12, 2))
+    boxes = np.hstack([xy, xy + rng.uniform(10, 80, (12, 2))])
+    a, b = boxes[:5], boxes[5:]
+
+    expected = np.array([[iou(x, y) for y in b] for x in a])
+    assert np.allclose(iou_matrix(a, b), expected)
+
+
+def test_associate_gates_low_iou_pairs():
+    from types import SimpleNamespace
+
+    from ai.tracker.matching import associate
+
+    tracks = [SimpleNamespace(bbox=[0, 0, 100, 100])]
+    rows, cols = associate(tracks, [[90, 90, 190, 190]], min_iou=0.3)
+    assert len(rows) == len(cols) == 0
+
+
+def test_associate_resolves_ambiguous_pairs():
+    """Overlapping candidates fall through to the Hungarian solver."""
+    from types import SimpleNamespace
+
+    from ai.tracker.matching import associate
+
+    tracks = [SimpleNamespace(bbox=[0, 0, 100, 100]), SimpleNamespace(bbox=[30, 0, 130, 100])]
+    detections = [[32, 0, 132, 100], [2, 0, 102, 100]]
+    rows, cols = associate(tracks, detections, min_iou=0.1)
+
+    assert dict(zip(rows.tolist(), cols.tolist())) == {0: 1, 1: 0}
@@ -0,0 +1,413 @@
+"""
+tests/test_vector_search.py
+----------------------------
+Unit tests for the in-memory gallery index and cosine_search routing.
+
+No database is touched: the gallery is loaded from plain records and the
+pgvector path is patched out.
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+
+def _records(n: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "face_id": i + 1,
+            "student_id": 100 + i,
+            "embedding": rng.standard_normal(512).astype(np.float32),
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture()
+def gallery():
+    from storage.vector_search import GalleryIndex
+
+    g = GalleryIndex()
+    g.load(_records(50))
+    return g
+
+
+# ── GalleryIndex ──────────────────────────────────────────────────────────────
+
+def test_gallery_matches_brute_force(gallery):
+    """Gallery search must agree with a naive cosine loop."""
+    records = _records(50)
+    query = np.random.default_rng(7).standard_normal(512).astype(np.float32)
+
+    def cos_d(a, b):
+        return 1.0 - float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
+
+    expected = min(records, key=lambda r: cos_d(query, r["embedding"]))
+    result = gallery.search(query)
+
+    assert result.student_id == expected["student_id"]
+    assert result.d == pytest.approx(cos_d(query, expected["embedding"]), abs=1e-5)
+
+
+def test_gallery_notifies_listeners(gallery):
+    events = []
+    gallery.add_listener(lambda event, *args: events.append((event, args[:2])))
+
+    gallery.add(999, 7, np.ones(512, dtype=np.float32))
+    gallery.remove_student(7)
+    gallery.remove_student(12345)          # nothing removed → no event
+    gallery.load(_records(3))
+
+    assert events == [("add", (999, 7)), ("remove", (7,)), ("load", ())]
+
+
+def test_gallery_exact_vector_has_zero_distance(gallery):
+    rec = _records(50)[10]
+    result = gallery.search(rec["embedding"] * 3.0)  # scale must not matter
+    assert result.student_id == rec["student_id"]
+    assert result.d == pytest.approx(0.0, abs=1e-5)
+
+
+def test_gallery_add_and_remove(gallery):
+    vec = np.ones(512, dtype=np.float32)
+    gallery.add(999, 7, vec)
+    assert len(gallery) == 51
+    assert gallery.search(vec).student_id == 7
+
+    assert gallery.remove_student(7) == 1
+    assert len(gallery) == 50
+    assert gallery.search(vec).student_id != 7
+
+
+def test_gallery_search_many_matches_single(gallery):
+    queries = np.random.default_rng(3).standard_normal((8, 512)).astype(np.float32)
+    batched = gallery.search_many(queries)
+    single = [gallery.search(q) for q in queries]
+
+    assert [r.student_id for r in batched] == [r.student_id for r in single]
+    assert [r.d for r in batched] == pytest.approx([r.d for r in single], abs=1e-5)
+
+
+def test_searches_during_writes_see_consistent_states():
+    """A search racing add / remove_student must never pair the rows of
+    one state with the labels or students of another."""
+    import threading
+
+    from storage.vector_search import GalleryIndex
+
+    churn, stable = _records(10, seed=1), _records(40)
+    for r in churn:
+        r["face_id"] += 1000
+        r["student_id"] += 1000
+    gallery = GalleryIndex(kind="flat")
+    gallery.load(churn + stable)   # churn rows first: removing one shifts every stable row
+    queries = np.stack([r["embedding"] for r in stable])
+    expected = [r["student_id"] for r in stable]
+    stop = threading.Event()
+
+    def write():
+        k = 0
+        while not stop.is_set():
+            r = churn[k % len(churn)]
+            gallery.remove_student(r["student_id"])
+            gallery.add(r["face_id"], r["student_id"], r["embedding"])
+            k += 1
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(200):
+            assert [r.student_id for r in gallery.search_many(queries)] == expected
+    finally:
+        stop.set()
+        writer.join()
+
+
+def test_empty_gallery_returns_none():
+    from storage.vector_search import GalleryIndex
+
+    g = GalleryIndex()
+    g.load([])
+    assert g.loaded
+    assert g.search(np.ones(512, dtype=np.float32)) is None
+    assert g.search_many(np.ones((2, 512), dtype=np.float32)) == [None, None]
+
+
+# ── Index backends and persistence ────────────────────────────────────────────
+
+@pytest.fixture(params=["flat", "hnsw", "ivf"])
+def kind(request):
+    pytest.importorskip({"hnsw": "hnswlib", "ivf": "faiss"}.get(request.param, "numpy"))
+    return request.param
+
+
+def test_index_backends_agree_with_exact_search(kind):
+    """On a small gallery every backend must find the exact nearest neighbour."""
+    from storage.vector_search import GalleryIndex
+
+    exact, approx = GalleryIndex("flat"), GalleryIndex(kind)
+    records = _records(300)
+    exact.load(records)
+    approx.load(records)
+    queries = np.stack([r["embedding"] for r in records[::10]])
+    queries += 0.1 * np.random.default_rng(5).standard_normal(queries.shape).astype(np.float32)
+
+    want, got = exact.search_many(queries), approx.search_many(queries)
+    assert [r.student_id for r in got] == [r.student_id for r in want]
+    assert [r.d for r in got] == pytest.approx([r.d for r in want], abs=1e-4)
+
+
+def test_ivf_index_trains_and_survives_a_save(tmp_path):
+    """Big enough galleries get trained inverted lists; probing all lists is exact."""
+    faiss = pytest.importorskip("faiss")
+    from storage.vector_search import FlatIndex, IvfIndex, _normalise_rows
+
+    vectors = _normalise_rows(np.random.default_rng(2).standard_normal((400, 512)).astype(np.float32))
+    labels = np.arange(1, 401)
+    ivf, flat = IvfIndex(nlist=4, nprobe=4), FlatIndex()
+    ivf.build(vectors, labels)
+    flat.build(vectors, labels)
+    assert faiss.try_extract_index_ivf(ivf._index) is not None
+
+    ivf.save(tmp_path / "ivf.faiss")
+    loaded = IvfIndex(nprobe=4)
+    loaded.load(tmp_path / "ivf.faiss")
+    loaded.remove(np.array([1]))
+    _, got = loaded.search(vectors[:10])
+    _, want = flat.search(vectors[:10])
+    assert got[0] != 1
+    assert list(got[1:]) == list(want[1:])
+    np.testing.assert_allclose(loaded.vectors(np.array([1, 5])), vectors[4:5], atol=1e-6)
+
+
+def test_index_backends_add_and_remove(kind):
+    from storage.vector_search import GalleryIndex
+
+    g = GalleryIndex(kind)
+    g.load(_records(50))
+    vec = np.ones(512, dtype=np.float32)
+    g.add(999, 7, vec)
+    assert len(g) == 51
+    assert g.search(vec).student_id == 7
+
+    assert g.remove_student(7) == 1
+    assert len(g) == 50
+    assert g.search(vec).student_id != 7
+
+
+def test_student_distances_score_only_the_candidate(kind):
+    """Candidate checks compare a query with one student's embeddings only."""
+    from storage.vector_search import GalleryIndex
+
+    records = _records(50)
+    g = GalleryIndex(kind)
+    g.load(records)
+    second = np.random.default_rng(9).standard_normal(512).astype(np.float32)
+    g.add(999, 100, second)
+    g.remove_student(101)
+
+    query = records[0]["embedding"] + 0.5 * second
+    want = min(
+        1.0 - float(np.dot(query, v) / np.linalg.norm(query) / np.linalg.norm(v))
+        for v in (records[0]["embedding"], second)
+    )
+    d100, d101, d102 = g.student_distances(np.stack([query] * 3), [100, 101, 102])
+    assert d100 == pytest.approx(want, abs=1e-4)
+    assert d101 is None                          # removed
+    assert d102 > d100
+
+
+def test_search_skips_labels_added_after_its_snapshot(kind):
+    """HNSW / IVF grow in place: a label the student map does not know yet
+    must be skipped for the next neighbour, not returned as no match."""
+    from storage.vector_search import GalleryIndex, _normalise_rows
+
+    records = _records(50)
+    g = GalleryIndex(kind)
+    g.load(records)
+    index, _, _ = g._state
+    query = records[3]["embedding"]
+    index.add(_normalise_rows(query[None]), np.array([5000]))   # index updated, map not yet
+
+    result = g.search(query)
+    assert result is not None and result.student_id == 103
+
+
+def test_flat_search_k_orders_and_pads():
+    from storage.vector_search import FlatIndex, _normalise_rows
+
+    vectors = _normalise_rows(np.random.default_rng(4).standard_normal((3, 512)).astype(np.float32))
+    index = FlatIndex()
+    index.build(vectors, np.array([10, 11, 12]))
+    sims, labels = index.search_k(vectors[:1], 5)
+    assert labels[0, 0] == 10 and set(labels[0, :3]) == {10, 11, 12}
+    assert list(labels[0, 3:]) == [-1, -1]
+    assert list(sims[0, :3]) == sorted(sims[0, :3], reverse=True)
+
+
+def test_gallery_add_before_load(kind):
+    from storage.vector_search import GalleryIndex
+
+    g = GalleryIndex(kind)
+    g.add(1, 7, np.ones(512, dtype=np.float32))
+    assert g.search(np.ones(512, dtype=np.float32)).student_id == 7
+
+
+def test_gallery_snapshot_round_trip(kind, tmp_path):
+    from storage.vector_search import GalleryIndex
+
+    g = GalleryIndex(kind)
+    g.load(_records(50))
+    g.add(999, 7, np.ones(512, dtype=np.float32))
+    g.remove_student(100)
+    g.save(tmp_path)
+    assert not g.dirty
+
+    restored = GalleryIndex(kind)
+    events = []
+    restored.add_listener(lambda event, *args: events.append(event))
+    assert restored.restore(tmp_path, fingerprint=(50, 999))
+    assert events == ["load"]
+    assert len(restored) == 50
+    queries = np.random.default_rng(1).standard_normal((5, 512)).astype(np.float32)
+    assert [r.student_id for r in restored.search_many(queries)] == [
+        r.student_id for r in g.search_many(queries)
+    ]
+    assert len(list(tmp_path.glob("index-*"))) == 1
+
+
+def test_snapshot_keeps_files_of_other_live_processes(tmp_path):
+    """Processes sharing the directory must not delete each other's index files."""
+    import os
+    import subprocess
+    import sys
+
+    from storage.vector_search import GalleryIndex
+
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"],
+                            capture_output=True, text=True, check=True)
+    live = tmp_path / f"index-{os.getppid()}-aaaa.npz"
+    dead = tmp_path / f"index-{int(exited.stdout)}-bbbb.npz"
+    live.touch()
+    dead.touch()
+
+    g = GalleryIndex("flat")
+    g.load(_records(10))
+    g.save(tmp_path)
+    g.save(tmp_path)
+
+    files = sorted(p.name for p in tmp_path.glob("index-*"))
+    assert live.name in files and dead.name not in files
+    assert len(files) == 2                        # ours: only the latest
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_stale_or_foreign_snapshot_is_ignored(tmp_path):
+    from storage.vector_search import GalleryIndex
+
+    g = GalleryIndex("flat")
+    g.load(_records(10))
+    g.save(tmp_path)
+
+    stale = GalleryIndex("flat")
+    assert not stale.restore(tmp_path, fingerprint=(11, 11))   # enrolled since
+    assert not stale.loaded
+    assert not GalleryIndex("hnsw").restore(tmp_path)          # another index kind
+    assert not GalleryIndex("flat").restore(tmp_path / "missing")
+
+
+def test_load_gallery_prefers_snapshot(tmp_path):
+    """A matching snapshot is loaded without reading the embeddings."""
+    import storage.vector_search as vs
+
+    g = vs.GalleryIndex("flat")
+    repo = "storage.repositories.EmbeddingRepository"
+    with (
+        patch.object(vs, "gallery", g),
+        patch.object(vs.settings, "gallery_index_dir", str(tmp_path)),
+        patch(f"{repo}.get_all", return_value=_records(20)) as get_all,
+        patch(f"{repo}.fingerprint", return_value=(20, 20)),
+    ):
+        assert vs.load_gallery()          # builds from the DB and saves
+        assert vs.load_gallery()          # restores the snapshot
+        assert vs.load_gallery(rebuild=True)
+
+    assert get_all.call_count == 2
+    assert len(g) == 20
+
+
+def test_second_worker_follows_enrolments_and_deletions():
+    """A gallery in another worker picks up changes made through the first."""
+    import storage.vector_search as vs
+
+    table = _records(20)
+    first, second = vs.GalleryIndex("flat"), vs.GalleryIndex("flat")
+    first.load(table)
+    second.load(table)
+    repo = "storage.repositories.EmbeddingRepository"
+
+    def fingerprint():
+        return vs._fingerprint(np.asarray([r["face_id"] for r in table], dtype=np.int64))
+
+    vec = np.ones(512, dtype=np.float32)
+    with (
+        patch.object(vs, "gallery", second),
+        patch.object(vs.settings, "gallery_index_dir", ""),
+        patch(f"{repo}.get_all", side_effect=lambda: list(table)),
+        patch(f"{repo}.fingerprint", side_effect=fingerprint),
+    ):
+        assert not vs.sync_gallery()                    # nothing changed yet
+
+        table.append({"face_id": 999, "student_id": 7, "embedding": vec})   # enrol via `first`
+        first.add(999, 7, vec)
+        assert vs.sync_gallery()
+        assert second.search(vec).student_id == 7
+
+        table[:] = [r for r in table if r["student_id"] != 103]             # delete via `first`
+        first.remove_student(103)
+        assert vs.sync_gallery()
+        assert second.student_distances(vec[None], [103]) == [None]
+        assert second.fingerprint() == first.fingerprint()
+
+
+def test_numpy_fallback_searches_without_building_a_gallery(caplog):
+    import storage.vector_search as vs
+
+    records = _records(30)
+    queries = np.stack([records[4]["embedding"], records[17]["embedding"]])
+    with (
+        patch("storage.repositories.EmbeddingRepository.get_all", return_value=records),
+        caplog.at_level("INFO", logger="storage.vector_search"),
+    ):
+        results = vs._numpy_fallback_search_many(queries)
+    assert [r.student_id for r in results] == [104, 117]
+    assert results[0].d == pytest.approx(0.0, abs=1e-5)
+    assert not caplog.records
+
+
+def test_unknown_index_kind_is_rejected():
+    from storage.vector_search import make_index
+
+    with pytest.raises(ValueError, match="Unknown gallery index"):
+        make_index("annoy")
+
+
+# ── cosine_search routing ─────────────────────────────────────────────────────
+
+def test_cosine_search_uses_loaded_gallery_without_db(gallery):
+    """With the gallery loaded, the hot path must not hit the database."""
+    import storage.vector_search as vs
+
+    rec = _records(50)[3]
+    with (
+        patch.object(vs, "gallery", gallery),
+        patch.object(vs, "_pgvector_search") as mock_pg,
+        patch.object(vs, "_numpy_fallback_search") as mock_np,
+    ):
+        result = vs.cosine_search(rec["embedding"])
+
+    assert result.student_id == rec["student_id"]
+    mock_pg.assert_not_called()
+    mock_np.assert_not_called()
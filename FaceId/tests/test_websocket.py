@@ -0,0 +1,165 @@
+"""
+tests/test_websocket.py
+------------------------
+Tests for the /ws handler: latest-frame-wins mailbox and control hints.
+
+The pipeline and frame decoding are replaced by a slow stub so the tests
+exercise only the asyncio plumbing.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+
+@pytest.fixture(scope="module")
+def client():
+    with (
+        patch("ai.detector.yolo_face.torch"),
+        patch("ai.recognizer.arcface.insightface"),
+        patch("storage.database.check_db_connection", return_value=True),
+        patch("app.websocket.init_pipeline"),
+        patch("app.websocket.running_pipeline", return_value=MagicMock()),
+    ):
+        from main import app
+
+        with TestClient(app) as c:
+            yield c
+
+
+# captured before the client fixture patches it out
+from app.websocket import init_pipeline as _init_pipeline  # noqa: E402
+
+
+def _slow_process(pipeline, data, state):
+    time.sleep(0.05)
+    return [{"seq": data[0]}]
+
+
+# ── FrameMailbox ──────────────────────────────────────────────────────────────
+
+async def test_mailbox_keeps_only_newest_frame():
+    from app.websocket import FrameMailbox
+
+    box = FrameMailbox()
+    for i in range(5):
+        box.put(bytes([i]))
+
+    assert await box.get() == bytes([4])
+    assert box.dropped == 4
+
+    box.close()
+    assert await asyncio.wait_for(box.get(), timeout=1) is None
+
+
+# ── /ws ───────────────────────────────────────────────────────────────────────
+
+def test_ws_drops_stale_frames_under_overload(client):
+    """A burst of frames must not be processed one by one."""
+    with (
+        patch("app.websocket._decode_and_process", side_effect=_slow_process),
+        client.websocket_connect("/ws") as ws,
+    ):
+        for i in range(20):
+            ws.send_bytes(bytes([i]))
+
+        seen = []
+        while not seen or seen[-1] != 19:
+            seen.append(ws.receive_json()[0]["seq"])
+
+    assert seen[-1] == 19          # the newest frame is always processed
+    assert len(seen) < 20          # stale frames were skipped
+
+
+def test_ws_sends_control_hint(client):
+    with (
+        patch("app.websocket._decode_and_process", side_effect=_slow_process),
+        patch("app.websocket.settings.ws_control_interval", 0.01),
+        client.websocket_connect("/ws") as ws,
+    ):
+        ws.send_bytes(bytes([1]))
+        assert ws.receive_json() == [{"seq": 1}]
+        control = ws.receive_json()
+
+    assert control["type"] == "control"
+    assert control["max_fps"] > 0
+
+
+def test_ws_staged_mode_sends_results_in_frame_order(client):
+    """With several frames in flight, a slow early frame still goes first."""
+    submitted = []
+    futures = []
+
+    def submit(frame, state, scale=1):
+        submitted.append((frame, [f.done() for f in futures]))
+        future = Future()
+        futures.append(future)
+        delay = 0.1 if frame == 0 else 0.0
+        threading.Timer(delay, future.set_result, ([{"seq": frame}],)).start()
+        return future
+
+    staged = MagicMock()
+    staged.submit.side_effect = submit
+    with (
+        patch("app.websocket._staged", staged),
+        patch("app.websocket.decode_frame", side_effect=lambda data: (data[0], 1)),
+        client.websocket_connect("/ws") as ws,
+    ):
+        ws.send_bytes(bytes([0]))
+        while not submitted:
+            time.sleep(0.005)
+        ws.send_bytes(bytes([1]))
+        received = [ws.receive_json()[0]["seq"] for _ in range(2)]
+
+    assert submitted == [(0, []), (1, [False])]   # frame 1 started before 0 finished
+    assert received == [0, 1]
+
+
+# ── Startup ───────────────────────────────────────────────────────────────────
+
+def test_ws_rejects_streams_until_models_are_warm(client):
+    with (
+        patch("app.websocket.running_pipeline", return_value=None),
+        pytest.raises(WebSocketDisconnect) as exc,
+        client.websocket_connect("/ws") as ws,
+    ):
+        ws.receive_json()
+    assert exc.value.code == 1013
+
+
+def test_first_frame_latency_is_recorded(client):
+    with (
+        patch("app.websocket._decode_and_process", side_effect=_slow_process),
+        patch.dict("app.websocket._startup", {"first_frame_ms": None}),
+    ):
+        with client.websocket_connect("/ws") as ws:
+            ws.send_bytes(bytes([1]))
+            ws.receive_json()
+        from app.websocket import _startup
+
+        assert _startup["first_frame_ms"] >= 50
+
+
+def test_init_pipeline_reports_cold_start(caplog):
+    import app.websocket as module
+
+    pipeline = MagicMock(startup={"load_s": 1.0, "warmup_s": 0.5, "pose_s": 0.1})
+    with (
+        patch.object(module, "_pipeline", None),
+        patch.object(module, "_ready", threading.Event()),
+        patch.dict(module._startup, {"cold_start_s": None}),
+        patch.object(module.settings, "execution_mode", "direct"),
+        patch.object(module, "FacePipeline", return_value=pipeline),
+        caplog.at_level("INFO", logger="app.websocket"),
+    ):
+        _init_pipeline()
+        assert module._ready.is_set()
+        assert module._startup["cold_start_s"] is not None
+        assert module._startup["warmup_s"] == 0.5
+    assert "cold start" in caplog.text
@@ -0,0 +1,228 @@
+"""
+tests/test_workers.py
+----------------------
+ProcessWorkerPool tests with real spawned workers running a stub pipeline.
+
+The stub must live at module level so the spawned workers can unpickle it.
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+
+class _EchoPipeline:
+    """Reports what the worker saw instead of running any models."""
+
+    def __init__(self):
+        self.frames = {}
+
+    def open_session(self, session_id):
+        from ai.session import SessionState
+
+        return SessionState(session_id=session_id)
+
+    def close_session(self, session_id):
+        self.frames.pop(session_id, None)
+
+    def reload_state(self):
+        self.frames.clear()
+
+    def swap_models(self, version):
+        if version == "broken":
+            raise FileNotFoundError("no weights for broken")
+        return {"version": version, "previous": "v1", "load_s": 0.0, "warmup_s": 0.0,
+                "draining_frames": 0}
+
+    def recognition_stats(self):
+        return {"quality": {"checked": 3, "skipped": 1,
+                            "skipped_by_reason": {"size": 0, "blur": 1, "pose": 0},
+                            "skip_rate": 0.3333}}
+
+    def process(self, frame, state, scale=1):
+        import os
+
+        from storage.vector_search import gallery
+
+        n = self.frames[state.session_id] = self.frames.get(state.session_id, 0) + 1
+        return [{
+            "bbox": [0, 0, 10, 10],
+            "session": state.session_id,
+            "n": n,
+            "shape": list(frame.shape),
+            "pid": os.getpid(),
+            "gallery": len(gallery),
+        }]
+
+
+def _jpeg(h=48, w=64, noise=False):
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 255, (h, w, 3), dtype=np.uint8) if noise else np.zeros((h, w, 3), np.uint8)
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 100])[1].tobytes()
+
+
+@pytest.fixture(scope="module")
+def pool():
+    from ai.workers import ProcessWorkerPool
+
+    p = ProcessWorkerPool(workers=2, slots=2, slot_bytes=8192, factory=_EchoPipeline)
+    p.start(timeout=120)
+    yield p
+    p.stop()
+
+
+def test_frames_round_trip_through_shared_memory(pool):
+    state = pool.open_session("cam-a")
+    (result,) = pool.process(_jpeg(), state)
+
+    assert result["session"] == "cam-a"
+    assert result["shape"] == [48, 64, 3]
+    assert pool.stats()["inline_frames"] == 0
+
+
+def test_sessions_stick_to_one_worker(pool):
+    a, b = pool.open_session("stick-a"), pool.open_session("stick-b")
+    results = {s.session_id: [pool.process(_jpeg(), s)[0] for _ in range(3)] for s in (a, b)}
+
+    for session_results in results.values():
+        assert [r["n"] for r in session_results] == [1, 2, 3]
+        assert len({r["pid"] for r in session_results}) == 1
+    # least-loaded placement spreads sessions over both workers
+    assert results["stick-a"][0]["pid"] != results["stick-b"][0]["pid"]
+
+
+def test_oversized_frame_is_sent_inline(pool):
+    data = _jpeg(256, 256, noise=True)
+    assert len(data) > pool.slot_bytes
+
+    before = pool.stats()["inline_frames"]
+    (result,) = pool.process(data, pool.open_session("big"))
+
+    assert result["shape"] == [256, 256, 3]
+    assert pool.stats()["inline_frames"] == before + 1
+
+
+def test_undecodable_bytes_return_none(pool):
+    assert pool.process(b"not an image", pool.open_session("junk")) is None
+
+
+def test_close_session_resets_worker_state(pool):
+    state = pool.open_session("reopen")
+    pool.process(_jpeg(), state)
+    pool.close_session("reopen")
+
+    state = pool.open_session("reopen")
+    assert pool.process(_jpeg(), state)[0]["n"] == 1
+
+
+def test_gallery_changes_reach_workers(pool):
+    from storage.vector_search import gallery
+
+    state = pool.open_session("gallery")
+    before = pool.process(_jpeg(), state)[0]["gallery"]
+    gallery.add(999_001, 999_001, np.ones(512, dtype=np.float32))
+    try:
+        assert pool.process(_jpeg(), state)[0]["gallery"] == before + 1
+    finally:
+        gallery.remove_student(999_001)
+    assert pool.process(_jpeg(), state)[0]["gallery"] == before
+
+
+def test_swap_models_reaches_every_worker(pool):
+    info = pool.swap_models("v2", timeout=30)
+    assert info["version"] == "v2" and info["workers"] == 2
+    assert pool.model_version == "v2"
+
+    with pytest.raises(RuntimeError, match="broken"):
+        pool.swap_models("broken", timeout=30)
+    assert pool.model_version == "v2"
+
+
+def test_recognition_stats_are_summed_over_workers(pool):
+    quality = pool.recognition_stats()["quality"]
+    assert quality["checked"] == 6 and quality["skipped"] == 2
+    assert quality["skipped_by_reason"] == {"size": 0, "blur": 2, "pose": 0}
+    assert quality["skip_rate"] == pytest.approx(1 / 3, abs=1e-4)
+    assert pool.recognition_stats()["unavailable_workers"] == []
+
+
+# ── Failures ──────────────────────────────────────────────────────────────────
+
+class _SlowStatsPipeline(_EchoPipeline):
+    def recognition_stats(self):
+        import time
+
+        time.sleep(1.0)
+        return super().recognition_stats()
+
+
+def _wait_for(predicate, timeout=60.0):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_slow_worker_is_reported_unavailable():
+    from ai.workers import ProcessWorkerPool
+
+    pool = ProcessWorkerPool(workers=1, slots=2, slot_bytes=8192, factory=_SlowStatsPipeline)
+    pool.start(timeout=120)
+    try:
+        assert pool.recognition_stats(timeout=0.2) == {"unavailable_workers": [0]}
+        assert pool.stats()["workers"][0]["in_flight"] == 0      # no leaked request
+        assert pool.process(_jpeg(), pool.open_session("cam"))[0]["n"] == 1
+    finally:
+        pool.stop()
+
+
+def test_crashed_worker_is_restarted():
+    import os
+    import signal
+
+    from ai.workers import ProcessWorkerPool
+
+    pool = ProcessWorkerPool(workers=1, slots=2, slot_bytes=8192, factory=_EchoPipeline)
+    pool.start(timeout=120)
+    try:
+        state = pool.open_session("cam")
+        first = pool.process(_jpeg(), state)[0]
+        os.kill(first["pid"], signal.SIGKILL)
+
+        def restarted():
+            (worker,) = pool.stats()["workers"]
+            return worker["ready"] and worker["restarts"] == 1
+
+        assert _wait_for(restarted)
+        again = pool.process(_jpeg(), state)[0]
+        assert again["pid"] != first["pid"]
+        assert again["n"] == 1                                   # fresh tracker state
+    finally:
+        pool.stop()
+
+
+def test_worker_is_dropped_after_max_restarts():
+    import os
+    import signal
+
+    from ai.workers import ProcessWorkerPool
+
+    pool = ProcessWorkerPool(workers=2, slots=2, slot_bytes=8192, factory=_EchoPipeline,
+                             max_restarts=0)
+    pool.start(timeout=120)
+    try:
+        state = pool.open_session("cam")
+        victim = pool.process(_jpeg(), state)[0]["pid"]
+        os.kill(victim, signal.SIGKILL)
+        assert _wait_for(lambda: sum(w["ready"] for w in pool.stats()["workers"]) == 1)
+
+        moved = pool.process(_jpeg(), state)[0]
+        assert moved["pid"] != victim
+        assert pool.process(_jpeg(), pool.open_session("new"))[0]["pid"] == moved["pid"]
+        assert pool.recognition_stats()["unavailable_workers"] != []
+    finally:
+        pool.stop()
@@ -1 +1,5 @@
-CREATE EXTENSION IF NOT EXISTS vector;
\ No newline at end of file
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- The HNSW / IVFFlat index on face_embedding.embedding is created and
+-- maintained by the AI service's schema bootstrap (PGVECTOR_INDEX), so
+-- its parameters live with the service settings rather than here.